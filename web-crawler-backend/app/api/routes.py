@@ -1,9 +1,22 @@
-from fastapi import APIRouter, HTTPException, Query, Depends
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Query, Depends, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 from typing import List, Dict, Optional, Any
-from app.database.db import Database, CrawledPage
+from app.database.db import Database, CrawledPage, CrawlJob, SearchResult, encode_cursor
 from app.llm.analyzer import OllamaAnalyzer
-from uuid import uuid4
+from app.llm.cache import AnalysisCache
+from app.llm.embeddings import OllamaEmbedder, SemanticIndex
+from app.llm.scheduler import AnalysisScheduler, PRIORITIES
+from app.crawler.browser_pool import BrowserPool
+from app.crawler.crawler import WebCrawler
+from app.crawler.dedup import NearDuplicateDetector
+from app.crawler.politeness import PolitenessScheduler
+from app.crawler.revalidator import Revalidator
+from app.crawler.seeds import read_domains, seed_provider_from_env
+from app.jobs.manager import JobManager
+from app.jobs.pipeline import CrawlPipeline
+from app.monitoring.metrics import timed
+import asyncio
 import subprocess
 import json
 import os
@@ -11,7 +24,12 @@ import sys
 
 router = APIRouter()
 db = Database()
-analyzer = OllamaAnalyzer()
+analysis_cache = AnalysisCache(db)
+analyzer = OllamaAnalyzer(cache=analysis_cache)
+analysis_scheduler = AnalysisScheduler(db, analyzer)
+browser_pool = BrowserPool()
+scheduler = PolitenessScheduler()
+crawler = WebCrawler(browser_pool, scheduler)
 
 
 # Dependency to ensure DB connection
@@ -24,6 +42,25 @@ async def get_db():
 class CrawlRequest(BaseModel):
     query: str
     query_type: str = "domain"
+    # 0 keeps the original behaviour of crawling just the root page
+    max_depth: int = Field(0, ge=0, le=10)
+    max_pages: int = Field(100, ge=1, le=10000)
+    # Re-check the domain's stored pages instead of crawling from scratch
+    refresh: bool = False
+    # Keyword crawls: only the top_k pages by BM25 relevance are analysed
+    top_k: int = Field(10, ge=1, le=1000)
+    # Record a per-stage timing trace, read back from /jobs/{job_id}/trace
+    trace: bool = False
+
+
+class BatchCrawlRequest(BaseModel):
+    # Domains (or URLs) to crawl, each as its own domain crawl
+    domains: List[str] = Field(..., min_length=1, max_length=10000)
+    max_depth: int = Field(0, ge=0, le=10)
+    max_pages: int = Field(100, ge=1, le=10000)
+    # Seconds each domain's crawl may take; BATCH_CRAWL_TIMEOUT when unset
+    timeout: Optional[float] = Field(None, gt=0, le=3600)
+    analyze: bool = True
 
 
 class CrawlResponse(BaseModel):
@@ -39,6 +76,34 @@ class PageListItem(BaseModel):
 class PageResponse(BaseModel):
     pages: List[CrawledPage]
     total: int
+    # Pass back as ?cursor= to get the next page; None on the last page
+    next_cursor: Optional[str] = None
+
+class SearchResponse(BaseModel):
+    results: List[SearchResult]
+    total: int
+    # {"category": {name: hits}, "sentiment": {name: hits}} over all matches
+    facets: Dict[str, Dict[str, int]]
+
+class SemanticSearchRequest(BaseModel):
+    query: str = Field(..., min_length=1, max_length=2000)
+    limit: int = Field(10, ge=1, le=100)
+
+class AnalyzeBatchRequest(BaseModel):
+    # Pages to (re)analyse; the filters below narrow them down, or select
+    # from all stored pages when no ids are given
+    page_ids: Optional[List[int]] = Field(None, max_length=10000)
+    domain: Optional[str] = None
+    category: Optional[str] = None
+    sentiment: Optional[str] = None
+    # Only pages that have no analysis yet
+    unanalyzed: bool = False
+    limit: int = Field(1000, ge=1, le=10000)
+    priority: str = Field("bulk", pattern="^(interactive|crawl|bulk)$")
+
+class AnalyzeBatchResponse(BaseModel):
+    queued: int
+    page_ids: List[int]
 
 class CrawlerTestResponse(BaseModel):
     success: bool
@@ -48,70 +113,197 @@ class CrawlerTestResponse(BaseModel):
 
 @router.post("/crawl", response_model=CrawlResponse)
 async def start_crawl(request: CrawlRequest, database: Database = Depends(get_db)):
-    job_id = str(uuid4())
-
+    """
+    Queue a crawl job and return immediately. The crawl, storage and LLM
+    analysis run on the background job workers; poll /jobs/{job_id} for progress.
+    """
     try:
-        if request.query_type == "domain":
-            crawler_response = await run_crawler_subprocess(request.query)
+        job = await job_manager.submit(
+            request.query,
+            request.query_type,
+            {
+                "max_depth": request.max_depth,
+                "max_pages": request.max_pages,
+                "refresh": request.refresh,
+                "top_k": request.top_k,
+                "trace": request.trace
+            }
+        )
+        return CrawlResponse(
+            job_id=job.id,
+            message=f"Crawl queued for {request.query_type}: {request.query}",
+            page_count=0
+        )
+
+    except Exception as e:
+        print(f"Error queueing crawl job: {e}")
+        raise HTTPException(status_code=500, detail=f"Error queueing crawl: {str(e)}")
 
-            if not crawler_response.success or not crawler_response.data:
-                raise ValueError(f"Crawler failed: {crawler_response.error}")
 
-            results = crawler_response.data
+@router.post("/crawl/stream")
+async def stream_crawl(request: CrawlRequest, database: Database = Depends(get_db)):
+    """
+    Crawl and analyse in the request, streaming progress as Server-Sent Events:
+    page_fetched, page_stored, (ranked,) analysis_token, analysis_done, then done (or error).
+    """
+    async def event_stream():
+        async for event, data in pipeline.stream(
+            request.query, request.query_type, request.max_depth, request.max_pages, request.top_k
+        ):
+            yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/crawl/batch")
+async def crawl_batch(request: Request, database: Database = Depends(get_db)):
+    """
+    Crawl many domains concurrently and stream one NDJSON line per domain as
+    it finishes: domain, status (ok, failed, timeout), page_ids, page_count,
+    crawl_seconds and error.
+
+    Send a JSON BatchCrawlRequest, or a seed file as a plain-text body (one
+    domain per line, # comments) with the other fields as query parameters.
+    """
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("application/json"):
+            batch = BatchCrawlRequest.model_validate_json(body)
         else:
-            print(f"Keyword crawling not implemented for: {request.query}")
-            results = []
+            domains = read_domains(body.decode("utf-8", errors="replace"))
+            batch = BatchCrawlRequest.model_validate({**request.query_params, "domains": domains})
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+
+    async def results():
+        async for result in pipeline.crawl_batch(
+            list(dict.fromkeys(batch.domains)), batch.max_depth, batch.max_pages, batch.timeout, batch.analyze
+        ):
+            yield json.dumps(result, default=str) + "\n"
+
+    return StreamingResponse(
+        results(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-        page_ids = await database.store_crawled_data(results)
 
-        for page_id in page_ids:
-            page = await database.get_page(page_id)
-            if page and page.content:
-                analysis = analyzer.analyze_text(page.content, page.title, page.url)
-                await database.update_with_analysis(page_id, analysis)
+@router.get("/jobs/{job_id}", response_model=CrawlJob)
+async def get_job(job_id: str, database: Database = Depends(get_db)):
+    job = await database.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
-        return CrawlResponse(
-            job_id=job_id,
-            message=f"Crawling completed for {request.query_type}: {request.query}",
-            page_count=len(page_ids)
-        )
 
+@router.get("/jobs/{job_id}/trace")
+async def get_job_trace(job_id: str, database: Database = Depends(get_db)):
+    """
+    Timing trace of a job started with trace enabled: per-stage totals and
+    the individual spans (fetches, DB writes, LLM calls) with their offsets.
+    """
+    trace = await database.get_job_trace(job_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="No trace recorded for this job")
+    return trace
+
+
+async def run_crawler(domain: str, max_depth: int = 0, max_pages: int = 100) -> CrawlerTestResponse:
+    """
+    Crawl a domain with a browser leased from the in-process pool.
+    Falls back to the standalone subprocess when the pool is disabled
+    (BROWSER_POOL_SIZE=0), e.g. on platforms where Playwright cannot run
+    inside the server's event loop.
+    """
+    if browser_pool.size <= 0:
+        return await run_crawler_subprocess(domain, max_depth, max_pages)
+
+    try:
+        result = await crawler.crawl_site(domain, max_depth=max_depth, max_pages=max_pages)
+        if not result:
+            return CrawlerTestResponse(success=False, error="No data returned from crawler.")
+        return CrawlerTestResponse(success=True, data=result)
     except Exception as e:
-        print(f"Error in crawl operation: {e}")
-        return CrawlResponse(
-            job_id=job_id,
-            message=f"Error during crawl: {str(e)}",
-            page_count=0
-        )
-    
+        return CrawlerTestResponse(success=False, error=f"Unexpected error: {str(e)}")
+
+
+async def iter_crawled_pages(domain: str, max_depth: int = 0, max_pages: int = 100, timeout: Optional[float] = None):
+    """
+    Yield crawled pages one at a time as they are fetched. Without the browser
+    pool the subprocess returns everything at once, so pages arrive together;
+    timeout then replaces its default CRAWLER_TIMEOUT.
+    """
+    if browser_pool.size > 0:
+        async for page in crawler.iter_site(domain, max_depth=max_depth, max_pages=max_pages):
+            yield page
+        return
+
+    crawler_response = await run_crawler_subprocess(domain, max_depth, max_pages, timeout)
+    if not crawler_response.success:
+        raise ValueError(f"Crawler failed: {crawler_response.error}")
+    for page in crawler_response.data or []:
+        yield page
+
+
+async def fetch_crawled_page(url: str) -> Optional[Dict]:
+    """
+    Render a single URL, through the pool or the subprocess fallback.
+    """
+    if browser_pool.size > 0:
+        return await crawler.fetch_page(url)
+    crawler_response = await run_crawler_subprocess(url)
+    return crawler_response.data[0] if crawler_response.success and crawler_response.data else None
+
+
+revalidator = Revalidator(scheduler=scheduler)
+deduplicator = NearDuplicateDetector(db)
+embedder = OllamaEmbedder()
+semantic_index = SemanticIndex(db, embedder)
+pipeline = CrawlPipeline(
+    db, analyzer, run_crawler, iter_crawled_pages, fetch_crawled_page, revalidator, deduplicator,
+    semantic_index, seed_provider_from_env(), scheduler=analysis_scheduler
+)
+job_manager = JobManager(db, pipeline.run_job)
 
 
 # @router.get("/test-crawler/{domain}", response_model=CrawlerTestResponse)
-async def run_crawler_subprocess(domain: str):
+async def run_crawler_subprocess(
+    domain: str, max_depth: int = 0, max_pages: int = 100, timeout: Optional[float] = None
+):
     """
     Run the crawler subprocess (in the crawler/ directory) as a standalone process.
-    This function will run the crawler as a subprocess and wait for it to finish.
+    This function will run the crawler as a subprocess and wait for it to finish,
+    at most timeout seconds (CRAWLER_TIMEOUT, default 30, when not given).
     It will return the JSON output of the crawler as a CrawlerTestResponse object.
     """
+    if timeout is None:
+        timeout = float(os.getenv("CRAWLER_TIMEOUT", "30"))
     try:
-        # 1. Find the crawler script location
-        crawler_script_path = os.path.join(os.path.dirname(__file__), "..", "crawler", "crawler.py")
-        abs_path = os.path.abspath(crawler_script_path)
+        # 1. Find the backend root so the crawler module can be run with -m
+        backend_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
         
         # 2. Set up environment variables
         env = os.environ.copy()
         env["PYTHONIOENCODING"] = "utf-8"
         env["CRAWL4AI_VERBOSE"] = "false"  # Suppress debug output
         
-        # 3. Run the crawler subprocess
-        result = subprocess.run(
-            [sys.executable, abs_path, domain],
-            capture_output=True,
-            text=True,
-            timeout=30,
-            encoding="utf-8",
-            env=env
-        )
+        # 3. Run the crawler subprocess, on a thread so other requests and
+        # batch domains are not blocked while it runs
+        with timed("subprocess", domain=domain):
+            result = await asyncio.to_thread(
+                subprocess.run,
+                [sys.executable, "-m", "app.crawler.crawler", domain, str(max_depth), str(max_pages)],
+                cwd=backend_root,
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+                encoding="utf-8",
+                env=env
+            )
 
         # 4. Log output for debugging (if needed)
         if result.stderr:
@@ -128,7 +320,7 @@ async def run_crawler_subprocess(domain: str):
         return extract_json_from_output(result.stdout)
 
     except subprocess.TimeoutExpired:
-        return CrawlerTestResponse(success=False, error="Crawler timed out after 30 seconds")
+        return CrawlerTestResponse(success=False, error=f"Crawler timed out after {timeout:g} seconds")
     except Exception as e:
         return CrawlerTestResponse(success=False, error=f"Unexpected error: {str(e)}")
 
@@ -158,11 +350,17 @@ def extract_json_from_output(output: str) -> CrawlerTestResponse:
 async def get_pages(
     limit: int = Query(20, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None),
     database: Database = Depends(get_db)
 ):
-    pages = await db.get_pages(limit, offset)
-    total = len(pages) + offset  # simplified
-    return PageResponse(pages=pages, total=total)
+    try:
+        pages, total = await db.get_pages_with_total(limit, offset, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    next_cursor = None
+    if len(pages) == limit:
+        next_cursor = encode_cursor(pages[-1].crawled_at, pages[-1].id)
+    return PageResponse(pages=pages, total=total, next_cursor=next_cursor)
 
 
 @router.get("/page/{page_id}", response_model=CrawledPage)
@@ -172,19 +370,124 @@ async def get_page(page_id: int, database: Database = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Page not found")
     return page
 
+@router.get("/page/{page_id}/similar", response_model=List[SearchResult])
+async def similar_pages(
+    page_id: int,
+    limit: int = Query(10, ge=1, le=100),
+    database: Database = Depends(get_db)
+):
+    """
+    Pages most similar to a page by embedding, best first. rank is the
+    cosine similarity. Empty when the page has no text to embed.
+    """
+    try:
+        results = await semantic_index.similar(page_id, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error finding similar pages: {str(e)}")
+    if results is None:
+        raise HTTPException(status_code=404, detail="Page not found")
+    return results
+
+@router.get("/page/{page_id}/backlinks", response_model=List[PageListItem])
+async def page_backlinks(
+    page_id: int,
+    limit: int = Query(100, ge=1, le=1000),
+    database: Database = Depends(get_db)
+):
+    """
+    Stored pages that link to a page, most recently crawled first.
+    """
+    pages = await db.get_backlinks(page_id, limit)
+    return [PageListItem(id=page.id, title=page.title) for page in pages]
+
 @router.get("/pages/list", response_model=List[PageListItem])
-async def list_pages(database: Database = Depends(get_db)):
+async def list_pages(
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = Query(None),
+    database: Database = Depends(get_db)
+):
     """
     Get a list of all pages (just ID and title).
     """
     try:
-        pages = await db.get_pages(limit=100)
-        result = []
-        for page in pages:
-            item = PageListItem(id=page.id, title=page.title)
-            result.append(item)
+        pages = await db.get_page_summaries(limit, cursor)
+        return [PageListItem(id=page.id, title=page.title) for page in pages]
+
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching pages list: {str(e)}")
 
-        return result
 
+@router.get("/search", response_model=SearchResponse)
+async def search_pages(
+    q: Optional[str] = Query(None, max_length=500),
+    category: Optional[str] = Query(None),
+    sentiment: Optional[str] = Query(None),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0, le=10000),
+    database: Database = Depends(get_db)
+):
+    """
+    Full-text search over titles, content and analysis, with optional
+    category/sentiment filters. Results are ranked and carry highlighted
+    snippets; facets count the matches per category and sentiment.
+    """
+    try:
+        results, total, facets = await db.search_pages(q, category, sentiment, limit, offset)
+        return SearchResponse(results=results, total=total, facets=facets)
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error searching pages: {str(e)}")
+
+
+@router.post("/search/semantic", response_model=List[SearchResult])
+async def semantic_search(request: SemanticSearchRequest, database: Database = Depends(get_db)):
+    """
+    Pages closest in meaning to a free-text query, best first. rank is the
+    cosine similarity.
+    """
+    try:
+        return await semantic_index.search(request.query, request.limit)
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error fetching pages list: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error running semantic search: {str(e)}")
+
+
+@router.post("/analyze/batch", response_model=AnalyzeBatchResponse)
+async def analyze_batch(request: AnalyzeBatchRequest, database: Database = Depends(get_db)):
+    """
+    Queue stored pages for (re)analysis without crawling them again. Runs in
+    the background behind interactive and crawl analyses (unless priority
+    says otherwise); watch /analysis/queue for progress.
+    """
+    page_ids = await db.find_page_ids(
+        request.page_ids, request.domain, request.category, request.sentiment, request.unanalyzed, request.limit
+    )
+    for page_id in page_ids:
+        analysis_scheduler.submit(page_id, PRIORITIES[request.priority])
+    return AnalyzeBatchResponse(queued=len(page_ids), page_ids=page_ids)
+
+
+@router.get("/analysis/queue")
+async def analysis_queue_stats():
+    """
+    Pages waiting for analysis by priority, analyses running, and the
+    current batch size with the Ollama throughput and latency it is based on.
+    """
+    return analysis_scheduler.stats()
+
+
+@router.get("/analysis/models")
+async def analysis_model_stats():
+    """
+    Requests, errors, latency, tokens and cost of each model in the registry.
+    """
+    return analyzer.models.stats()
+
+
+@router.get("/analysis/cache")
+async def analysis_cache_stats():
+    """
+    Hit/miss counters of the LLM analysis cache.
+    """
+    return analysis_cache.stats()
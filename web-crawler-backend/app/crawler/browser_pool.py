@@ -0,0 +1,191 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import List, Optional
+
+from crawl4ai import AsyncWebCrawler
+from crawl4ai.async_configs import BrowserConfig
+
+from app.monitoring.metrics import timed
+
+
+class PooledBrowser:
+    """A warm AsyncWebCrawler slot owned by the pool"""
+
+    def __init__(self, slot_id: int):
+        self.slot_id = slot_id
+        self.crawler: Optional[AsyncWebCrawler] = None
+        self.uses = 0
+        self.started_at = 0.0
+        self.crashed = False
+
+
+class BrowserPool:
+    """Long-lived pool of headless browsers shared by all crawl requests.
+
+    Browsers are started once (from the app startup hook) and leased out per
+    crawl. A slot is recycled after ``max_uses`` leases or ``max_age`` seconds,
+    and restarted whenever a health check fails or a lease reports a crash.
+    """
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        max_uses: Optional[int] = None,
+        max_age: Optional[float] = None,
+        health_interval: Optional[float] = None,
+    ):
+        self.size = size if size is not None else int(os.getenv("BROWSER_POOL_SIZE", "2"))
+        self.max_uses = max_uses if max_uses is not None else int(os.getenv("BROWSER_MAX_USES", "100"))
+        self.max_age = max_age if max_age is not None else float(os.getenv("BROWSER_MAX_AGE", "1800"))
+        self.health_interval = (
+            health_interval if health_interval is not None
+            else float(os.getenv("BROWSER_HEALTH_INTERVAL", "30"))
+        )
+        self._slots: List[PooledBrowser] = []
+        self._idle: Optional[asyncio.Queue] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self.started = False
+
+    def _browser_config(self) -> BrowserConfig:
+        return BrowserConfig(
+            headless=True,
+            use_persistent_context=False,
+            verbose=False
+        )
+
+    async def start(self):
+        """Launch all browsers and start the background health check"""
+        if self.started:
+            return
+        self._idle = asyncio.Queue()
+        self._slots = [PooledBrowser(i) for i in range(self.size)]
+        await asyncio.gather(*(self._launch(slot) for slot in self._slots))
+        for slot in self._slots:
+            self._idle.put_nowait(slot)
+        self.started = True
+        if self.health_interval > 0:
+            self._health_task = asyncio.create_task(self._health_loop())
+
+    async def close(self):
+        """Stop the health check and shut every browser down"""
+        if not self.started:
+            return
+        self.started = False
+        if self._health_task:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        await asyncio.gather(*(self._shutdown(slot) for slot in self._slots))
+        self._slots = []
+        self._idle = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def _launch(self, slot: PooledBrowser):
+        with timed("browser_launch", slot=slot.slot_id):
+            crawler = AsyncWebCrawler(config=self._browser_config())
+            await crawler.start()
+        slot.crawler = crawler
+        slot.uses = 0
+        slot.started_at = time.monotonic()
+        slot.crashed = False
+
+    async def _shutdown(self, slot: PooledBrowser):
+        crawler, slot.crawler = slot.crawler, None
+        if crawler is None:
+            return
+        try:
+            await crawler.close()
+        except Exception as e:
+            print(f"Error closing browser slot {slot.slot_id}: {e}")
+
+    async def _restart(self, slot: PooledBrowser):
+        await self._shutdown(slot)
+        await self._launch(slot)
+
+    def _is_healthy(self, slot: PooledBrowser) -> bool:
+        """Check that the slot's browser process is still connected"""
+        crawler = slot.crawler
+        if crawler is None or slot.crashed or not getattr(crawler, "ready", True):
+            return False
+        strategy = getattr(crawler, "crawler_strategy", None)
+        manager = getattr(strategy, "browser_manager", None)
+        browser = getattr(manager, "browser", None)
+        if browser is not None and hasattr(browser, "is_connected"):
+            return browser.is_connected()
+        return True
+
+    def _needs_recycle(self, slot: PooledBrowser) -> bool:
+        if self.max_uses and slot.uses >= self.max_uses:
+            return True
+        if self.max_age and time.monotonic() - slot.started_at >= self.max_age:
+            return True
+        return False
+
+    async def _prepare(self, slot: PooledBrowser):
+        """Make sure a slot is usable before it is handed out"""
+        if not self._is_healthy(slot) or self._needs_recycle(slot):
+            await self._restart(slot)
+
+    @asynccontextmanager
+    async def lease(self):
+        """Lease a warm browser for the duration of the ``async with`` block"""
+        if not self.started:
+            await self.start()
+        slot = await self._idle.get()
+        try:
+            await self._prepare(slot)
+            slot.uses += 1
+            yield slot.crawler
+        except Exception:
+            # Any error escaping a lease may have left the browser in a bad
+            # state, so the slot is re-checked (and restarted if dead) on its
+            # next lease rather than trusted blindly.
+            slot.crashed = not self._is_healthy(slot)
+            raise
+        finally:
+            if self._idle is not None:
+                self._idle.put_nowait(slot)
+            else:
+                await self._shutdown(slot)
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self.check_health()
+
+    async def check_health(self) -> int:
+        """Restart dead or expired idle browsers. Returns the number restarted."""
+        restarted = 0
+        if self._idle is None:
+            return restarted
+        # Only idle slots are inspected; leased ones are checked on return.
+        for _ in range(self._idle.qsize()):
+            slot = self._idle.get_nowait()
+            try:
+                if not self._is_healthy(slot) or self._needs_recycle(slot):
+                    await self._restart(slot)
+                    restarted += 1
+            except Exception as e:
+                print(f"Browser slot {slot.slot_id} failed to restart: {e}")
+                slot.crashed = True
+            finally:
+                self._idle.put_nowait(slot)
+        return restarted
+
+    def stats(self) -> dict:
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize() if self._idle is not None else 0,
+            "uses": [slot.uses for slot in self._slots],
+        }
@@ -1,78 +1,205 @@
 import asyncio
-from typing import Dict, List
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
 from datetime import datetime
+import os
 import sys
 import json
 from crawl4ai import AsyncWebCrawler
 from crawl4ai.async_configs import BrowserConfig, CrawlerRunConfig
 
+from app.crawler.browser_pool import BrowserPool
+from app.crawler.engine import SiteCrawler
+from app.crawler.fetcher import HttpFetcher, TieredFetcher
+from app.crawler.politeness import PolitenessScheduler
+from app.monitoring.metrics import PAGES_FETCHED, timed
+
 class WebCrawler:
-    def __init__(self):
-        # No stored configuration or state that could cause issues between requests
-        pass
-        
+    def __init__(
+        self,
+        pool: Optional[BrowserPool] = None,
+        scheduler: Optional[PolitenessScheduler] = None,
+        fast_path: Optional[bool] = None,
+    ):
+        # Browsers are leased from the shared pool when one is given; the
+        # standalone CLI has no pool and launches a fresh browser per call.
+        self.pool = pool
+        # Paces fetches per host and honours robots.txt when given
+        self.scheduler = scheduler
+        # Static pages are fetched over plain HTTP; only JS-rendered ones
+        # go through the browser
+        if fast_path is None:
+            fast_path = os.getenv("FAST_FETCH", "true").lower() not in ("0", "false", "no")
+        self.fetcher = TieredFetcher(self.render_page, HttpFetcher(scheduler)) if fast_path else None
+
+    async def close(self):
+        if self.fetcher is not None:
+            await self.fetcher.close()
+
+    @asynccontextmanager
+    async def _browser(self):
+        """Yield an AsyncWebCrawler, leased from the pool if there is one"""
+        if self.pool is not None:
+            async with self.pool.lease() as crawler:
+                yield crawler
+            return
+
+        browser_config = BrowserConfig(
+            headless=True,
+            use_persistent_context=False,
+            verbose=False
+        )
+        async with AsyncWebCrawler(config=browser_config) as crawler:
+            yield crawler
+
+    @asynccontextmanager
+    async def _slot(self, url: str):
+        """Yield the scheduler's FetchSlot for url, or None without a scheduler"""
+        if self.scheduler is None:
+            yield None
+            return
+        async with self.scheduler.slot(url) as slot:
+            yield slot
+
+    async def fetch_page(self, url: str) -> Optional[Dict]:
+        """Fetch a single URL and return its extracted data, or None on failure"""
+        if self.fetcher is not None:
+            return await self.fetcher.fetch_page(url)
+        return await self.render_page(url)
+
+    async def render_page(self, url: str) -> Optional[Dict]:
+        """Render a single URL in a browser and return its extracted data, or None on failure"""
+        try:
+            # The browser is leased first so waiting for a free one holds
+            # neither a global fetch slot nor the host's turn
+            async with self._browser() as crawler, self._slot(url) as slot:
+                if slot is not None and not slot.allowed:
+                    print(f"Skipping {url}: disallowed by robots.txt")
+                    PAGES_FETCHED.inc(tier="browser", outcome="skipped")
+                    return None
+                started = time.monotonic()
+                with timed("fetch_browser", url=url) as span:
+                    result = await crawler.arun(
+                        url=url,
+                        config=CrawlerRunConfig()
+                    )
+                    span["status"] = result.status_code
+                # Header names from the browser are lowercase
+                headers = {k.lower(): v for k, v in (result.response_headers or {}).items()}
+                if slot is not None:
+                    slot.record(result.status_code, headers.get("retry-after"), time.monotonic() - started)
+
+            if result.success:
+                PAGES_FETCHED.inc(tier="browser", outcome="ok")
+                # Extract data using the metadata property
+                return {
+                    "url": url,
+                    "title": result.metadata.get("title", "No title available"),
+                    "metadata": {
+                        "description": result.metadata.get("description", ""),
+                        "author": result.metadata.get("author", ""),
+                        "keywords": result.metadata.get("keywords", ""),
+                        "og:title": result.metadata.get("og:title", ""),
+                        "og:description": result.metadata.get("og:description", ""),
+                        "og:image": result.metadata.get("og:image", "")
+                    },
+                    "content": result.markdown,
+                    "status_code": result.status_code,
+                    "links": result.links,
+                    "etag": headers.get("etag"),
+                    "last_modified": headers.get("last-modified"),
+                    "crawled_at": datetime.now().isoformat()
+                }
+            else:
+                print(f"Failed to crawl {url}: Status code {result.status_code}")
+                PAGES_FETCHED.inc(tier="browser", outcome="failed")
+                return None
+        except Exception as e:
+            print(f"Error crawling {url}: {str(e)}")
+            PAGES_FETCHED.inc(tier="browser", outcome="failed")
+            return None
+
     async def crawl_by_domain(self, domain: str) -> List[Dict]:
         """Simple domain crawl - just crawls the main page of the domain"""
         # Format domain for URL if needed
         if not domain.startswith("http"):
             domain = f"https://{domain}"
-        
-        # Create fresh configuration for each request
-        browser_config = BrowserConfig(
-            headless=True,
-            use_persistent_context=False,
-            verbose=False  
+
+        page = await self.fetch_page(domain)
+        return [page] if page else []
+
+    async def crawl_site(
+        self,
+        domain: str,
+        max_depth: int = 0,
+        max_pages: int = 100,
+        concurrency: int = 4,
+        per_host_concurrency: int = 2,
+    ) -> List[Dict]:
+        """Breadth-first crawl of a domain following its internal links.
+
+        With ``max_depth=0`` this is the same as ``crawl_by_domain``.
+        """
+        return [
+            page async for page in self.iter_site(
+                domain, max_depth, max_pages, concurrency, per_host_concurrency
+            )
+        ]
+
+    async def iter_site(
+        self,
+        domain: str,
+        max_depth: int = 0,
+        max_pages: int = 100,
+        concurrency: int = 4,
+        per_host_concurrency: int = 2,
+    ) -> AsyncIterator[Dict]:
+        """Like crawl_site, but yields every page as soon as it is fetched"""
+        if max_depth <= 0:
+            for page in await self.crawl_by_domain(domain):
+                yield page
+            return
+
+        if not domain.startswith("http"):
+            domain = f"https://{domain}"
+
+        site_crawler = SiteCrawler(
+            self,
+            max_depth=max_depth,
+            max_pages=max_pages,
+            concurrency=concurrency,
+            per_host_concurrency=per_host_concurrency,
         )
-        
-        # Create the crawler with fresh configuration
-        async with AsyncWebCrawler(config=browser_config) as crawler:
-            try:
-                # Crawl the main domain page
-                result = await crawler.arun(
-                    url=domain,
-                    config=CrawlerRunConfig()
-                )
-                
-                if result.success:
-                    # Extract data using the metadata property
-                    extracted_data = {
-                        "url": domain,
-                        "title": result.metadata.get("title", "No title available"),
-                        "metadata": {
-                            "description": result.metadata.get("description", ""),
-                            "author": result.metadata.get("author", ""),
-                            "keywords": result.metadata.get("keywords", ""),
-                            "og:title": result.metadata.get("og:title", ""),
-                            "og:description": result.metadata.get("og:description", ""),
-                            "og:image": result.metadata.get("og:image", "")
-                        },
-                        "content": result.markdown,
-                        "status_code": result.status_code,
-                        "links": result.links,
-                        "crawled_at": datetime.now().isoformat()
-                    }
-                    return [extracted_data]
-                else:
-                    print(f"Failed to crawl {domain}: Status code {result.status_code}")
-                    return []
-            except Exception as e:
-                print(f"Error crawling {domain}: {str(e)}")
-                return []
+        async for page in site_crawler.iter_pages(domain):
+            yield page
 
 # subprocess-based usage
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        sys.stderr.write("Usage: python crawler.py <domain>\n")
+    if len(sys.argv) < 2 or len(sys.argv) > 4:
+        sys.stderr.write("Usage: python -m app.crawler.crawler <domain> [max_depth] [max_pages]\n")
         json_response = json.dumps({"success": False, "error": "Invalid arguments"})
         sys.stdout.write(json_response)
         sys.exit(1)
 
     domain = sys.argv[1]
+    max_depth = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    max_pages = int(sys.argv[3]) if len(sys.argv) > 3 else 100
 
     async def run():
         try:
-            crawler = WebCrawler()
-            result = await crawler.crawl_by_domain(domain)
+            if max_depth > 0:
+                # Share a few browsers across the crawl instead of one per page
+                scheduler = PolitenessScheduler()
+                async with BrowserPool(size=4, health_interval=0) as pool:
+                    crawler = WebCrawler(pool, scheduler)
+                    result = await crawler.crawl_site(domain, max_depth=max_depth, max_pages=max_pages)
+                await crawler.close()
+                await scheduler.close()
+            else:
+                crawler = WebCrawler()
+                result = await crawler.crawl_by_domain(domain)
+                await crawler.close()
             if result:
                 # Use json.dumps once with the entire response
                 json_response = json.dumps({"success": True, "data": result})
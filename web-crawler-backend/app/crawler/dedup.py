@@ -0,0 +1,225 @@
+import os
+import re
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import xxhash
+
+from app.database.db import Database
+
+_WORD = re.compile(r"\w+")
+
+# Pages shorter than this have too few shingles for a meaningful fingerprint
+MIN_WORDS = 20
+SHINGLE_SIZE = 3
+
+
+def simhash(text: str) -> Optional[int]:
+    """64-bit SimHash of the word 3-shingles of text, or None if text is too short"""
+    words = _WORD.findall((text or "").lower())
+    if len(words) < MIN_WORDS:
+        return None
+
+    shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+    hashes = np.fromiter(
+        (xxhash.xxh64_intdigest(shingle.encode("utf-8")) for shingle in shingles),
+        dtype="<u8", count=len(shingles)
+    )
+    # Row i holds the 64 bits of hash i, least significant first
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little")
+    majority = (bits.sum(axis=0, dtype=np.int64) * 2 > len(shingles)).astype(np.uint8)
+    return int(np.packbits(majority, bitorder="little").view("<u8")[0])
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class _Buckets:
+    """Multimap from integer keys to positions, kept compact.
+
+    Keys and positions live in two NumPy arrays sorted by key, so a lookup
+    is a binary search. New entries go to a small unsorted tail (plain
+    arrays, scanned with NumPy) that is merged into the sorted arrays once
+    it outgrows a 64th of them, which keeps both inserts and the tail scan
+    cheap.
+    ``typecode`` is the array typecode of the keys.
+    """
+
+    MIN_TAIL = 1024
+
+    def __init__(self, typecode: str):
+        self._typecode = typecode
+        self._dtype = np.dtype(("u" if typecode.isupper() else "i") + str(array(typecode).itemsize))
+        self._keys = np.empty(0, dtype=self._dtype)
+        self._positions = np.empty(0, dtype=np.uint32)
+        self._tail_keys = array(typecode)
+        self._tail_positions = array("I")
+
+    def add(self, key: int, position: int):
+        self._tail_keys.append(key)
+        self._tail_positions.append(position)
+        if len(self._tail_keys) > max(self.MIN_TAIL, len(self._keys) // 64):
+            self._merge()
+
+    def _merge(self):
+        tail_keys = np.frombuffer(self._tail_keys, dtype=self._dtype)
+        tail_positions = np.frombuffer(self._tail_positions, dtype=np.uint32)
+        order = np.argsort(tail_keys, kind="stable")
+        # Inserting after equal keys keeps each key's positions oldest first
+        at = np.searchsorted(self._keys, tail_keys[order], side="right")
+        self._keys = np.insert(self._keys, at, tail_keys[order])
+        self._positions = np.insert(self._positions, at, tail_positions[order])
+        self._tail_keys, self._tail_positions = array(self._typecode), array("I")
+
+    def get(self, key: int) -> List[int]:
+        """Positions stored under key, oldest first"""
+        needle = self._dtype.type(key)
+        start = int(np.searchsorted(self._keys, needle, side="left"))
+        end = int(np.searchsorted(self._keys, needle, side="right"))
+        found = self._positions[start:end].tolist()
+        if self._tail_keys:
+            tail = np.frombuffer(self._tail_keys, dtype=self._dtype)
+            found.extend(self._tail_positions[i] for i in np.flatnonzero(tail == needle).tolist())
+        return found
+
+
+class SimHashIndex:
+    """In-memory index for finding fingerprints within max_distance bits.
+
+    The 64 bits are split into max_distance + 1 bands; by the pigeonhole
+    principle two fingerprints that differ in at most max_distance bits
+    agree exactly on at least one band, so a lookup only compares against
+    the few entries sharing a band value. Fingerprints and ids are kept in
+    flat arrays, and the band tables and the id lookup are sorted arrays of
+    (key, position) rather than Python dicts, so the index takes about 50
+    bytes per page at the default max_distance: around 50 MB for a million
+    pages.
+    """
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        bands = max_distance + 1
+        widths = [64 // bands + (1 if i < 64 % bands else 0) for i in range(bands)]
+        self._bands: List[Tuple[int, int]] = []
+        self._tables: List[_Buckets] = []
+        shift = 0
+        for width in widths:
+            self._bands.append((shift, (1 << width) - 1))
+            self._tables.append(_Buckets("H" if width <= 16 else "I" if width <= 32 else "Q"))
+            shift += width
+        self._fingerprints = array("Q")
+        # Removed pages leave id -1 at their position
+        self._ids = array("q")
+        self._positions = _Buckets("q")
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, page_id: int) -> bool:
+        return self._position(page_id) is not None
+
+    def _position(self, page_id: int) -> Optional[int]:
+        for position in self._positions.get(page_id):
+            if self._ids[position] == page_id:
+                return position
+        return None
+
+    def add(self, fingerprint: int, page_id: int):
+        position = len(self._ids)
+        self._fingerprints.append(fingerprint)
+        self._ids.append(page_id)
+        self._positions.add(page_id, position)
+        self._count += 1
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            table.add((fingerprint >> shift) & mask, position)
+
+    def remove(self, page_id: int):
+        """Forget a page, e.g. because its content changed"""
+        position = self._position(page_id)
+        if position is not None:
+            self._ids[position] = -1
+            self._count -= 1
+
+    def find(self, fingerprint: int) -> Optional[int]:
+        """Id of the closest indexed fingerprint within max_distance, if any"""
+        best_id, best_distance = None, self.max_distance + 1
+        for table, (shift, mask) in zip(self._tables, self._bands):
+            for position in table.get((fingerprint >> shift) & mask):
+                if self._ids[position] < 0:
+                    continue
+                distance = hamming(fingerprint, self._fingerprints[position])
+                if distance < best_distance:
+                    best_id, best_distance = self._ids[position], distance
+                    if distance == 0:
+                        return best_id
+        return best_id
+
+
+class NearDuplicateDetector:
+    """Marks near-duplicate pages so they reuse their canonical page's analysis.
+
+    Fingerprints are stored in crawled_pages.simhash; rows whose
+    canonical_id is set point at the page they duplicate. Only canonical
+    pages are indexed, and the index is rebuilt from the table by load().
+    """
+
+    def __init__(self, database: Database, max_distance: Optional[int] = None):
+        self.database = database
+        self.max_distance = (
+            max_distance if max_distance is not None else int(os.getenv("SIMHASH_MAX_DISTANCE", "3"))
+        )
+        self.index = SimHashIndex(self.max_distance)
+        self.loaded = False
+
+    async def load(self):
+        """Rebuild the in-memory index from the stored fingerprints"""
+        index = SimHashIndex(self.max_distance)
+        async for page_id, fingerprint in self.database.iter_canonical_fingerprints():
+            index.add(fingerprint, page_id)
+        self.index = index
+        self.loaded = True
+
+    async def prepare(self, pages: List[Dict]):
+        """Attach a simhash to every crawled page dict before it is stored.
+
+        Also loads the index on first use, which must happen before the
+        pages are stored so they are not found as their own duplicates.
+        """
+        if not self.loaded:
+            await self.load()
+        for page in pages:
+            page["simhash"] = simhash(page.get("content") or "")
+
+    async def assign(self, page_ids: List[int], pages: List[Dict]) -> Dict[int, int]:
+        """Index new canonical pages and record duplicates.
+
+        page_ids and pages are the output and input of store_crawled_data.
+        Returns {duplicate page id: canonical page id}.
+        """
+        duplicates = {}
+        for page_id, page in zip(page_ids, pages):
+            fingerprint = page.get("simhash")
+            # Re-crawled pages that are already indexed keep their entry
+            if fingerprint is None or page_id in duplicates or page_id in self.index:
+                continue
+            canonical_id = self.index.find(fingerprint)
+            if canonical_id is None:
+                self.index.add(fingerprint, page_id)
+            elif canonical_id != page_id:
+                duplicates[page_id] = canonical_id
+
+        await self.database.set_canonical_pages(duplicates)
+        return duplicates
+
+    async def reassign(self, page_ids: List[int], pages: List[Dict]) -> Dict[int, int]:
+        """Like assign, for stored pages whose content changed on a re-crawl.
+
+        Their old fingerprints are dropped from the index first;
+        update_crawled_data has already cleared their canonical_id.
+        """
+        for page_id in page_ids:
+            self.index.remove(page_id)
+        return await self.assign(page_ids, pages)
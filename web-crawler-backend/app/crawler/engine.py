@@ -0,0 +1,166 @@
+import asyncio
+from typing import AsyncIterator, Dict, Iterable, List, Optional, Set
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+# Query parameters that only track the visitor and never change the page
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "mc_cid", "mc_eid", "ref", "ref_src"}
+
+# Links to these are never HTML pages worth rendering
+SKIPPED_EXTENSIONS = (
+    ".pdf", ".zip", ".gz", ".tar", ".rar", ".7z", ".exe", ".dmg", ".iso",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg", ".ico", ".bmp",
+    ".mp3", ".mp4", ".avi", ".mov", ".webm", ".wav",
+    ".css", ".js", ".json", ".xml", ".woff", ".woff2", ".ttf",
+)
+
+
+def normalize_url(url: str, base: Optional[str] = None) -> Optional[str]:
+    """Canonical form of a URL used for frontier deduplication.
+
+    Resolves relative links against ``base``, lowercases scheme and host,
+    drops default ports, fragments and tracking parameters and sorts the
+    query string. Returns None for anything that is not http(s).
+    """
+    if not url:
+        return None
+    url = url.strip()
+    if base:
+        url = urljoin(base, url)
+
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in ("http", "https"):
+        return None
+
+    host = (parts.hostname or "").lower()
+    if not host:
+        return None
+    port = parts.port
+    if port and not ((scheme == "http" and port == 80) or (scheme == "https" and port == 443)):
+        host = f"{host}:{port}"
+
+    path = parts.path or "/"
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    ))
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def host_of(url: str) -> str:
+    """Host of a URL without a leading ``www.``, used to match internal links"""
+    host = (urlsplit(url).hostname or "").lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def internal_links(page: Dict) -> Iterable[str]:
+    """Yield the hrefs crawl4ai classified as internal for a fetched page"""
+    links = page.get("links") or {}
+    for link in links.get("internal", []):
+        href = link.get("href") if isinstance(link, dict) else link
+        if href:
+            yield href
+
+
+def crawlable_links(page: Dict, url: str, site: str) -> Iterable[str]:
+    """Normalized internal links of a page fetched from url that stay on site
+    (a host_of value) and may be HTML; may repeat"""
+    for href in internal_links(page):
+        link = normalize_url(href, base=url)
+        if link is None or host_of(link) != site:
+            continue
+        if urlsplit(link).path.lower().endswith(SKIPPED_EXTENSIONS):
+            continue
+        yield link
+
+
+class SiteCrawler:
+    """Breadth-first crawl of one site over a bounded, deduplicated frontier.
+
+    ``concurrency`` workers pull ``(url, depth)`` pairs from the frontier and
+    fetch them through ``WebCrawler.fetch_page``; at most
+    ``per_host_concurrency`` fetches run against the same host at once.
+    """
+
+    def __init__(
+        self,
+        crawler,
+        max_depth: int = 1,
+        max_pages: int = 100,
+        concurrency: int = 4,
+        per_host_concurrency: int = 2,
+    ):
+        self.crawler = crawler
+        self.max_depth = max_depth
+        self.max_pages = max_pages
+        self.concurrency = max(1, concurrency)
+        self.per_host_concurrency = max(1, per_host_concurrency)
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = host_of(url)
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_concurrency)
+        return self._host_limits[host]
+
+    async def _fetch(self, url: str) -> Optional[Dict]:
+        async with self._host_limit(url):
+            return await self.crawler.fetch_page(url)
+
+    async def iter_pages(self, start_url: str) -> AsyncIterator[Dict]:
+        """Yield pages as soon as they are fetched, in roughly BFS order"""
+        root = normalize_url(start_url)
+        if root is None:
+            return
+        site = host_of(root)
+
+        frontier: asyncio.Queue = asyncio.Queue()
+        results: asyncio.Queue = asyncio.Queue()
+        seen: Set[str] = {root}
+        frontier.put_nowait((root, 0))
+        done = object()
+
+        async def worker():
+            while True:
+                url, depth = await frontier.get()
+                try:
+                    page = await self._fetch(url)
+                    if not page:
+                        continue
+                    await results.put(page)
+                    if depth >= self.max_depth:
+                        continue
+                    for link in crawlable_links(page, url, site):
+                        # seen doubles as the page budget: nothing past
+                        # max_pages is ever enqueued
+                        if len(seen) >= self.max_pages:
+                            break
+                        if link in seen:
+                            continue
+                        seen.add(link)
+                        frontier.put_nowait((link, depth + 1))
+                except Exception as e:
+                    print(f"Error processing {url}: {e}")
+                finally:
+                    frontier.task_done()
+
+        async def finish():
+            await frontier.join()
+            await results.put(done)
+
+        tasks = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        tasks.append(asyncio.create_task(finish()))
+        try:
+            while True:
+                page = await results.get()
+                if page is done:
+                    break
+                yield page
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def crawl(self, start_url: str) -> List[Dict]:
+        """Crawl the site and return every fetched page"""
+        return [page async for page in self.iter_pages(start_url)]
@@ -0,0 +1,269 @@
+import asyncio
+import os
+import re
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from bs4 import BeautifulSoup
+from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
+
+from app.crawler.engine import host_of, normalize_url
+from app.crawler.politeness import USER_AGENT, PolitenessScheduler
+from app.monitoring.metrics import PAGES_FETCHED, timed
+
+HTTP = "http"
+BROWSER = "browser"
+
+# Elements that never contribute readable text
+_NON_CONTENT_TAGS = ["script", "style", "noscript", "template", "svg", "iframe", "canvas"]
+# Where client-side frameworks mount the app
+_MOUNT_POINTS = re.compile(r"^(root|app|__next|__nuxt|___gatsby|svelte)$")
+_STATUS_FOR_BROWSER = (401, 403, 429, 503)
+
+
+def extract_page(url: str, html: bytes, status_code: int, headers: httpx.Headers) -> Tuple[Optional[Dict], bool]:
+    """Build the crawled page dict from raw HTML.
+
+    Returns (page, is_js_shell); is_js_shell means the HTML is an empty
+    client-side app and the page has to be rendered in a browser.
+    """
+    soup = BeautifulSoup(html, "lxml")
+    noscript_text = " ".join(tag.get_text(" ", strip=True) for tag in soup.find_all("noscript"))
+
+    def meta(*names: str) -> str:
+        for name in names:
+            tag = soup.find("meta", attrs={"name": name}) or soup.find("meta", attrs={"property": name})
+            if tag and tag.get("content"):
+                return tag["content"].strip()
+        return ""
+
+    title = soup.title.get_text(strip=True) if soup.title else ""
+    metadata = {
+        "description": meta("description"),
+        "author": meta("author"),
+        "keywords": meta("keywords"),
+        "og:title": meta("og:title"),
+        "og:description": meta("og:description"),
+        "og:image": meta("og:image")
+    }
+
+    # Link classification mirrors crawl4ai's: same site (ignoring www.) is internal
+    site = host_of(url)
+    links = {"internal": [], "external": []}
+    seen = set()
+    for anchor in soup.find_all("a", href=True):
+        href = normalize_url(anchor["href"], url)
+        if href is None or href in seen:
+            continue
+        seen.add(href)
+        kind = "internal" if host_of(href) == site else "external"
+        links[kind].append({
+            "href": href,
+            "text": anchor.get_text(" ", strip=True),
+            "title": anchor.get("title", ""),
+            "base_domain": host_of(href)
+        })
+
+    for tag in soup.find_all(_NON_CONTENT_TAGS):
+        tag.decompose()
+    body = soup.body or soup
+    text = body.get_text(" ", strip=True)
+    if is_js_shell(soup, text, noscript_text):
+        return None, True
+
+    with timed("markdown", url=url):
+        markdown = DefaultMarkdownGenerator().generate_markdown(str(body), base_url=url, citations=False)
+    page = {
+        "url": url,
+        "title": title or "No title available",
+        "metadata": metadata,
+        "content": markdown.raw_markdown,
+        "status_code": status_code,
+        "links": links,
+        "etag": headers.get("etag"),
+        "last_modified": headers.get("last-modified"),
+        "crawled_at": datetime.now().isoformat()
+    }
+    return page, False
+
+
+def is_js_shell(soup: BeautifulSoup, text: str, noscript_text: str, min_text: Optional[int] = None) -> bool:
+    """Heuristics for HTML whose content only appears after JavaScript runs.
+
+    Called after scripts are removed, with the page's visible text.
+    """
+    min_text = min_text if min_text is not None else int(os.getenv("FETCH_MIN_TEXT", "200"))
+    if len(text) < min_text:
+        return True
+    if len(text) < 1000:
+        # "You need to enable JavaScript to run this app."
+        if "javascript" in noscript_text.lower():
+            return True
+        for mount in soup.find_all(id=_MOUNT_POINTS):
+            if not mount.get_text(strip=True):
+                return True
+    return False
+
+
+class HttpFetcher:
+    """Fetches pages with a pooled HTTP client instead of a browser.
+
+    Much cheaper than a render, but only correct for server-rendered HTML;
+    fetch() reports when a page needs the browser instead.
+    """
+
+    def __init__(
+        self,
+        scheduler: Optional[PolitenessScheduler] = None,
+        timeout: float = 20.0,
+        max_bytes: Optional[int] = None,
+    ):
+        self.scheduler = scheduler
+        self.timeout = timeout
+        self.max_bytes = max_bytes if max_bytes is not None else int(os.getenv("FETCH_MAX_BYTES", str(5 * 1024 * 1024)))
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout, connect=10.0),
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+                headers={
+                    "User-Agent": f"Mozilla/5.0 (compatible; {USER_AGENT})",
+                    "Accept": "text/html,application/xhtml+xml;q=0.9,*/*;q=0.5"
+                }
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    @asynccontextmanager
+    async def _slot(self, url: str):
+        if self.scheduler is None:
+            yield None
+            return
+        async with self.scheduler.slot(url) as slot:
+            yield slot
+
+    async def fetch(self, url: str) -> Tuple[Optional[Dict], bool]:
+        """Fetch url over plain HTTP. Returns (page, needs_browser)."""
+        await self.start()
+        page, needs_browser = await self._fetch(url)
+        if needs_browser:
+            outcome = "fallback"
+        else:
+            outcome = "ok" if page is not None else "failed"
+        PAGES_FETCHED.inc(tier="http", outcome=outcome)
+        return page, needs_browser
+
+    async def _fetch(self, url: str) -> Tuple[Optional[Dict], bool]:
+        try:
+            async with self._slot(url) as slot:
+                if slot is not None and not slot.allowed:
+                    print(f"Skipping {url}: disallowed by robots.txt")
+                    return None, False
+                with timed("fetch_http", url=url) as span:
+                    async with self._client.stream("GET", url) as response:
+                        span["status"] = response.status_code
+                        if slot is not None:
+                            slot.record(response.status_code, response.headers.get("retry-after"))
+                        content_type = response.headers.get("content-type", "").lower()
+                        if response.status_code in _STATUS_FOR_BROWSER:
+                            # Often bot protection that lets real browsers through
+                            return None, True
+                        if response.status_code >= 400:
+                            print(f"Failed to crawl {url}: Status code {response.status_code}")
+                            return None, False
+                        if content_type and "html" not in content_type:
+                            print(f"Skipping {url}: not HTML ({content_type})")
+                            return None, False
+                        chunks, size = [], 0
+                        async for chunk in response.aiter_bytes():
+                            chunks.append(chunk)
+                            size += len(chunk)
+                            if size > self.max_bytes:
+                                break
+                        html = b"".join(chunks)
+                        status_code, headers = response.status_code, response.headers
+                        span["bytes"] = len(html)
+        except httpx.HTTPError as e:
+            # TLS quirks, HTTP/2-only servers, ...: let the browser try
+            print(f"HTTP fetch of {url} failed, falling back to the browser: {e}")
+            return None, True
+
+        # Parsing and markdown conversion are CPU-bound; keep them off the event loop
+        return await asyncio.to_thread(extract_page, url, html, status_code, headers)
+
+
+class TieredFetcher:
+    """Tries the HTTP fast path first and renders in a browser only when needed.
+
+    Which tier works is tracked per host: after ``browser_after`` HTTP
+    fetches in a row needed the browser, the host's pages go straight to
+    it, with one HTTP probe every ``reprobe_every`` fetches in case the
+    site changed. A single JS-only page does not slow down a static site.
+    """
+
+    def __init__(
+        self,
+        render: Callable[[str], Awaitable[Optional[Dict]]],
+        http: HttpFetcher,
+        browser_after: int = 3,
+        reprobe_every: int = 20,
+        max_hosts: int = 10000,
+    ):
+        self.render = render
+        self.http = http
+        self.browser_after = browser_after
+        self.reprobe_every = reprobe_every
+        self.max_hosts = max_hosts
+        # host -> [consecutive HTTP misses, browser fetches since the last probe]
+        self._hosts: "OrderedDict[str, List[int]]" = OrderedDict()
+        self.counts = {HTTP: 0, BROWSER: 0, "fallbacks": 0}
+
+    def _state(self, url: str) -> List[int]:
+        host = urlsplit(url).netloc.lower()
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = [0, 0]
+            while len(self._hosts) > self.max_hosts:
+                self._hosts.popitem(last=False)
+        self._hosts.move_to_end(host)
+        return state
+
+    def tier_for(self, url: str) -> str:
+        """The tier the next fetch of url will try first"""
+        misses, since_probe = self._state(url)
+        if misses >= self.browser_after and since_probe < self.reprobe_every:
+            return BROWSER
+        return HTTP
+
+    async def fetch_page(self, url: str) -> Optional[Dict]:
+        state = self._state(url)
+        if self.tier_for(url) == HTTP:
+            state[1] = 0
+            page, needs_browser = await self.http.fetch(url)
+            if not needs_browser:
+                state[0] = 0
+                if page is not None:
+                    self.counts[HTTP] += 1
+                return page
+            state[0] += 1
+            self.counts["fallbacks"] += 1
+        else:
+            state[1] += 1
+
+        page = await self.render(url)
+        if page is not None:
+            self.counts[BROWSER] += 1
+        return page
+
+    async def close(self):
+        await self.http.close()
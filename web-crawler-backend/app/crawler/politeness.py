@@ -0,0 +1,321 @@
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import httpx
+
+# Product token matched against robots.txt User-agent lines
+USER_AGENT = "web-crawler-with-llm"
+
+# robots.txt files beyond this size are truncated (RFC 9309 asks for at least 500 KiB)
+MAX_ROBOTS_BYTES = 512 * 1024
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delay-seconds or HTTP date)"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class RobotsRules(RobotFileParser):
+    """RobotFileParser that also reads fractional Crawl-delay values, which
+    the standard library ignores (it only accepts whole seconds)"""
+
+    def __init__(self, url: str = ""):
+        super().__init__(url)
+        self.delays: Dict[str, float] = {}
+
+    def parse(self, lines):
+        super().parse(lines)
+        agents, in_rules = [], False
+        for line in lines:
+            line = line.split("#", 1)[0].strip()
+            if ":" not in line:
+                continue
+            key, value = (part.strip() for part in line.split(":", 1))
+            key = key.lower()
+            if key == "user-agent":
+                # A User-agent line after rules starts a new group
+                if in_rules:
+                    agents, in_rules = [], False
+                agents.append(value.lower())
+                continue
+            in_rules = True
+            if key == "crawl-delay":
+                try:
+                    delay = float(value)
+                except ValueError:
+                    continue
+                for agent in agents:
+                    self.delays.setdefault(agent, delay)
+
+    def crawl_delay(self, useragent: str) -> Optional[float]:
+        useragent = useragent.lower()
+        for agent, delay in self.delays.items():
+            if agent != "*" and agent in useragent:
+                return delay
+        return self.delays.get("*")
+
+
+class RobotsCache:
+    """robots.txt rules per origin, fetched once and cached for ``ttl`` seconds.
+
+    Following RFC 9309, a missing robots.txt (4xx) allows everything and a
+    server error disallows everything; both, and unreachable hosts, are
+    retried after a few minutes rather than the full TTL.
+    """
+
+    def __init__(self, ttl: Optional[float] = None, timeout: float = 10.0):
+        self.ttl = ttl if ttl is not None else float(os.getenv("ROBOTS_TTL", "3600"))
+        self.timeout = timeout
+        self._entries: Dict[str, Tuple[float, RobotsRules]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                headers={"User-Agent": f"Mozilla/5.0 (compatible; {USER_AGENT})"}
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get(self, url: str) -> RobotsRules:
+        """The parsed robots.txt of url's origin"""
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}".lower()
+        entry = self._entries.get(origin)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+
+        # One fetch per origin even when many of its URLs arrive at once
+        async with self._locks.setdefault(origin, asyncio.Lock()):
+            entry = self._entries.get(origin)
+            if entry is not None and entry[0] > time.monotonic():
+                return entry[1]
+            parser, ttl = await self._fetch(origin)
+            self._entries[origin] = (time.monotonic() + ttl, parser)
+            return parser
+
+    async def _fetch(self, origin: str) -> Tuple[RobotsRules, float]:
+        await self.start()
+        parser = RobotsRules(f"{origin}/robots.txt")
+        retry_soon = min(self.ttl, 300.0)
+        try:
+            response = await self._client.get(f"{origin}/robots.txt")
+        except httpx.HTTPError as e:
+            # The page fetch itself will most likely fail too; do not block it here
+            print(f"Could not fetch {origin}/robots.txt: {e}")
+            parser.allow_all = True
+            return parser, retry_soon
+
+        if response.status_code >= 500:
+            parser.disallow_all = True
+            return parser, retry_soon
+        if response.status_code >= 400:
+            parser.allow_all = True
+            return parser, self.ttl
+        parser.parse(response.text[:MAX_ROBOTS_BYTES].splitlines())
+        return parser, self.ttl
+
+
+class HostState:
+    """Pacing state of one host"""
+
+    def __init__(self, per_host_concurrency: int, burst: float):
+        self.semaphore = asyncio.Semaphore(per_host_concurrency)
+        self.lock = asyncio.Lock()
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.crawl_delay = 0.0
+        # Multiplies the request interval; raised on 429/503, errors and
+        # latency spikes, decays back to 1 on healthy responses
+        self.backoff = 1.0
+        self.blocked_until = 0.0
+        # Moving average of response time in seconds
+        self.latency: Optional[float] = None
+        self.requests = 0
+        self.throttled = 0
+
+
+class FetchSlot:
+    """Permission to fetch one URL; report the response with record()"""
+
+    def __init__(self, allowed: bool = True):
+        self.allowed = allowed
+        self.status_code: Optional[int] = None
+        self.retry_after: Optional[str] = None
+        self.elapsed: Optional[float] = None
+
+    def record(self, status_code: Optional[int], retry_after: Optional[str] = None, elapsed: Optional[float] = None):
+        """elapsed is the response time when the slot was also held for other work"""
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.elapsed = elapsed
+
+
+class PolitenessScheduler:
+    """Host-aware pacing in front of the fetcher.
+
+    Every fetch goes through ``slot(url)``, which checks robots.txt, then
+    waits for a per-host token (one every ``min_delay`` seconds, or the
+    site's Crawl-delay if longer, times the host's backoff, with up to
+    ``burst`` requests at once) and finally for one of ``concurrency``
+    global slots. Since each host has at most ``per_host_concurrency``
+    requests waiting for a global slot, the FIFO global queue serves
+    hosts round-robin instead of letting one big site starve the rest.
+    """
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        per_host_concurrency: Optional[int] = None,
+        min_delay: Optional[float] = None,
+        burst: Optional[float] = None,
+        max_backoff: float = 32.0,
+        spike_factor: float = 3.0,
+        respect_robots: Optional[bool] = None,
+        robots: Optional[RobotsCache] = None,
+    ):
+        self.concurrency = concurrency if concurrency is not None else int(os.getenv("CRAWL_CONCURRENCY", "16"))
+        self.per_host_concurrency = (
+            per_host_concurrency if per_host_concurrency is not None else int(os.getenv("HOST_CONCURRENCY", "2"))
+        )
+        self.min_delay = min_delay if min_delay is not None else float(os.getenv("HOST_MIN_DELAY", "0.5"))
+        self.burst = burst if burst is not None else float(os.getenv("HOST_BURST", "2"))
+        self.max_backoff = max_backoff
+        # A response this many times slower than the host's average counts as overload
+        self.spike_factor = spike_factor
+        self.respect_robots = (
+            respect_robots if respect_robots is not None
+            else os.getenv("RESPECT_ROBOTS", "true").lower() not in ("0", "false", "no")
+        )
+        self.robots = robots or RobotsCache()
+        self._global = asyncio.Semaphore(max(1, self.concurrency))
+        self._hosts: Dict[str, HostState] = {}
+
+    async def start(self):
+        await self.robots.start()
+
+    async def close(self):
+        await self.robots.close()
+
+    def _host(self, url: str) -> HostState:
+        host = (urlsplit(url).netloc or "").lower()
+        state = self._hosts.get(host)
+        if state is None:
+            if len(self._hosts) >= 10000:
+                self._forget_idle_hosts()
+            state = self._hosts[host] = HostState(max(1, self.per_host_concurrency), self.burst)
+        return state
+
+    def _forget_idle_hosts(self):
+        now = time.monotonic()
+        for host, state in list(self._hosts.items()):
+            if not state.semaphore.locked() and state.backoff == 1.0 and state.blocked_until < now:
+                del self._hosts[host]
+
+    def interval(self, state: HostState) -> float:
+        return max(self.min_delay, state.crawl_delay) * state.backoff
+
+    @asynccontextmanager
+    async def slot(self, url: str) -> AsyncIterator[FetchSlot]:
+        """Wait until url may be fetched. The slot is not allowed if robots.txt forbids it."""
+        state = self._host(url)
+        if self.respect_robots:
+            parser = await self.robots.get(url)
+            if not parser.can_fetch(USER_AGENT, url):
+                yield FetchSlot(allowed=False)
+                return
+            rate = parser.request_rate(USER_AGENT)
+            state.crawl_delay = max(
+                float(parser.crawl_delay(USER_AGENT) or 0),
+                rate.seconds / rate.requests if rate and rate.requests else 0.0
+            )
+
+        async with state.semaphore:
+            await self._take_token(state)
+            async with self._global:
+                slot = FetchSlot()
+                started = time.monotonic()
+                try:
+                    yield slot
+                except BaseException:
+                    slot.record(None)
+                    raise
+                finally:
+                    elapsed = slot.elapsed if slot.elapsed is not None else time.monotonic() - started
+                    self._observe(state, slot, elapsed)
+
+    async def _take_token(self, state: HostState):
+        async with state.lock:
+            while True:
+                now = time.monotonic()
+                if now < state.blocked_until:
+                    await asyncio.sleep(state.blocked_until - now)
+                    continue
+                interval = self.interval(state)
+                if interval <= 0:
+                    return
+                state.tokens = min(self.burst, state.tokens + (now - state.updated) / interval)
+                state.updated = now
+                if state.tokens >= 1:
+                    state.tokens -= 1
+                    return
+                await asyncio.sleep((1 - state.tokens) * interval)
+
+    def _observe(self, state: HostState, slot: FetchSlot, elapsed: float):
+        """Adapt the host's pace to how the last response went"""
+        state.requests += 1
+        status = slot.status_code
+        if status in (429, 503):
+            state.throttled += 1
+            state.backoff = min(self.max_backoff, state.backoff * 2)
+            wait = parse_retry_after(slot.retry_after)
+            if wait:
+                # Cap it so a bogus header cannot park a host for hours
+                state.blocked_until = max(state.blocked_until, time.monotonic() + min(wait, 600.0))
+            return
+        if status is None or status >= 500:
+            state.backoff = min(self.max_backoff, state.backoff * 1.5)
+            return
+
+        if state.latency is not None and elapsed > self.spike_factor * state.latency:
+            state.backoff = min(self.max_backoff, state.backoff * 1.5)
+        else:
+            state.backoff = max(1.0, state.backoff * 0.9)
+        state.latency = elapsed if state.latency is None else 0.8 * state.latency + 0.2 * elapsed
+
+    def stats(self) -> Dict[str, Dict]:
+        """Pacing state per host"""
+        return {
+            host: {
+                "interval": self.interval(state),
+                "backoff": state.backoff,
+                "latency": state.latency,
+                "requests": state.requests,
+                "throttled": state.throttled,
+            }
+            for host, state in self._hosts.items()
+        }
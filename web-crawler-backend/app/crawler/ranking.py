@@ -0,0 +1,43 @@
+import re
+from typing import Dict, List, Optional, Tuple
+
+from rank_bm25 import BM25Plus
+
+_WORD = re.compile(r"\w+")
+
+# The title and description say more about relevance than body text
+TITLE_WEIGHT = 3
+
+
+def tokenize(text: str) -> List[str]:
+    return _WORD.findall((text or "").lower())
+
+
+def page_tokens(page: Dict) -> List[str]:
+    metadata = page.get("metadata") or {}
+    head = " ".join([page.get("title") or "", metadata.get("description") or "", metadata.get("keywords") or ""])
+    return tokenize(head) * TITLE_WEIGHT + tokenize(page.get("content") or "")
+
+
+def rank_pages(query: str, pages: List[Dict], top_k: Optional[int] = None) -> List[Tuple[int, float]]:
+    """BM25 relevance of crawled pages to a keyword query.
+
+    Returns (index into pages, score) for pages containing at least one
+    query term, best first, cut to top_k. BM25+ is used because plain
+    BM25's idf turns negative for terms in over half of a small corpus.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms or not pages:
+        return []
+
+    corpus = [page_tokens(page) for page in pages]
+    if not any(corpus):
+        return []
+    scores = BM25Plus(corpus).get_scores(terms)
+    matching = [
+        (index, float(scores[index]))
+        for index, tokens in enumerate(corpus)
+        if not set(terms).isdisjoint(tokens)
+    ]
+    matching.sort(key=lambda item: item[1], reverse=True)
+    return matching[:top_k] if top_k is not None else matching
@@ -0,0 +1,100 @@
+import asyncio
+import os
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.crawler.politeness import PolitenessScheduler
+
+# Outcomes of a conditional request
+UNCHANGED = "unchanged"   # 304, or the same validators came back
+CHANGED = "changed"       # validators differ: re-render
+UNKNOWN = "unknown"       # no validators to compare: re-render and compare the content hash
+GONE = "gone"             # 404/410: leave the stored copy alone
+FAILED = "failed"         # network error or unexpected status
+
+
+class Revalidator:
+    """Checks stored pages with conditional GETs before anything is re-rendered.
+
+    Uses the ETag / Last-Modified saved from the previous crawl. Only pages
+    the server reports as modified (or that have no validators) need a
+    browser render, storage update and new LLM analysis.
+    """
+
+    def __init__(
+        self,
+        concurrency: Optional[int] = None,
+        timeout: float = 15.0,
+        scheduler: Optional[PolitenessScheduler] = None,
+    ):
+        self.concurrency = concurrency if concurrency is not None else int(os.getenv("REVALIDATE_CONCURRENCY", "8"))
+        self.timeout = timeout
+        # Conditional requests are paced like page fetches when given
+        self.scheduler = scheduler
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                follow_redirects=True,
+                headers={"User-Agent": "Mozilla/5.0 (compatible; web-crawler-with-llm)"}
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def check(self, url: str, etag: Optional[str], last_modified: Optional[str]) -> str:
+        """Classify one stored page as UNCHANGED, CHANGED, UNKNOWN, GONE or FAILED"""
+        await self.start()
+        headers = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        try:
+            if self.scheduler is None:
+                status, new_etag, new_last_modified = await self._request(url, headers)
+            else:
+                async with self.scheduler.slot(url) as slot:
+                    if not slot.allowed:
+                        # robots.txt now forbids it: leave the stored copy as it is
+                        return FAILED
+                    status, new_etag, new_last_modified = await self._request(url, headers, slot)
+        except httpx.HTTPError as e:
+            print(f"Revalidation of {url} failed: {e}")
+            return FAILED
+
+        if status == 304:
+            return UNCHANGED
+        if status in (404, 410):
+            return GONE
+        if status >= 400:
+            return FAILED
+        # Some servers ignore conditional headers but still send validators
+        if etag and new_etag:
+            return UNCHANGED if new_etag == etag else CHANGED
+        if last_modified and new_last_modified:
+            return UNCHANGED if new_last_modified == last_modified else CHANGED
+        return UNKNOWN
+
+    async def _request(self, url: str, headers: Dict[str, str], slot=None):
+        # Streamed so that a 304 or an unchanged 200 never downloads the body
+        async with self._client.stream("GET", url, headers=headers) as response:
+            if slot is not None:
+                slot.record(response.status_code, response.headers.get("retry-after"))
+            return response.status_code, response.headers.get("etag"), response.headers.get("last-modified")
+
+    async def check_many(self, pages: List[Dict]) -> Dict[int, str]:
+        """Check stored pages (dicts with id, url, etag, last_modified) concurrently"""
+        limit = asyncio.Semaphore(max(1, self.concurrency))
+
+        async def check_one(page: Dict):
+            async with limit:
+                return page["id"], await self.check(page["url"], page.get("etag"), page.get("last_modified"))
+
+        return dict(await asyncio.gather(*(check_one(page) for page in pages)))
@@ -0,0 +1,162 @@
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import quote_plus
+
+import httpx
+
+from app.crawler.engine import SKIPPED_EXTENSIONS, normalize_url
+
+_WORD = re.compile(r"\w+")
+
+
+def _usable(url: str) -> Optional[str]:
+    url = normalize_url(url)
+    if url is None or url.lower().endswith(SKIPPED_EXTENSIONS):
+        return None
+    return url
+
+
+def read_domains(text: str) -> List[str]:
+    """Domains or URLs from a seed list, one per line, in order and without repeats.
+
+    Only the first field of a line is used, so seed files with tags work
+    too. Blank lines and ``#`` comments are ignored.
+    """
+    domains = []
+    for line in text.splitlines():
+        fields = line.split("#", 1)[0].split()
+        if fields:
+            domains.append(fields[0])
+    return list(dict.fromkeys(domains))
+
+
+class SeedProvider:
+    """Source of candidate URLs for a keyword crawl"""
+
+    async def seeds(self, keyword: str, limit: int) -> List[str]:
+        raise NotImplementedError
+
+
+class FileSeedProvider(SeedProvider):
+    """Seed URLs from a local list, one per line.
+
+    A URL may be followed by whitespace-separated tags; tagged lines are
+    only used for keywords that share a word with their tags, untagged
+    lines for every keyword. Blank lines, ``#`` comments and repeated URLs
+    are ignored. The file is re-read on every call so it can be edited
+    while running.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def seeds(self, keyword: str, limit: int) -> List[str]:
+        terms = set(_WORD.findall(keyword.lower()))
+        urls = []
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except OSError as e:
+            print(f"Could not read seed file {self.path}: {e}")
+            return []
+
+        for line in lines:
+            fields = line.split("#", 1)[0].split()
+            if not fields:
+                continue
+            tags = {word for tag in fields[1:] for word in _WORD.findall(tag.lower())}
+            if tags and not tags & terms:
+                continue
+            url = _usable(fields[0])
+            if url and url not in urls:
+                urls.append(url)
+            if len(urls) >= limit:
+                break
+        return urls
+
+
+class SearchApiSeedProvider(SeedProvider):
+    """Seed URLs from a JSON web search API.
+
+    ``url_template`` is the search URL with ``{query}`` and optionally
+    ``{limit}`` placeholders, e.g. a SearXNG instance:
+    ``https://searx.example/search?q={query}&format=json``. Result URLs
+    are taken from every ``url`` or ``link`` field of objects in the
+    response, which covers SearXNG, Brave and Google CSE style payloads.
+    """
+
+    def __init__(self, url_template: str, headers: Optional[Dict[str, str]] = None, timeout: float = 15.0):
+        self.url_template = url_template
+        self.headers = headers or {}
+        self.timeout = timeout
+
+    async def seeds(self, keyword: str, limit: int) -> List[str]:
+        url = self.url_template.replace("{query}", quote_plus(keyword)).replace("{limit}", str(limit))
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout, follow_redirects=True) as client:
+                response = await client.get(url, headers=self.headers)
+                response.raise_for_status()
+                data = response.json()
+        except (httpx.HTTPError, json.JSONDecodeError) as e:
+            print(f"Seed search for {keyword!r} failed: {e}")
+            return []
+
+        urls = []
+        for found in _result_urls(data):
+            found = _usable(found)
+            if found:
+                urls.append(found)
+            if len(urls) >= limit:
+                break
+        return urls
+
+
+def _result_urls(data) -> Iterable[str]:
+    """Yield url/link values of objects nested anywhere in a JSON document, in order.
+
+    Objects that have a URL are treated as results and not searched further,
+    so nested favicon/profile links are skipped.
+    """
+    if isinstance(data, dict):
+        for key in ("url", "link"):
+            value = data.get(key)
+            if isinstance(value, str):
+                yield value
+                return
+        for value in data.values():
+            if isinstance(value, (dict, list)):
+                yield from _result_urls(value)
+    elif isinstance(data, list):
+        for item in data:
+            yield from _result_urls(item)
+
+
+class CompositeSeedProvider(SeedProvider):
+    """Seeds of several providers, deduplicated, in provider order"""
+
+    def __init__(self, providers: List[SeedProvider]):
+        self.providers = providers
+
+    async def seeds(self, keyword: str, limit: int) -> List[str]:
+        urls = []
+        for provider in self.providers:
+            for url in await provider.seeds(keyword, limit):
+                if url not in urls:
+                    urls.append(url)
+            if len(urls) >= limit:
+                break
+        return urls[:limit]
+
+
+def seed_provider_from_env() -> Optional[CompositeSeedProvider]:
+    """Providers configured by SEED_FILE and SEED_SEARCH_URL (+ SEED_SEARCH_HEADERS),
+    or None when neither is set"""
+    providers: List[SeedProvider] = []
+    if os.getenv("SEED_FILE"):
+        providers.append(FileSeedProvider(os.getenv("SEED_FILE")))
+    if os.getenv("SEED_SEARCH_URL"):
+        headers = json.loads(os.getenv("SEED_SEARCH_HEADERS", "{}"))
+        providers.append(SearchApiSeedProvider(os.getenv("SEED_SEARCH_URL"), headers))
+    return CompositeSeedProvider(providers) if providers else None
@@ -0,0 +1,183 @@
+import argparse
+import asyncio
+import os
+import socket
+from typing import Dict, List, Optional
+
+from app.crawler.browser_pool import BrowserPool
+from app.crawler.crawler import WebCrawler
+from app.crawler.engine import crawlable_links, host_of, normalize_url
+from app.crawler.politeness import PolitenessScheduler
+from app.database.db import Database
+from app.llm.analyzer import OllamaAnalyzer
+from app.llm.cache import AnalysisCache
+from app.monitoring.metrics import timed
+
+
+class CrawlWorker:
+    """Crawls URLs leased from the shared crawl_frontier table.
+
+    Any number of workers, on any number of hosts, can serve one database.
+    Each claims queued URLs with FOR UPDATE SKIP LOCKED, renews its leases
+    every ``lease / 3`` seconds while it works on them, stores the pages and
+    queues their internal links. When a worker dies its leases run out and
+    whichever worker heartbeats next puts the URLs back in the queue; a URL
+    is given up after ``max_attempts`` claims.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        crawler: WebCrawler,
+        analyzer: Optional[OllamaAnalyzer] = None,
+        worker_id: Optional[str] = None,
+        concurrency: Optional[int] = None,
+        lease: Optional[float] = None,
+        max_attempts: Optional[int] = None,
+        poll_interval: float = 1.0,
+    ):
+        self.database = database
+        self.crawler = crawler
+        # Pages are analysed as they are stored when given
+        self.analyzer = analyzer
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+        self.concurrency = concurrency if concurrency is not None else int(os.getenv("WORKER_CONCURRENCY", "4"))
+        self.lease = lease if lease is not None else float(os.getenv("FRONTIER_LEASE", "60"))
+        self.max_attempts = max_attempts if max_attempts is not None else int(os.getenv("FRONTIER_MAX_ATTEMPTS", "3"))
+        self.poll_interval = poll_interval
+        # Frontier task id -> the task processing it
+        self._tasks: Dict[int, asyncio.Task] = {}
+        self.counts = {"done": 0, "failed": 0, "lost": 0}
+
+    async def run(self, exit_when_idle: bool = False):
+        """Claim and process tasks until cancelled, or until the whole
+        frontier has nothing queued or leased when exit_when_idle is set"""
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            while True:
+                free = self.concurrency - len(self._tasks)
+                if free > 0:
+                    for task in await self.database.claim_frontier_tasks(self.worker_id, free, self.lease):
+                        self._tasks[task["id"]] = asyncio.create_task(self._process(task))
+                if self._tasks:
+                    await asyncio.wait(
+                        list(self._tasks.values()), timeout=self.poll_interval,
+                        return_when=asyncio.FIRST_COMPLETED
+                    )
+                    continue
+                if exit_when_idle:
+                    stats = await self.database.get_frontier_stats()
+                    if not stats.get("queued") and not stats.get("leased"):
+                        return
+                await asyncio.sleep(self.poll_interval)
+        finally:
+            heartbeat.cancel()
+            running = list(self._tasks.values())
+            for task in running:
+                task.cancel()
+            await asyncio.gather(heartbeat, *running, return_exceptions=True)
+            # Unfinished URLs go straight back to the queue instead of
+            # waiting for their leases to expire
+            await self.database.release_frontier_tasks(self.worker_id)
+
+    async def _process(self, task: Dict):
+        task_id, url = task["id"], task["url"]
+        try:
+            with timed("frontier_task", url=url):
+                page = await self.crawler.fetch_page(url)
+                if page is None:
+                    await self.database.fail_frontier_task(task_id, self.worker_id, "fetch failed", self.max_attempts)
+                    self.counts["failed"] += 1
+                    return
+
+                page_ids = await self.database.store_crawled_data([page])
+                page_id = page_ids[0] if page_ids else None
+                if task["depth"] < task["max_depth"]:
+                    links = list(crawlable_links(page, url, host_of(url)))
+                    await self.database.enqueue_frontier(task["site"], task["depth"] + 1, links)
+                if self.analyzer is not None and page_id is not None and page.get("content"):
+                    analysis = await self.analyzer.analyze_text_async(page["content"], page["title"], url)
+                    await self.database.update_with_analysis(page_id, analysis)
+
+                if await self.database.complete_frontier_task(task_id, self.worker_id, page_id):
+                    self.counts["done"] += 1
+                else:
+                    # The lease expired mid-task and the URL was handed out again
+                    self.counts["lost"] += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Worker {self.worker_id} failed on {url}: {e}")
+            self.counts["failed"] += 1
+            await self.database.fail_frontier_task(task_id, self.worker_id, str(e), self.max_attempts)
+        finally:
+            self._tasks.pop(task_id, None)
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.lease / 3)
+            try:
+                held_before: List[int] = list(self._tasks)
+                held = set(await self.database.renew_frontier_leases(self.worker_id, held_before, self.lease))
+                for task_id in held_before:
+                    task = self._tasks.get(task_id)
+                    if task_id not in held and task is not None:
+                        # Someone else owns the URL now; stop fetching it twice
+                        task.cancel()
+                        self.counts["lost"] += 1
+                await self.database.requeue_expired_frontier_tasks(self.max_attempts)
+            except Exception as e:
+                print(f"Frontier heartbeat of {self.worker_id} failed: {e}")
+
+
+async def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(
+        prog="python -m app.crawler.worker",
+        description="Crawl URLs from the shared Postgres frontier; run one per host or several per host"
+    )
+    parser.add_argument("--seed", nargs="+", default=[], metavar="DOMAIN",
+                        help="queue these domains before working")
+    parser.add_argument("--max-depth", type=int, default=2, help="link depth for seeded domains")
+    parser.add_argument("--max-pages", type=int, default=100, help="page budget per seeded domain")
+    parser.add_argument("--concurrency", type=int, default=None, help="tasks in flight (WORKER_CONCURRENCY)")
+    parser.add_argument("--analyze", action="store_true", help="run the LLM analysis on every stored page")
+    parser.add_argument("--exit-when-idle", action="store_true",
+                        help="stop once no URL is queued or leased by any worker")
+    args = parser.parse_args(argv)
+
+    database = Database()
+    await database.connect()
+    if args.seed:
+        urls = [normalize_url(domain if domain.startswith("http") else f"https://{domain}") for domain in args.seed]
+        seeds = [(host_of(url), url) for url in urls if url]
+        queued = await database.seed_frontier(seeds, args.max_depth, args.max_pages)
+        print(f"Queued {queued} of {len(args.seed)} seed URLs")
+
+    scheduler = PolitenessScheduler()
+    pool = BrowserPool(health_interval=0)
+    if pool.size > 0:
+        await pool.start()
+    crawler = WebCrawler(pool if pool.size > 0 else None, scheduler)
+    analyzer = OllamaAnalyzer(cache=AnalysisCache(database)) if args.analyze else None
+    if analyzer is not None:
+        await analyzer.start()
+
+    worker = CrawlWorker(database, crawler, analyzer, concurrency=args.concurrency)
+    print(f"Worker {worker.worker_id} started")
+    try:
+        await worker.run(exit_when_idle=args.exit_when_idle)
+    finally:
+        print(f"Worker {worker.worker_id} stopped: {worker.counts}")
+        if analyzer is not None:
+            await analyzer.close()
+        await crawler.close()
+        await pool.close()
+        await scheduler.close()
+        await database.conn_pool.close()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
@@ -1,22 +1,33 @@
+import asyncio
 import os
-from datetime import datetime
-from typing import Dict, List, Optional
+import base64
+import hashlib
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import json
+import time
+import zlib
 import asyncpg
 from dotenv import load_dotenv
 from pydantic import BaseModel
 
+from app.monitoring.metrics import DB_ROWS, record_stage
+
 # Load environment variables
 load_dotenv()
 
 class CrawledPage(BaseModel):
-    """Model for a crawled web page"""
+    """Model for a crawled web page.
+
+    content and links live outside the crawled_pages row and are only
+    loaded for single pages (Database.get_page); they are None in lists.
+    """
     id: Optional[int] = None
     url: str
     title: str
     metadata: Dict
-    content: str
-    links: Dict
+    content: Optional[str] = None
+    links: Optional[Dict] = None
     crawled_at: datetime
     
     # LLM analysis results
@@ -25,6 +36,101 @@ class CrawledPage(BaseModel):
     sentiment: Optional[str] = None
     insights: Optional[str] = None
 
+class PageSummary(BaseModel):
+    """Lightweight projection of a crawled page for list views"""
+    id: int
+    title: str
+    crawled_at: Optional[datetime] = None
+
+def content_hash(content: Optional[str]) -> str:
+    """Fingerprint of page content used to detect changes between crawls"""
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+# Leading characters of each body kept uncompressed for search snippets
+EXCERPT_CHARS = 5000
+# Bodies shorter than this are not worth compressing
+MIN_COMPRESS_CHARS = 256
+
+def compress_content(content: Optional[str]) -> Tuple[str, bytes]:
+    """(codec, blob) of a page body as stored in page_contents"""
+    data = (content or "").encode("utf-8")
+    if len(content or "") >= MIN_COMPRESS_CHARS:
+        compressed = zlib.compress(data, 6)
+        if len(compressed) < len(data):
+            return "zlib", compressed
+    return "none", data
+
+def decompress_content(codec: str, blob: bytes, max_chars: Optional[int] = None) -> str:
+    """Inverse of compress_content; with max_chars only that much is inflated"""
+    if codec == "none":
+        data = blob if max_chars is None else blob[:max_chars * 4]
+    elif codec == "zlib":
+        # A UTF-8 character takes at most 4 bytes
+        data = zlib.decompress(blob) if max_chars is None else zlib.decompressobj().decompress(blob, max_chars * 4)
+    else:
+        raise ValueError(f"Unknown content codec: {codec}")
+    if max_chars is None:
+        return data.decode("utf-8")
+    # The cut may have split the last character
+    return data.decode("utf-8", errors="ignore")[:max_chars]
+
+# Advisory lock held while the schema is created or migrated
+SCHEMA_LOCK_ID = 0x63726177
+
+# Weighted content part of crawled_pages.search_vector, for a text expression
+CONTENT_VECTOR = "setweight(to_tsvector('english', left(coalesce({}, ''), 200000)), 'C')"
+
+def to_signed64(value: Optional[int]) -> Optional[int]:
+    """Map an unsigned 64-bit fingerprint onto Postgres' signed BIGINT"""
+    if value is None:
+        return None
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+def from_signed64(value: Optional[int]) -> Optional[int]:
+    if value is None:
+        return None
+    return value + (1 << 64) if value < 0 else value
+
+def encode_cursor(crawled_at: datetime, page_id: int) -> str:
+    """Opaque keyset cursor pointing just after (crawled_at, id)"""
+    raw = f"{crawled_at.isoformat()}|{page_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError for malformed cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8")
+        crawled_at, page_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(crawled_at), int(page_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+class SearchResult(BaseModel):
+    """A ranked full-text search hit"""
+    id: int
+    url: str
+    title: str
+    category: Optional[str] = None
+    sentiment: Optional[str] = None
+    crawled_at: Optional[datetime] = None
+    rank: float = 0.0
+    snippet: str = ""
+
+class CrawlJob(BaseModel):
+    """Model for a queued or running crawl job"""
+    id: str
+    query: str
+    query_type: str
+    params: Dict = {}
+    status: str = "queued"
+    stage: Optional[str] = None
+    pages_total: int = 0
+    pages_done: int = 0
+    page_count: int = 0
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
 class Database:
     """Database handler for NeonDB PostgreSQL"""
     def __init__(self):
@@ -48,14 +154,16 @@ class Database:
     async def _create_tables(self):
         """Create necessary database tables"""
         async with self.conn_pool.acquire() as conn:
+            # API servers and crawl workers may start at the same moment and
+            # concurrent DDL on the same objects fails; asyncpg drops the lock
+            # when the connection goes back to the pool
+            await conn.execute('SELECT pg_advisory_lock($1)', SCHEMA_LOCK_ID)
             await conn.execute('''
                 CREATE TABLE IF NOT EXISTS crawled_pages (
                     id SERIAL PRIMARY KEY,
                     url TEXT NOT NULL UNIQUE,
                     title TEXT NOT NULL,
                     metadata JSONB,
-                    content TEXT,
-                    links JSONB,
                     crawled_at TIMESTAMP,
                     summary TEXT,
                     category TEXT,
@@ -63,55 +171,546 @@ class Database:
                     insights TEXT
                 )
             ''')
+            # HTTP validators and a content fingerprint for incremental re-crawls
+            await conn.execute('''
+                ALTER TABLE crawled_pages
+                    ADD COLUMN IF NOT EXISTS etag TEXT,
+                    ADD COLUMN IF NOT EXISTS last_modified TEXT,
+                    ADD COLUMN IF NOT EXISTS content_hash TEXT,
+                    ADD COLUMN IF NOT EXISTS validated_at TIMESTAMP
+            ''')
+            # Near-duplicate detection: SimHash of the content, and the page
+            # a near-duplicate reuses its analysis from
+            await conn.execute('''
+                ALTER TABLE crawled_pages
+                    ADD COLUMN IF NOT EXISTS simhash BIGINT,
+                    ADD COLUMN IF NOT EXISTS canonical_id INTEGER
+            ''')
+            await self._create_body_tables(conn)
+            await self._create_search_index(conn)
+            await self._migrate_inline_bodies(conn)
+            # Supports ORDER BY crawled_at DESC, id DESC and keyset pagination
+            await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_crawled_pages_crawled_at_id
+                ON crawled_pages (crawled_at DESC, id DESC)
+            ''')
+            await self._create_count_triggers(conn)
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS crawl_jobs (
+                    id TEXT PRIMARY KEY,
+                    query TEXT NOT NULL,
+                    query_type TEXT NOT NULL,
+                    params JSONB,
+                    status TEXT NOT NULL,
+                    stage TEXT,
+                    pages_total INTEGER DEFAULT 0,
+                    pages_done INTEGER DEFAULT 0,
+                    page_count INTEGER DEFAULT 0,
+                    error TEXT,
+                    created_at TIMESTAMP NOT NULL,
+                    updated_at TIMESTAMP NOT NULL
+                )
+            ''')
+            # Per-job profile, recorded only for jobs started with trace enabled
+            await conn.execute('ALTER TABLE crawl_jobs ADD COLUMN IF NOT EXISTS trace JSONB')
+            await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_crawl_jobs_status
+                ON crawl_jobs (status, created_at)
+            ''')
+            await self._create_frontier_tables(conn)
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS analysis_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    analysis JSONB NOT NULL,
+                    created_at TIMESTAMP NOT NULL,
+                    last_hit_at TIMESTAMP NOT NULL
+                )
+            ''')
+            await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_analysis_cache_last_hit
+                ON analysis_cache (last_hit_at)
+            ''')
+            # Vectors are little-endian float32 arrays; the optional pgvector
+            # "embedding" column is added by enable_pgvector()
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS page_embeddings (
+                    page_id INTEGER PRIMARY KEY REFERENCES crawled_pages (id) ON DELETE CASCADE,
+                    model TEXT NOT NULL,
+                    dim INTEGER NOT NULL,
+                    vector BYTEA NOT NULL,
+                    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+                )
+            ''')
     
+    async def _create_body_tables(self, conn):
+        """Side tables for the large parts of a page.
+
+        Bodies are stored once per content hash, compressed (see
+        compress_content), so identical pages share one copy; links are
+        one row per edge so the link graph can be queried. Both are only
+        read for single pages, which keeps crawled_pages small to scan.
+        """
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS page_contents (
+                content_hash TEXT PRIMARY KEY,
+                codec TEXT NOT NULL,
+                body BYTEA NOT NULL,
+                size INTEGER NOT NULL,
+                excerpt TEXT NOT NULL,
+                stored_at TIMESTAMP NOT NULL
+            )
+        ''')
+        # Already compressed; keep Postgres from trying again
+        await conn.execute('ALTER TABLE page_contents ALTER COLUMN body SET STORAGE EXTERNAL')
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_crawled_pages_content_hash ON crawled_pages (content_hash)
+        ''')
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS page_links (
+                source_id INTEGER NOT NULL REFERENCES crawled_pages (id) ON DELETE CASCADE,
+                position INTEGER NOT NULL,
+                target_url TEXT NOT NULL,
+                internal BOOLEAN NOT NULL,
+                text TEXT,
+                title TEXT,
+                base_domain TEXT,
+                PRIMARY KEY (source_id, position)
+            )
+        ''')
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_page_links_target_url ON page_links (target_url)
+        ''')
+
+    async def _create_search_index(self, conn):
+        """Full-text search column, its trigger and the search/facet indexes.
+
+        The content part of search_vector (weight C) is written by the
+        statements that store a body, since the body is not in the row. The
+        trigger adds the title and analysis parts whenever those change and
+        keeps the content part, so update_with_analysis does not re-parse
+        the content.
+        """
+        await conn.execute('''
+            ALTER TABLE crawled_pages ADD COLUMN IF NOT EXISTS search_vector tsvector
+        ''')
+        await conn.execute('''
+            CREATE OR REPLACE FUNCTION crawled_pages_search_vector() RETURNS trigger AS $$
+            BEGIN
+                NEW.search_vector :=
+                    setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+                    setweight(to_tsvector('english', coalesce(NEW.summary, '')), 'B') ||
+                    setweight(to_tsvector('english', coalesce(NEW.insights, '')), 'B') ||
+                    ts_filter(coalesce(NEW.search_vector, ''), '{c}');
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        ''')
+        await conn.execute('''
+            DROP TRIGGER IF EXISTS crawled_pages_search_vector_update ON crawled_pages;
+            CREATE TRIGGER crawled_pages_search_vector_update
+                BEFORE INSERT OR UPDATE OF title, summary, insights, search_vector ON crawled_pages
+                FOR EACH ROW EXECUTE FUNCTION crawled_pages_search_vector();
+        ''')
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_crawled_pages_search_vector
+            ON crawled_pages USING GIN (search_vector)
+        ''')
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_crawled_pages_category ON crawled_pages (category)
+        ''')
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_crawled_pages_sentiment ON crawled_pages (sentiment)
+        ''')
+
+    async def _create_frontier_tables(self, conn):
+        """Shared crawl frontier served to crawl workers (app.crawler.worker).
+
+        crawl_sites holds the limits of every seeded site; crawl_frontier
+        one row per URL, which is what keeps a URL from being fetched twice
+        across workers. Lease times use the database clock (timestamptz)
+        so workers on different hosts agree on when a lease expires.
+        """
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS crawl_sites (
+                site TEXT PRIMARY KEY,
+                max_depth INTEGER NOT NULL,
+                max_pages INTEGER NOT NULL,
+                enqueued INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        ''')
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS crawl_frontier (
+                id BIGSERIAL PRIMARY KEY,
+                url TEXT NOT NULL UNIQUE,
+                site TEXT NOT NULL REFERENCES crawl_sites (site) ON DELETE CASCADE,
+                depth INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_expires_at TIMESTAMPTZ,
+                page_id INTEGER,
+                error TEXT,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+            )
+        ''')
+        # Claims scan queued rows in id (roughly breadth-first) order
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_crawl_frontier_queued ON crawl_frontier (id) WHERE status = 'queued'
+        ''')
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_crawl_frontier_leases
+            ON crawl_frontier (lease_expires_at) WHERE status = 'leased'
+        ''')
+
+    async def _create_count_triggers(self, conn):
+        """Keep an exact row count of crawled_pages in table_counts.
+
+        Statement-level triggers update the counter in the same transaction
+        as the insert or delete, once per statement rather than per row.
+        """
+        async with conn.transaction():
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS table_counts (
+                    table_name TEXT PRIMARY KEY,
+                    row_count BIGINT NOT NULL
+                )
+            ''')
+            await conn.execute('''
+                CREATE OR REPLACE FUNCTION count_crawled_pages() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP = 'INSERT' THEN
+                        UPDATE table_counts SET row_count = row_count + (SELECT count(*) FROM new_rows)
+                        WHERE table_name = 'crawled_pages';
+                    ELSIF TG_OP = 'DELETE' THEN
+                        UPDATE table_counts SET row_count = row_count - (SELECT count(*) FROM old_rows)
+                        WHERE table_name = 'crawled_pages';
+                    ELSE
+                        UPDATE table_counts SET row_count = 0 WHERE table_name = 'crawled_pages';
+                    END IF;
+                    RETURN NULL;
+                END
+                $$ LANGUAGE plpgsql
+            ''')
+            await conn.execute('''
+                DROP TRIGGER IF EXISTS crawled_pages_count_insert ON crawled_pages;
+                CREATE TRIGGER crawled_pages_count_insert AFTER INSERT ON crawled_pages
+                    REFERENCING NEW TABLE AS new_rows
+                    FOR EACH STATEMENT EXECUTE FUNCTION count_crawled_pages();
+                DROP TRIGGER IF EXISTS crawled_pages_count_delete ON crawled_pages;
+                CREATE TRIGGER crawled_pages_count_delete AFTER DELETE ON crawled_pages
+                    REFERENCING OLD TABLE AS old_rows
+                    FOR EACH STATEMENT EXECUTE FUNCTION count_crawled_pages();
+                DROP TRIGGER IF EXISTS crawled_pages_count_truncate ON crawled_pages;
+                CREATE TRIGGER crawled_pages_count_truncate AFTER TRUNCATE ON crawled_pages
+                    FOR EACH STATEMENT EXECUTE FUNCTION count_crawled_pages();
+            ''')
+            # Seeded with an exact count the first time only
+            await conn.execute('''
+                INSERT INTO table_counts (table_name, row_count)
+                SELECT 'crawled_pages', count(*) FROM crawled_pages
+                ON CONFLICT (table_name) DO NOTHING
+            ''')
+
+    async def _migrate_inline_bodies(self, conn, batch: int = 500):
+        """Move content and links kept in crawled_pages rows by earlier
+        versions into page_contents/page_links, then drop the columns"""
+        inline = await conn.fetchval('''
+            SELECT count(*) FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = 'crawled_pages'
+              AND column_name IN ('content', 'links')
+        ''')
+        if inline != 2:
+            return
+        last_id, moved = 0, 0
+        while True:
+            rows = await conn.fetch(
+                'SELECT id, content, links FROM crawled_pages WHERE id > $1 ORDER BY id LIMIT $2',
+                last_id, batch
+            )
+            if not rows:
+                break
+            page_ids = [row['id'] for row in rows]
+            pages = [{
+                "content": row['content'],
+                "links": json.loads(row['links']) if isinstance(row['links'], str) else row['links']
+            } for row in rows]
+            bodies = await asyncio.to_thread(self._compress_bodies, pages)
+            async with conn.transaction():
+                await conn.execute(self.STORE_BODIES, *self._body_arrays(bodies))
+                await conn.execute(self.STORE_LINKS, *self._link_columns(page_ids, pages))
+                await conn.execute(f'''
+                    UPDATE crawled_pages p
+                    SET content_hash = i.content_hash, search_vector = {CONTENT_VECTOR.format("p.content")}
+                    FROM unnest($1::int[], $2::text[]) AS i(id, content_hash)
+                    WHERE p.id = i.id
+                ''', page_ids, [content_hash(page['content']) for page in pages])
+            last_id = page_ids[-1]
+            moved += len(rows)
+        await conn.execute('ALTER TABLE crawled_pages DROP COLUMN content, DROP COLUMN links')
+        print(f"Moved the content and links of {moved} pages out of crawled_pages")
+
     async def ensure_connection(self):
         """Ensure database connection is established"""
         if self.conn_pool is None:
             await self.connect()
     
     async def store_crawled_data(self, pages: List[Dict]) -> List[int]:
-        """Store crawled pages in the database"""
+        """Store crawled pages in the database.
+
+        All pages go in with a single set-based INSERT; URLs that are already
+        stored keep their existing row. Returns one id per input page, in
+        input order.
+        """
         await self.ensure_connection()
-        page_ids = []
-        
+        if not pages:
+            return []
+
+        # One row per URL; later duplicates in the batch map to the same id
+        unique_pages = list({page['url']: page for page in reversed(pages)}.values())[::-1]
+        columns = self._page_columns(unique_pages)
+        # Compression is CPU-bound; keep it off the event loop
+        bodies = await asyncio.to_thread(self._compress_bodies, unique_pages)
+        links = self._link_columns(columns[0], unique_pages)
+
+        started = time.perf_counter()
         async with self.conn_pool.acquire() as conn:
-            for page in pages:
-                # Check if page already exists
-                existing = await conn.fetchval(
-                    'SELECT id FROM crawled_pages WHERE url = $1',
-                    page['url']
+            # The final SELECT runs on the statement's snapshot, so it only
+            # sees rows that existed before this insert: together with
+            # RETURNING that covers every input URL exactly once. Bodies and
+            # links are only written for the pages actually inserted.
+            rows = await conn.fetch(f'''
+                WITH input AS (
+                    SELECT * FROM unnest(
+                        $1::text[], $2::text[], $3::jsonb[], $4::text[], $5::timestamp[],
+                        $6::text[], $7::text[], $8::text[], $9::bigint[]
+                    ) AS t(url, title, metadata, content, crawled_at, etag, last_modified, content_hash, simhash)
+                ), inserted AS (
+                    INSERT INTO crawled_pages (
+                        url, title, metadata, crawled_at, etag, last_modified,
+                        content_hash, validated_at, simhash, search_vector
+                    )
+                    SELECT url, title, metadata, crawled_at, etag, last_modified,
+                           content_hash, crawled_at, simhash, {CONTENT_VECTOR.format("content")}
+                    FROM input
+                    -- Skips parsing the content of pages that are already stored
+                    WHERE NOT EXISTS (SELECT 1 FROM crawled_pages p WHERE p.url = input.url)
+                    ON CONFLICT (url) DO NOTHING
+                    RETURNING id, url, content_hash
+                ), bodies AS (
+                    INSERT INTO page_contents (content_hash, codec, body, size, excerpt, stored_at)
+                    SELECT content_hash, codec, body, size, excerpt, LOCALTIMESTAMP
+                    FROM unnest($10::text[], $11::text[], $12::bytea[], $13::int[], $14::text[])
+                        AS b(content_hash, codec, body, size, excerpt)
+                    WHERE content_hash IN (SELECT content_hash FROM inserted)
+                    ON CONFLICT (content_hash) DO UPDATE SET stored_at = EXCLUDED.stored_at
+                ), edges AS (
+                    INSERT INTO page_links (source_id, position, target_url, internal, text, title, base_domain)
+                    SELECT inserted.id, l.position, l.target_url, l.internal, l.text, l.title, l.base_domain
+                    FROM unnest($15::text[], $16::int[], $17::text[], $18::bool[], $19::text[], $20::text[], $21::text[])
+                        AS l(url, position, target_url, internal, text, title, base_domain)
+                    JOIN inserted ON inserted.url = l.url
                 )
-                
-                if existing:
-                    page_ids.append(existing)
-                    continue
-                
-                # Convert ISO datetime string to datetime object if needed
-                crawled_at = page['crawled_at']
-                if isinstance(crawled_at, str):
-                    crawled_at = datetime.fromisoformat(crawled_at)
-
-                 # ✅ Convert dict/list to JSON string
-                metadata_json = json.dumps(page['metadata'])
-                links_json = json.dumps(page['links'])
-
-                # Insert new page
-                page_id = await conn.fetchval('''
-                    INSERT INTO crawled_pages (url, title, metadata, content, links, crawled_at)
-                    VALUES ($1, $2, $3, $4, $5, $6)
-                    RETURNING id
-                ''', 
-                page['url'], 
-                page['title'], 
-                metadata_json, 
-                page['content'], 
-                links_json, 
-                crawled_at
+                SELECT id, url FROM inserted
+                UNION ALL
+                SELECT p.id, p.url FROM crawled_pages p JOIN input i ON p.url = i.url
+            ''', *columns, *self._body_arrays(bodies), *links)
+            ids_by_url = {row['url']: row['id'] for row in rows}
+
+            # A concurrent crawl may have inserted a URL after our snapshot
+            missing = [url for url in columns[0] if url not in ids_by_url]
+            if missing:
+                rows = await conn.fetch(
+                    'SELECT id, url FROM crawled_pages WHERE url = ANY($1::text[])',
+                    missing
                 )
-                
-                page_ids.append(page_id)
-        
-        return page_ids
+                ids_by_url.update((row['url'], row['id']) for row in rows)
+        record_stage("db_insert", started, time.perf_counter() - started, rows=len(unique_pages))
+        DB_ROWS.inc(len(unique_pages), operation="insert")
+
+        return [ids_by_url[page['url']] for page in pages if page['url'] in ids_by_url]
+
+    def _page_columns(self, pages: List[Dict]) -> Tuple[List, ...]:
+        """Column arrays for unnest()-based bulk statements over crawled pages"""
+        urls, titles, metadata, contents, crawled_ats = [], [], [], [], []
+        etags, last_modifieds, hashes, simhashes = [], [], [], []
+        for page in pages:
+            # Convert ISO datetime string to datetime object if needed
+            crawled_at = page['crawled_at']
+            if isinstance(crawled_at, str):
+                crawled_at = datetime.fromisoformat(crawled_at)
+
+            urls.append(page['url'])
+            titles.append(page['title'])
+            metadata.append(json.dumps(page['metadata']))
+            contents.append(page['content'])
+            crawled_ats.append(crawled_at)
+            etags.append(page.get('etag'))
+            last_modifieds.append(page.get('last_modified'))
+            hashes.append(content_hash(page['content']))
+            simhashes.append(to_signed64(page.get('simhash')))
+        return urls, titles, metadata, contents, crawled_ats, etags, last_modifieds, hashes, simhashes
+
+    def _compress_bodies(self, pages: List[Dict]) -> Dict[str, Tuple[str, bytes, int, str]]:
+        """{content hash: (codec, blob, size, excerpt)}, compressing each distinct body once"""
+        bodies = {}
+        for page in pages:
+            content = page['content'] or ""
+            key = content_hash(content)
+            if key not in bodies:
+                codec, blob = compress_content(content)
+                bodies[key] = (codec, blob, len(content), content[:EXCERPT_CHARS])
+        return bodies
+
+    def _body_arrays(self, bodies: Dict[str, Tuple[str, bytes, int, str]]) -> Tuple[List, ...]:
+        hashes = list(bodies)
+        codecs, blobs, sizes, excerpts = (list(column) for column in zip(*bodies.values())) if bodies else ([], [], [], [])
+        return hashes, codecs, blobs, sizes, excerpts
+
+    def _link_columns(self, keys: List, pages: List[Dict]) -> Tuple[List, ...]:
+        """page_links column arrays; each link is tagged with the key (url or id) of its page"""
+        sources, positions, targets, internal, texts, titles, domains = [], [], [], [], [], [], []
+        for key, page in zip(keys, pages):
+            position = 0
+            for kind in ("internal", "external"):
+                for link in (page.get('links') or {}).get(kind, []):
+                    if not link.get('href'):
+                        continue
+                    sources.append(key)
+                    positions.append(position)
+                    targets.append(link['href'])
+                    internal.append(kind == "internal")
+                    texts.append(link.get('text'))
+                    titles.append(link.get('title'))
+                    domains.append(link.get('base_domain'))
+                    position += 1
+        return sources, positions, targets, internal, texts, titles, domains
+
+    # Bodies are stored once per hash; storing one again refreshes stored_at,
+    # which keeps it from being cleaned up as an orphan while a page adopts it
+    STORE_BODIES = '''
+        INSERT INTO page_contents (content_hash, codec, body, size, excerpt, stored_at)
+        SELECT content_hash, codec, body, size, excerpt, LOCALTIMESTAMP
+        FROM unnest($1::text[], $2::text[], $3::bytea[], $4::int[], $5::text[])
+            AS b(content_hash, codec, body, size, excerpt)
+        ON CONFLICT (content_hash) DO UPDATE SET stored_at = EXCLUDED.stored_at
+    '''
+    STORE_LINKS = '''
+        INSERT INTO page_links (source_id, position, target_url, internal, text, title, base_domain)
+        SELECT * FROM unnest($1::int[], $2::int[], $3::text[], $4::bool[], $5::text[], $6::text[], $7::text[])
+        ON CONFLICT (source_id, position) DO NOTHING
+    '''
+
+    async def update_crawled_data(self, pages: List[Dict]) -> List[int]:
+        """Overwrite already stored pages in place with freshly crawled data.
+
+        Pages whose content changed lose their near-duplicate link and get
+        the page dict's simhash. Returns the ids of the updated rows; URLs
+        that are not stored are ignored.
+        """
+        await self.ensure_connection()
+        if not pages:
+            return []
+        unique_pages = list({page['url']: page for page in pages}.values())
+        columns = self._page_columns(unique_pages)
+        bodies = await asyncio.to_thread(self._compress_bodies, unique_pages)
+        started = time.perf_counter()
+        async with self.conn_pool.acquire() as conn:
+            async with conn.transaction():
+                # Joining the old row gives the body hash the page had before
+                rows = await conn.fetch(f'''
+                    UPDATE crawled_pages p
+                    SET title = i.title, metadata = i.metadata, crawled_at = i.crawled_at, etag = i.etag,
+                        last_modified = i.last_modified, content_hash = i.content_hash,
+                        validated_at = i.crawled_at,
+                        -- New content gets a new fingerprint and is no longer a known duplicate
+                        simhash = CASE WHEN old.content_hash IS DISTINCT FROM i.content_hash
+                                       THEN i.simhash ELSE COALESCE(i.simhash, p.simhash) END,
+                        canonical_id = CASE WHEN old.content_hash IS DISTINCT FROM i.content_hash
+                                            THEN NULL ELSE p.canonical_id END,
+                        search_vector = {CONTENT_VECTOR.format("i.content")}
+                    FROM unnest(
+                        $1::text[], $2::text[], $3::jsonb[], $4::text[], $5::timestamp[],
+                        $6::text[], $7::text[], $8::text[], $9::bigint[]
+                    ) AS i(url, title, metadata, content, crawled_at, etag, last_modified, content_hash, simhash),
+                    crawled_pages old
+                    WHERE p.url = i.url AND old.id = p.id
+                    RETURNING p.id, p.url, p.content_hash, old.content_hash AS old_hash
+                ''', *columns)
+                ids_by_url = {row['url']: row['id'] for row in rows}
+                updated = [page for page in unique_pages if page['url'] in ids_by_url]
+                page_ids = [ids_by_url[page['url']] for page in updated]
+
+                await conn.execute(self.STORE_BODIES, *self._body_arrays(
+                    {row['content_hash']: bodies[row['content_hash']] for row in rows}
+                ))
+                await conn.execute('DELETE FROM page_links WHERE source_id = ANY($1::int[])', page_ids)
+                await conn.execute(self.STORE_LINKS, *self._link_columns(page_ids, updated))
+                # Drop bodies no page refers to any more. Ones stored within the
+                # hour are left alone: a concurrent insert may be adopting them.
+                await conn.execute('''
+                    DELETE FROM page_contents c
+                    WHERE c.content_hash = ANY($1::text[])
+                      AND c.stored_at < LOCALTIMESTAMP - interval '1 hour'
+                      AND NOT EXISTS (SELECT 1 FROM crawled_pages p WHERE p.content_hash = c.content_hash)
+                ''', [row['old_hash'] for row in rows if row['old_hash'] != row['content_hash']])
+        record_stage("db_update", started, time.perf_counter() - started, rows=len(rows))
+        DB_ROWS.inc(len(rows), operation="update")
+        return [row['id'] for row in rows]
+
+    @staticmethod
+    def _domain_pattern(domain: str) -> str:
+        """Regex matching the URLs of a domain, with or without www."""
+        host = domain.split("://", 1)[-1].split("/", 1)[0].lower()
+        if host.startswith("www."):
+            host = host[4:]
+        return "^https?://(www\\.)?" + host.replace(".", "\\.") + "([:/?#]|$)"
+
+    async def get_tracked_pages(self, domain: str) -> List[Dict]:
+        """Validators of every stored page on a domain (with or without www.)"""
+        await self.ensure_connection()
+        async with self.conn_pool.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT id, url, etag, last_modified, content_hash
+                FROM crawled_pages WHERE url ~* $1
+            ''', self._domain_pattern(domain))
+        return [dict(row) for row in rows]
+
+    async def find_page_ids(
+        self,
+        page_ids: Optional[List[int]] = None,
+        domain: Optional[str] = None,
+        category: Optional[str] = None,
+        sentiment: Optional[str] = None,
+        unanalyzed: bool = False,
+        limit: int = 1000,
+    ) -> List[int]:
+        """Ids of stored pages matching every given filter, oldest crawl first"""
+        await self.ensure_connection()
+        async with self.conn_pool.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT id FROM crawled_pages
+                WHERE ($1::int[] IS NULL OR id = ANY($1))
+                  AND ($2::text IS NULL OR url ~* $2)
+                  AND ($3::text IS NULL OR category = $3)
+                  AND ($4::text IS NULL OR sentiment = $4)
+                  AND (NOT $5 OR summary IS NULL)
+                ORDER BY crawled_at, id
+                LIMIT $6
+            ''', page_ids, self._domain_pattern(domain) if domain else None, category, sentiment, unanalyzed, limit)
+        return [row['id'] for row in rows]
+
+    async def mark_validated(self, page_ids: List[int]) -> None:
+        """Record that these pages were re-checked and found unchanged"""
+        await self.ensure_connection()
+        if not page_ids:
+            return
+        async with self.conn_pool.acquire() as conn:
+            await conn.execute(
+                'UPDATE crawled_pages SET validated_at = $2 WHERE id = ANY($1::int[])',
+                page_ids, datetime.now()
+            )
     
     async def update_with_analysis(self, page_id: int, analysis: Dict) -> bool:
         """Update page with LLM analysis results"""
@@ -120,6 +719,7 @@ class Database:
         if isinstance(insights, list):
             insights = json.dumps(insights)
 
+        started = time.perf_counter()
         async with self.conn_pool.acquire() as conn:
             await conn.execute('''
                 UPDATE crawled_pages
@@ -132,56 +732,681 @@ class Database:
             insights,
             page_id
             )
+        record_stage("db_update_analysis", started, time.perf_counter() - started, page_id=page_id)
+        DB_ROWS.inc(operation="analysis")
         return True
     
-    async def get_page(self, page_id: int) -> Optional[CrawledPage]:
-        """Get a single page by ID"""
+    # Columns of crawled_pages that make up a CrawledPage
+    PAGE_COLUMNS = "id, url, title, metadata, crawled_at, summary, category, sentiment, insights"
+
+    def _row_to_page(self, row, content: Optional[str] = None, links: Optional[Dict] = None) -> CrawledPage:
+        return CrawledPage(
+            id=row['id'],
+            url=row['url'],
+            title=row['title'],
+            metadata=json.loads(row['metadata']) if isinstance(row['metadata'], str) else row['metadata'],
+            content=content,
+            links=links,
+            crawled_at=row['crawled_at'],
+            summary=row['summary'],
+            category=row['category'],
+            sentiment=row['sentiment'],
+            insights=row['insights']
+        )
+
+    async def get_page(self, page_id: int, with_body: bool = True) -> Optional[CrawledPage]:
+        """Get a single page by ID; with_body=False skips loading its content and links"""
         await self.ensure_connection()
         async with self.conn_pool.acquire() as conn:
-            row = await conn.fetchrow(
-                'SELECT * FROM crawled_pages WHERE id = $1',
-                page_id
-            )
-            
-            if row:
-                return CrawledPage(
-                    id=row['id'],
-                    url=row['url'],
-                    title=row['title'],
-                    metadata=json.loads(row['metadata']) if isinstance(row['metadata'], str) else row['metadata'],
-                    content=row['content'],
-                    links=json.loads(row['links']) if isinstance(row['links'], str) else row['links'],
-                    crawled_at=row['crawled_at'],
-                    summary=row['summary'],
-                    category=row['category'],
-                    sentiment=row['sentiment'],
-                    insights=row['insights']
-                )
-            return None
+            if not with_body:
+                row = await conn.fetchrow(f'SELECT {self.PAGE_COLUMNS} FROM crawled_pages WHERE id = $1', page_id)
+                return self._row_to_page(row) if row else None
+
+            row = await conn.fetchrow(f'''
+                SELECT {self.PAGE_COLUMNS}, codec, body
+                FROM crawled_pages p LEFT JOIN page_contents c ON c.content_hash = p.content_hash
+                WHERE p.id = $1
+            ''', page_id)
+            if not row:
+                return None
+            link_rows = await conn.fetch('''
+                SELECT target_url, internal, text, title, base_domain
+                FROM page_links WHERE source_id = $1 ORDER BY position
+            ''', page_id)
+
+        links = {"internal": [], "external": []}
+        for link in link_rows:
+            links["internal" if link['internal'] else "external"].append({
+                "href": link['target_url'],
+                "text": link['text'] or "",
+                "title": link['title'] or "",
+                "base_domain": link['base_domain'] or ""
+            })
+        content = decompress_content(row['codec'], row['body']) if row['body'] is not None else None
+        return self._row_to_page(row, content, links)
+
+    async def get_backlinks(self, page_id: int, limit: int = 100) -> List[PageSummary]:
+        """Stored pages that link to a page, most recently crawled first"""
+        await self.ensure_connection()
+        async with self.conn_pool.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT DISTINCT s.id, s.title, s.crawled_at
+                FROM crawled_pages t
+                JOIN page_links l ON l.target_url = t.url
+                JOIN crawled_pages s ON s.id = l.source_id
+                WHERE t.id = $1 AND s.id <> t.id
+                ORDER BY s.crawled_at DESC, s.id DESC
+                LIMIT $2
+            ''', page_id, limit)
+        return [PageSummary(id=row['id'], title=row['title'], crawled_at=row['crawled_at']) for row in rows]
             
-    async def get_pages(self, limit: int = 20, offset: int = 0) -> List[CrawledPage]:
+    async def get_pages(
+        self, limit: int = 20, offset: int = 0, cursor: Optional[str] = None
+    ) -> List[CrawledPage]:
         """Get multiple pages with pagination"""
+        pages, _ = await self.get_pages_with_total(limit, offset, cursor)
+        return pages
+
+    async def get_pages_with_total(
+        self, limit: int = 20, offset: int = 0, cursor: Optional[str] = None
+    ) -> Tuple[List[CrawledPage], int]:
+        """Get a page of results plus the total number of pages, in one round trip.
+
+        With a cursor (from encode_cursor) the page is located with a keyset
+        seek on (crawled_at, id) and offset is ignored. The total comes from
+        the trigger-maintained table_counts row, so it costs one index lookup
+        however large crawled_pages gets. Content and links are not loaded.
+        """
+        await self.ensure_connection()
+        if cursor:
+            crawled_at, page_id = decode_cursor(cursor)
+            page_query = f'''
+                SELECT {self.PAGE_COLUMNS} FROM crawled_pages
+                WHERE (crawled_at, id) < ($3, $4)
+                ORDER BY crawled_at DESC, id DESC LIMIT $1 OFFSET $2
+            '''
+            args = (limit, 0, crawled_at, page_id)
+        else:
+            page_query = f'''
+                SELECT {self.PAGE_COLUMNS} FROM crawled_pages
+                ORDER BY crawled_at DESC, id DESC LIMIT $1 OFFSET $2
+            '''
+            args = (limit, offset)
+
+        async with self.conn_pool.acquire() as conn:
+            # LEFT JOIN keeps the count row even when the requested page is empty
+            rows = await conn.fetch(f'''
+                SELECT c.row_count AS total_count, p.*
+                FROM table_counts c
+                LEFT JOIN LATERAL ({page_query}) p ON true
+                WHERE c.table_name = 'crawled_pages'
+            ''', *args)
+
+        if not rows:
+            return [], 0
+        total = rows[0]['total_count']
+        pages = [self._row_to_page(row) for row in rows if row['id'] is not None]
+        return pages, total
+
+    async def get_page_summaries(self, limit: int = 100, cursor: Optional[str] = None) -> List[PageSummary]:
+        """Get id/title of the most recent pages without reading content or links"""
+        await self.ensure_connection()
+        async with self.conn_pool.acquire() as conn:
+            if cursor:
+                crawled_at, page_id = decode_cursor(cursor)
+                rows = await conn.fetch('''
+                    SELECT id, title, crawled_at FROM crawled_pages
+                    WHERE (crawled_at, id) < ($2, $3)
+                    ORDER BY crawled_at DESC, id DESC LIMIT $1
+                ''', limit, crawled_at, page_id)
+            else:
+                rows = await conn.fetch('''
+                    SELECT id, title, crawled_at FROM crawled_pages
+                    ORDER BY crawled_at DESC, id DESC LIMIT $1
+                ''', limit)
+        return [PageSummary(id=row['id'], title=row['title'], crawled_at=row['crawled_at']) for row in rows]
+
+    # Columns of crawl_jobs that update_job is allowed to set
+    JOB_FIELDS = ("status", "stage", "pages_total", "pages_done", "page_count", "error", "trace")
+    # Everything but the trace, which can be large and is fetched on its own
+    JOB_COLUMNS = (
+        "id, query, query_type, params, status, stage, pages_total, pages_done, "
+        "page_count, error, created_at, updated_at"
+    )
+
+    def _row_to_job(self, row) -> CrawlJob:
+        return CrawlJob(
+            id=row['id'],
+            query=row['query'],
+            query_type=row['query_type'],
+            params=json.loads(row['params']) if isinstance(row['params'], str) else (row['params'] or {}),
+            status=row['status'],
+            stage=row['stage'],
+            pages_total=row['pages_total'] or 0,
+            pages_done=row['pages_done'] or 0,
+            page_count=row['page_count'] or 0,
+            error=row['error'],
+            created_at=row['created_at'],
+            updated_at=row['updated_at']
+        )
+
+    async def create_job(self, job_id: str, query: str, query_type: str, params: Dict) -> CrawlJob:
+        """Persist a new queued job"""
+        await self.ensure_connection()
+        now = datetime.now()
+        async with self.conn_pool.acquire() as conn:
+            row = await conn.fetchrow(f'''
+                INSERT INTO crawl_jobs (id, query, query_type, params, status, created_at, updated_at)
+                VALUES ($1, $2, $3, $4, 'queued', $5, $5)
+                RETURNING {self.JOB_COLUMNS}
+            ''', job_id, query, query_type, json.dumps(params), now)
+        return self._row_to_job(row)
+
+    async def update_job(self, job_id: str, **fields) -> None:
+        """Update status/progress columns of a job"""
+        await self.ensure_connection()
+        columns = [name for name in fields if name in self.JOB_FIELDS]
+        if not columns:
+            return
+        assignments = ", ".join(f"{name} = ${i + 2}" for i, name in enumerate(columns))
+        async with self.conn_pool.acquire() as conn:
+            await conn.execute(
+                f'UPDATE crawl_jobs SET {assignments}, updated_at = ${len(columns) + 2} WHERE id = $1',
+                job_id, *(fields[name] for name in columns), datetime.now()
+            )
+
+    async def claim_job(self, job_id: str) -> Optional[CrawlJob]:
+        """Mark a queued job running and return it; None if it is not queued,
+        e.g. because another worker claimed it first"""
+        await self.ensure_connection()
+        async with self.conn_pool.acquire() as conn:
+            row = await conn.fetchrow(f'''
+                UPDATE crawl_jobs SET status = 'running', pages_done = 0, updated_at = $2
+                WHERE id = $1 AND status = 'queued'
+                RETURNING {self.JOB_COLUMNS}
+            ''', job_id, datetime.now())
+        return self._row_to_job(row) if row else None
+
+    async def get_job(self, job_id: str) -> Optional[CrawlJob]:
+        """Get a single job by ID"""
+        await self.ensure_connection()
+        async with self.conn_pool.acquire() as conn:
+            row = await conn.fetchrow(f'SELECT {self.JOB_COLUMNS} FROM crawl_jobs WHERE id = $1', job_id)
+        return self._row_to_job(row) if row else None
+
+    async def get_job_trace(self, job_id: str) -> Optional[Dict]:
+        """The recorded trace of a job, or None if it was not traced"""
+        await self.ensure_connection()
+        async with self.conn_pool.acquire() as conn:
+            trace = await conn.fetchval('SELECT trace FROM crawl_jobs WHERE id = $1', job_id)
+        return json.loads(trace) if isinstance(trace, str) else trace
+
+    async def get_unfinished_jobs(self) -> List[CrawlJob]:
+        """Jobs that were queued or running when the server last stopped, oldest first"""
         await self.ensure_connection()
-        results = []
         async with self.conn_pool.acquire() as conn:
             rows = await conn.fetch(
-                'SELECT * FROM crawled_pages ORDER BY crawled_at DESC LIMIT $1 OFFSET $2',
-                limit, offset
+                f"SELECT {self.JOB_COLUMNS} FROM crawl_jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
             )
-            
-            for row in rows:
-                results.append(CrawledPage(
-                    id=row['id'],
-                    url=row['url'],
-                    title=row['title'],
-                    metadata=json.loads(row['metadata']) if isinstance(row['metadata'], str) else row['metadata'],
-                    content=row['content'],
-                    links=json.loads(row['links']) if isinstance(row['links'], str) else row['links'],
-                    crawled_at=row['crawled_at'],
-                    summary=row['summary'],
-                    category=row['category'],
-                    sentiment=row['sentiment'],
-                    insights=row['insights']
-                ))
-                
-        return results
\ No newline at end of file
+        return [self._row_to_job(row) for row in rows]
+
+    async def seed_frontier(self, seeds: List[Tuple[str, str]], max_depth: int, max_pages: int) -> int:
+        """Queue (site, start URL) pairs for the crawl workers.
+
+        Every site gets its own depth and page limits (replacing earlier
+        limits). Returns how many URLs were queued; ones already in the
+        frontier are not crawled again.
+        """
+        await self.ensure_connection()
+        queued = 0
+        for site, url in seeds:
+            async with self.conn_pool.acquire() as conn:
+                await conn.execute('''
+                    INSERT INTO crawl_sites (site, max_depth, max_pages) VALUES ($1, $2, $3)
+                    ON CONFLICT (site) DO UPDATE SET max_depth = EXCLUDED.max_depth, max_pages = EXCLUDED.max_pages
+                ''', site, max_depth, max_pages)
+            queued += await self.enqueue_frontier(site, 0, [url])
+        return queued
+
+    async def enqueue_frontier(self, site: str, depth: int, urls: List[str]) -> int:
+        """Add URLs found on a site, within the site's max_pages budget.
+
+        URLs already in the frontier are skipped. Returns how many were added.
+        """
+        await self.ensure_connection()
+        if not urls:
+            return 0
+        async with self.conn_pool.acquire() as conn:
+            async with conn.transaction():
+                # Serialises the site's enqueues; the INSERT below then runs on a
+                # snapshot taken after the lock, so its budget check is exact
+                room = await conn.fetchval(
+                    'SELECT max_pages - enqueued FROM crawl_sites WHERE site = $1 FOR UPDATE', site
+                )
+                if not room or room <= 0:
+                    return 0
+                added = await conn.fetchval('''
+                    WITH added AS (
+                        INSERT INTO crawl_frontier (url, site, depth)
+                        SELECT u.url, $1, $2
+                        FROM unnest($3::text[]) WITH ORDINALITY AS u(url, n)
+                        WHERE NOT EXISTS (SELECT 1 FROM crawl_frontier f WHERE f.url = u.url)
+                        ORDER BY u.n
+                        LIMIT $4
+                        ON CONFLICT (url) DO NOTHING
+                        RETURNING 1
+                    )
+                    SELECT count(*) FROM added
+                ''', site, depth, list(dict.fromkeys(urls)), room)
+                await conn.execute(
+                    'UPDATE crawl_sites SET enqueued = enqueued + $2 WHERE site = $1', site, added
+                )
+        return added
+
+    async def claim_frontier_tasks(self, worker: str, limit: int, lease: float) -> List[Dict]:
+        """Lease up to limit queued URLs to a worker for lease seconds.
+
+        SKIP LOCKED lets any number of workers claim at once without
+        blocking on, or double-claiming, each other's rows.
+        """
+        await self.ensure_connection()
+        async with self.conn_pool.acquire() as conn:
+            rows = await conn.fetch('''
+                UPDATE crawl_frontier f
+                SET status = 'leased', worker = $1, attempts = f.attempts + 1,
+                    lease_expires_at = now() + make_interval(secs => $3), updated_at = now()
+                FROM (
+                    SELECT id FROM crawl_frontier WHERE status = 'queued'
+                    ORDER BY id LIMIT $2
+                    FOR UPDATE SKIP LOCKED
+                ) claimed, crawl_sites s
+                WHERE f.id = claimed.id AND s.site = f.site
+                RETURNING f.id, f.url, f.site, f.depth, s.max_depth
+            ''', worker, limit, lease)
+        return [dict(row) for row in rows]
+
+    async def renew_frontier_leases(self, worker: str, task_ids: List[int], lease: float) -> List[int]:
+        """Heartbeat: extend the worker's leases. Returns the ids it still holds."""
+        await self.ensure_connection()
+        if not task_ids:
+            return []
+        async with self.conn_pool.acquire() as conn:
+            rows = await conn.fetch('''
+                UPDATE crawl_frontier SET lease_expires_at = now() + make_interval(secs => $3), updated_at = now()
+                WHERE id = ANY($2::bigint[]) AND worker = $1 AND status = 'leased'
+                RETURNING id
+            ''', worker, task_ids, lease)
+        return [row['id'] for row in rows]
+
+    async def complete_frontier_task(self, task_id: int, worker: str, page_id: Optional[int]) -> bool:
+        """Mark a leased task done; False if the worker had lost the lease"""
+        await self.ensure_connection()
+        async with self.conn_pool.acquire() as conn:
+            result = await conn.execute('''
+                UPDATE crawl_frontier
+                SET status = 'done', page_id = $3, worker = NULL, lease_expires_at = NULL, error = NULL,
+                    updated_at = now()
+                WHERE id = $1 AND worker = $2 AND status = 'leased'
+            ''', task_id, worker, page_id)
+        return result != "UPDATE 0"
+
+    async def fail_frontier_task(self, task_id: int, worker: str, error: str, max_attempts: int) -> None:
+        """Give a failed task back to the queue, or fail it after max_attempts"""
+        await self.ensure_connection()
+        async with self.conn_pool.acquire() as conn:
+            await conn.execute('''
+                UPDATE crawl_frontier
+                SET status = CASE WHEN attempts >= $4 THEN 'failed' ELSE 'queued' END,
+                    worker = NULL, lease_expires_at = NULL, error = $3, updated_at = now()
+                WHERE id = $1 AND worker = $2 AND status = 'leased'
+            ''', task_id, worker, error, max_attempts)
+
+    async def release_frontier_tasks(self, worker: str) -> None:
+        """Hand a stopping worker's leases back without counting the attempt"""
+        await self.ensure_connection()
+        async with self.conn_pool.acquire() as conn:
+            await conn.execute('''
+                UPDATE crawl_frontier
+                SET status = 'queued', worker = NULL, lease_expires_at = NULL,
+                    attempts = greatest(attempts - 1, 0), updated_at = now()
+                WHERE worker = $1 AND status = 'leased'
+            ''', worker)
+
+    async def requeue_expired_frontier_tasks(self, max_attempts: int) -> int:
+        """Re-queue tasks whose worker stopped heartbeating (or fail them
+        after max_attempts). Returns how many leases had expired."""
+        await self.ensure_connection()
+        async with self.conn_pool.acquire() as conn:
+            result = await conn.execute('''
+                UPDATE crawl_frontier
+                SET status = CASE WHEN attempts >= $1 THEN 'failed' ELSE 'queued' END,
+                    error = 'lease expired on ' || worker, worker = NULL, lease_expires_at = NULL,
+                    updated_at = now()
+                WHERE status = 'leased' AND lease_expires_at < now()
+            ''', max_attempts)
+        return int(result.split()[-1])
+
+    async def get_frontier_stats(self) -> Dict[str, int]:
+        """Number of frontier tasks by status"""
+        await self.ensure_connection()
+        async with self.conn_pool.acquire() as conn:
+            rows = await conn.fetch('SELECT status, count(*) AS tasks FROM crawl_frontier GROUP BY status')
+        return {row['status']: row['tasks'] for row in rows}
+
+    async def get_cached_analysis(self, cache_key: str, ttl: float) -> Optional[Dict]:
+        """Get a cached analysis younger than ttl seconds, marking it as recently used"""
+        await self.ensure_connection()
+        now = datetime.now()
+        async with self.conn_pool.acquire() as conn:
+            analysis = await conn.fetchval('''
+                UPDATE analysis_cache SET last_hit_at = $3
+                WHERE cache_key = $1 AND created_at >= $2
+                RETURNING analysis
+            ''', cache_key, now - timedelta(seconds=ttl), now)
+        if analysis is None:
+            return None
+        return json.loads(analysis) if isinstance(analysis, str) else analysis
+
+    async def store_cached_analysis(self, cache_key: str, model: str, analysis: Dict) -> None:
+        """Insert or refresh a cached analysis"""
+        await self.ensure_connection()
+        now = datetime.now()
+        async with self.conn_pool.acquire() as conn:
+            await conn.execute('''
+                INSERT INTO analysis_cache (cache_key, model, analysis, created_at, last_hit_at)
+                VALUES ($1, $2, $3, $4, $4)
+                ON CONFLICT (cache_key) DO UPDATE
+                SET analysis = EXCLUDED.analysis, created_at = EXCLUDED.created_at,
+                    last_hit_at = EXCLUDED.last_hit_at
+            ''', cache_key, model, json.dumps(analysis), now)
+
+    async def prune_analysis_cache(self, max_rows: int, ttl: float) -> None:
+        """Drop expired cache rows, then the least recently used beyond max_rows"""
+        await self.ensure_connection()
+        async with self.conn_pool.acquire() as conn:
+            await conn.execute(
+                'DELETE FROM analysis_cache WHERE created_at < $1',
+                datetime.now() - timedelta(seconds=ttl)
+            )
+            await conn.execute('''
+                DELETE FROM analysis_cache WHERE cache_key IN (
+                    SELECT cache_key FROM analysis_cache
+                    ORDER BY last_hit_at DESC
+                    OFFSET $1
+                )
+            ''', max_rows)
+
+    async def iter_canonical_fingerprints(self) -> AsyncIterator[Tuple[int, int]]:
+        """Yield (id, simhash) of every fingerprinted page that is not a duplicate"""
+        await self.ensure_connection()
+        async with self.conn_pool.acquire() as conn:
+            async with conn.transaction():
+                async for row in conn.cursor(
+                    'SELECT id, simhash FROM crawled_pages WHERE simhash IS NOT NULL AND canonical_id IS NULL',
+                    prefetch=10000
+                ):
+                    yield row['id'], from_signed64(row['simhash'])
+
+    async def set_canonical_pages(self, duplicates: Dict[int, int]) -> None:
+        """Point duplicate pages ({page id: canonical id}) at their canonical page"""
+        await self.ensure_connection()
+        if not duplicates:
+            return
+        async with self.conn_pool.acquire() as conn:
+            await conn.execute('''
+                UPDATE crawled_pages p SET canonical_id = d.canonical_id
+                FROM unnest($1::int[], $2::int[]) AS d(id, canonical_id)
+                WHERE p.id = d.id
+            ''', list(duplicates.keys()), list(duplicates.values()))
+
+    async def copy_canonical_analysis(self, page_ids: List[int]) -> List[int]:
+        """Give duplicate pages the LLM analysis of their canonical page.
+
+        Returns the ids of the pages whose canonical page has no analysis
+        (never analysed, or its analysis failed); those need their own.
+        """
+        await self.ensure_connection()
+        if not page_ids:
+            return []
+        async with self.conn_pool.acquire() as conn:
+            rows = await conn.fetch('''
+                UPDATE crawled_pages d
+                SET summary = c.summary, category = c.category,
+                    sentiment = c.sentiment, insights = c.insights
+                FROM crawled_pages c
+                WHERE d.id = ANY($1::int[]) AND c.id = d.canonical_id AND c.summary IS NOT NULL
+                RETURNING d.id
+            ''', page_ids)
+        copied = {row["id"] for row in rows}
+        return [page_id for page_id in page_ids if page_id not in copied]
+
+    async def search_pages(
+        self,
+        query: Optional[str] = None,
+        category: Optional[str] = None,
+        sentiment: Optional[str] = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> Tuple[List[SearchResult], int, Dict[str, Dict[str, int]]]:
+        """Ranked keyword search with category/sentiment filters.
+
+        Returns the requested page of hits (with highlighted snippets), the
+        total number of matches and per-category/per-sentiment counts of
+        the matches for facet navigation. Without a query, matches are the
+        filtered pages ordered by recency.
+        """
+        await self.ensure_connection()
+        query = (query or "").strip() or None
+        # Shared by the hit and facet queries: $1 query, $2 category, $3 sentiment
+        matches = '''
+            SELECT p.id, p.category, p.sentiment, p.crawled_at,
+                   CASE WHEN $1::text IS NULL THEN 0
+                        ELSE ts_rank_cd(p.search_vector, websearch_to_tsquery('english', $1)) END AS rank
+            FROM crawled_pages p
+            WHERE ($1::text IS NULL OR p.search_vector @@ websearch_to_tsquery('english', $1))
+              AND ($2::text IS NULL OR p.category = $2)
+              AND ($3::text IS NULL OR p.sentiment = $3)
+        '''
+        async def fetch_hits():
+            # Snippets are built only for the returned page of hits
+            async with self.conn_pool.acquire() as conn:
+                return await conn.fetch(f'''
+                    WITH matches AS ({matches}), top AS (
+                        SELECT * FROM matches
+                        ORDER BY rank DESC, crawled_at DESC NULLS LAST, id DESC
+                        LIMIT $4 OFFSET $5
+                    )
+                    SELECT p.id, p.url, p.title, p.category, p.sentiment, p.crawled_at, top.rank,
+                           CASE WHEN $1::text IS NULL THEN left(coalesce(p.summary, ''), 300)
+                                ELSE ts_headline(
+                                    'english',
+                                    coalesce(p.summary, '') || ' ' || coalesce(c.excerpt, ''),
+                                    websearch_to_tsquery('english', $1),
+                                    'StartSel=<mark>, StopSel=</mark>, MaxWords=35, MinWords=15, MaxFragments=2'
+                                ) END AS snippet
+                    FROM top JOIN crawled_pages p ON p.id = top.id
+                    LEFT JOIN page_contents c ON c.content_hash = p.content_hash
+                    ORDER BY top.rank DESC, top.crawled_at DESC NULLS LAST, top.id DESC
+                ''', query, category, sentiment, limit, offset)
+
+        async def fetch_facets():
+            async with self.conn_pool.acquire() as conn:
+                return await conn.fetch(f'''
+                    WITH matches AS ({matches})
+                    SELECT GROUPING(category, sentiment) AS grouping, category, sentiment, count(*) AS hits
+                    FROM matches
+                    GROUP BY GROUPING SETS ((category), (sentiment), ())
+                ''', query, category, sentiment)
+
+        # Both scan the same matches; run them on separate connections
+        rows, facet_rows = await asyncio.gather(fetch_hits(), fetch_facets())
+
+        results = [SearchResult(
+            id=row['id'],
+            url=row['url'],
+            title=row['title'],
+            category=row['category'],
+            sentiment=row['sentiment'],
+            crawled_at=row['crawled_at'],
+            rank=row['rank'],
+            snippet=row['snippet'] or ""
+        ) for row in rows]
+
+        total = 0
+        facets = {"category": {}, "sentiment": {}}
+        for row in facet_rows:
+            # GROUPING bits: 1 = grouped by category, 2 = by sentiment, 3 = grand total
+            if row['grouping'] == 1:
+                facets["category"][row['category'] or "unknown"] = row['hits']
+            elif row['grouping'] == 2:
+                facets["sentiment"][row['sentiment'] or "unknown"] = row['hits']
+            else:
+                total = row['hits']
+        return results, total, facets
+
+    async def enable_pgvector(self, dim: int) -> bool:
+        """Add a pgvector column of size dim and an HNSW index to page_embeddings.
+
+        Returns False when the extension is not available. If the column
+        exists with a different size (the embedding model changed), it is
+        recreated empty and has to be backfilled.
+        """
+        await self.ensure_connection()
+        try:
+            async with self.conn_pool.acquire() as conn:
+                await conn.execute('CREATE EXTENSION IF NOT EXISTS vector')
+                current = await conn.fetchval('''
+                    SELECT atttypmod FROM pg_attribute
+                    WHERE attrelid = 'page_embeddings'::regclass AND attname = 'embedding' AND NOT attisdropped
+                ''')
+                if current is not None and current != dim:
+                    await conn.execute('ALTER TABLE page_embeddings DROP COLUMN embedding')
+                await conn.execute(f'ALTER TABLE page_embeddings ADD COLUMN IF NOT EXISTS embedding vector({int(dim)})')
+        except Exception as e:
+            print(f"pgvector unavailable, using the in-process vector index: {e}")
+            return False
+
+        try:
+            async with self.conn_pool.acquire() as conn:
+                await conn.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_page_embeddings_hnsw
+                    ON page_embeddings USING hnsw (embedding vector_cosine_ops)
+                ''')
+        except Exception as e:
+            # Older pgvector without HNSW: queries still work, as exact scans
+            print(f"Could not create the HNSW index: {e}")
+        return True
+
+    async def get_embedding_dim(self, model: str) -> Optional[int]:
+        """Size of the stored vectors of a model, or None if there are none"""
+        await self.ensure_connection()
+        async with self.conn_pool.acquire() as conn:
+            return await conn.fetchval('SELECT dim FROM page_embeddings WHERE model = $1 LIMIT 1', model)
+
+    async def get_embedding_inputs(self, page_ids: List[int], max_chars: int) -> List[Dict]:
+        """Title, summary and the start of the content of pages, for embedding"""
+        await self.ensure_connection()
+        if not page_ids:
+            return []
+        async with self.conn_pool.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT p.id, p.title, p.summary, c.codec, c.body
+                FROM crawled_pages p LEFT JOIN page_contents c ON c.content_hash = p.content_hash
+                WHERE p.id = ANY($1::int[])
+            ''', page_ids)
+        return [{
+            "id": row['id'],
+            "title": row['title'],
+            "summary": row['summary'],
+            "content": decompress_content(row['codec'], row['body'], max_chars) if row['body'] is not None else None
+        } for row in rows]
+
+    async def store_embeddings(
+        self,
+        model: str,
+        dim: int,
+        page_ids: List[int],
+        vectors: List[bytes],
+        literals: Optional[List[str]] = None,
+    ) -> None:
+        """Upsert page vectors; literals ('[x,y,...]') also fill the pgvector column"""
+        await self.ensure_connection()
+        if not page_ids:
+            return
+        async with self.conn_pool.acquire() as conn:
+            if literals is None:
+                await conn.execute('''
+                    INSERT INTO page_embeddings (page_id, model, dim, vector)
+                    SELECT page_id, $1, $2, vector FROM unnest($3::int[], $4::bytea[]) AS e(page_id, vector)
+                    ON CONFLICT (page_id) DO UPDATE
+                    SET model = EXCLUDED.model, dim = EXCLUDED.dim, vector = EXCLUDED.vector, created_at = NOW()
+                ''', model, dim, page_ids, vectors)
+            else:
+                await conn.execute('''
+                    INSERT INTO page_embeddings (page_id, model, dim, vector, embedding)
+                    SELECT page_id, $1, $2, vector, literal::vector
+                    FROM unnest($3::int[], $4::bytea[], $5::text[]) AS e(page_id, vector, literal)
+                    ON CONFLICT (page_id) DO UPDATE
+                    SET model = EXCLUDED.model, dim = EXCLUDED.dim, vector = EXCLUDED.vector,
+                        embedding = EXCLUDED.embedding, created_at = NOW()
+                ''', model, dim, page_ids, vectors, literals)
+
+    async def set_embedding_vectors(self, page_ids: List[int], literals: List[str]) -> None:
+        """Fill the pgvector column of already stored embeddings"""
+        await self.ensure_connection()
+        if not page_ids:
+            return
+        async with self.conn_pool.acquire() as conn:
+            await conn.execute('''
+                UPDATE page_embeddings e SET embedding = v.literal::vector
+                FROM unnest($1::int[], $2::text[]) AS v(page_id, literal)
+                WHERE e.page_id = v.page_id
+            ''', page_ids, literals)
+
+    async def iter_embeddings(self, model: str, missing_vector: bool = False) -> AsyncIterator[Tuple[int, bytes]]:
+        """Yield (page id, float32 bytes) of every stored vector of a model.
+
+        With missing_vector, only rows whose pgvector column is still empty.
+        """
+        await self.ensure_connection()
+        query = 'SELECT page_id, vector FROM page_embeddings WHERE model = $1'
+        if missing_vector:
+            query += ' AND embedding IS NULL'
+        async with self.conn_pool.acquire() as conn:
+            async with conn.transaction():
+                async for row in conn.cursor(query, model, prefetch=10000):
+                    yield row['page_id'], row['vector']
+
+    async def get_embedding(self, page_id: int, model: str) -> Optional[bytes]:
+        await self.ensure_connection()
+        async with self.conn_pool.acquire() as conn:
+            return await conn.fetchval(
+                'SELECT vector FROM page_embeddings WHERE page_id = $1 AND model = $2', page_id, model
+            )
+
+    async def nearest_embeddings(
+        self, model: str, literal: str, limit: int, exclude_id: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        """(page id, cosine similarity) of the closest vectors, via the pgvector index"""
+        await self.ensure_connection()
+        async with self.conn_pool.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT page_id, 1 - (embedding <=> $1::vector) AS score
+                FROM page_embeddings
+                WHERE model = $2 AND embedding IS NOT NULL AND page_id IS DISTINCT FROM $3
+                ORDER BY embedding <=> $1::vector
+                LIMIT $4
+            ''', literal, model, exclude_id, limit)
+        return [(row['page_id'], row['score']) for row in rows]
+
+    async def get_search_results(self, page_ids: List[int]) -> Dict[int, SearchResult]:
+        """Pages as unranked SearchResults (summary as snippet), keyed by id"""
+        await self.ensure_connection()
+        if not page_ids:
+            return {}
+        async with self.conn_pool.acquire() as conn:
+            rows = await conn.fetch('''
+                SELECT id, url, title, category, sentiment, crawled_at, left(coalesce(summary, ''), 300) AS snippet
+                FROM crawled_pages WHERE id = ANY($1::int[])
+            ''', page_ids)
+        return {row['id']: SearchResult(**dict(row)) for row in rows}
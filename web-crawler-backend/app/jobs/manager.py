@@ -0,0 +1,121 @@
+import asyncio
+import json
+import os
+from typing import Awaitable, Callable, Dict, List, Optional
+from uuid import uuid4
+
+from app.database.db import Database, CrawlJob
+from app.monitoring.metrics import JOBS, JobTrace, timed, tracing
+
+# handler(job, progress) -> list of stored page ids
+JobHandler = Callable[[CrawlJob, Callable[..., Awaitable[None]]], Awaitable[List[int]]]
+
+
+class JobManager:
+    """Persistent job queue served by a bounded pool of background workers.
+
+    Jobs are written to the ``crawl_jobs`` table before they are queued, so
+    anything still queued or running when the server stops is picked up again
+    by ``start()`` on the next boot.
+
+    Jobs submitted with ``trace`` in their params (or every job, with
+    JOB_TRACE=true) record a timing trace of their stages, saved with the
+    job when it finishes.
+    """
+
+    def __init__(
+        self,
+        database: Database,
+        handler: JobHandler,
+        workers: Optional[int] = None,
+        trace_all: Optional[bool] = None,
+    ):
+        self.database = database
+        self.handler = handler
+        self.workers = workers if workers is not None else int(os.getenv("JOB_WORKERS", "2"))
+        self.trace_all = (
+            trace_all if trace_all is not None
+            else os.getenv("JOB_TRACE", "false").lower() in ("1", "true", "yes")
+        )
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        """Re-queue unfinished jobs and start the worker pool.
+
+        Jobs left running were interrupted by a restart and are reset to
+        queued so a worker can claim them again.
+        """
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        for job in await self.database.get_unfinished_jobs():
+            if job.status == "running":
+                await self.database.update_job(job.id, status="queued")
+            self._queue.put_nowait(job.id)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(max(1, self.workers))]
+
+    async def stop(self):
+        """Cancel the workers. Interrupted jobs stay 'running' and are re-queued on restart."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(self, query: str, query_type: str, params: Optional[Dict] = None) -> CrawlJob:
+        """Persist a job and queue it for the workers"""
+        job = await self.database.create_job(str(uuid4()), query, query_type, params or {})
+        if self._queue is None:
+            # Queues every unfinished job, this one included
+            await self.start()
+        else:
+            self._queue.put_nowait(job.id)
+        return job
+
+    async def _worker(self, worker_id: int):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception as e:
+                print(f"Job worker {worker_id} failed on {job_id}: {e}")
+            finally:
+                self._queue.task_done()
+
+    @property
+    def pending(self) -> int:
+        """Jobs waiting for a worker"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _run(self, job_id: str):
+        # A job id can be queued twice (by start() and submit()); only the
+        # worker that claims it runs it
+        job = await self.database.claim_job(job_id)
+        if job is None:
+            return
+
+        async def progress(**fields):
+            await self.database.update_job(job_id, **fields)
+
+        trace = JobTrace() if self.trace_all or job.params.get("trace") else None
+        try:
+            if trace is not None:
+                with tracing(trace):
+                    page_ids = await self._handle(job, progress)
+            else:
+                page_ids = await self._handle(job, progress)
+            await self.database.update_job(
+                job_id, status="completed", stage="done", page_count=len(page_ids)
+            )
+            JOBS.inc(status="completed")
+        except Exception as e:
+            print(f"Error in crawl job {job_id}: {e}")
+            await self.database.update_job(job_id, status="failed", error=str(e))
+            JOBS.inc(status="failed")
+        finally:
+            if trace is not None:
+                await self.database.update_job(job_id, trace=json.dumps(trace.to_dict()))
+
+    async def _handle(self, job: CrawlJob, progress: Callable[..., Awaitable[None]]) -> List[int]:
+        with timed("job", query_type=job.query_type):
+            return await self.handler(job, progress)
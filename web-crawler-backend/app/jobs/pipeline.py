@@ -0,0 +1,442 @@
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.crawler.dedup import NearDuplicateDetector
+from app.crawler.ranking import rank_pages
+from app.crawler.revalidator import Revalidator, CHANGED, UNCHANGED, UNKNOWN
+from app.crawler.seeds import SeedProvider
+from app.database.db import Database, CrawlJob, content_hash
+from app.llm.analyzer import OllamaAnalyzer
+from app.llm.embeddings import SemanticIndex
+from app.llm.scheduler import AnalysisScheduler, BULK, CRAWL, INTERACTIVE
+from app.monitoring.metrics import timed
+
+
+async def _ignore_progress(**_):
+    pass
+
+
+class CrawlPipeline:
+    """The crawl -> store -> analyze stages run for each crawl job"""
+
+    def __init__(
+        self,
+        database: Database,
+        analyzer: OllamaAnalyzer,
+        crawl: Callable[..., Awaitable],
+        iter_pages: Optional[Callable[..., AsyncIterator[Dict]]] = None,
+        fetch_page: Optional[Callable[[str], Awaitable[Optional[Dict]]]] = None,
+        revalidator: Optional[Revalidator] = None,
+        dedup: Optional[NearDuplicateDetector] = None,
+        semantic: Optional[SemanticIndex] = None,
+        seeds: Optional[SeedProvider] = None,
+        keyword_concurrency: Optional[int] = None,
+        scheduler: Optional[AnalysisScheduler] = None,
+        batch_concurrency: Optional[int] = None,
+        batch_timeout: Optional[float] = None,
+    ):
+        self.database = database
+        self.analyzer = analyzer
+        # crawl(domain, max_depth, max_pages) -> CrawlerTestResponse
+        self.crawl = crawl
+        # iter_pages(domain, max_depth, max_pages, timeout=None) yields pages as they are fetched
+        self.iter_pages = iter_pages
+        # fetch_page(url) renders a single page, used when re-crawling
+        self.fetch_page = fetch_page
+        self.revalidator = revalidator or Revalidator()
+        # Near-duplicates of an already stored page reuse its analysis
+        self.dedup = dedup
+        # Analysed pages are embedded for similarity search
+        self.semantic = semantic
+        # Keyword crawls fetch the URLs a seed provider finds for the keyword
+        self.seeds = seeds
+        self.keyword_concurrency = (
+            keyword_concurrency if keyword_concurrency is not None
+            else int(os.getenv("KEYWORD_CONCURRENCY", "8"))
+        )
+        # Orders analyses across jobs; without it pages go straight to the analyzer
+        self.scheduler = scheduler
+        # Domains crawled at once by all batch crawls together, and the
+        # default time each domain's crawl gets
+        self.batch_concurrency = (
+            batch_concurrency if batch_concurrency is not None
+            else int(os.getenv("BATCH_CRAWL_CONCURRENCY", "8"))
+        )
+        self.batch_timeout = (
+            batch_timeout if batch_timeout is not None
+            else float(os.getenv("BATCH_CRAWL_TIMEOUT", "120"))
+        )
+        self._batch_slots: Optional[asyncio.Semaphore] = None
+
+    async def run_job(self, job: CrawlJob, progress: Callable[..., Awaitable[None]]) -> List[int]:
+        """Run a job end to end, reporting progress after every stage and page"""
+        if job.query_type == "domain" and job.params.get("refresh"):
+            page_ids = await self.refresh(job.query, progress)
+            if page_ids is not None:
+                await self.analyze_pages(page_ids, progress, priority=BULK)
+                return page_ids
+
+        if job.query_type == "domain":
+            await progress(stage="crawling")
+            with timed("crawl", domain=job.query) as span:
+                crawler_response = await self.crawl(
+                    job.query,
+                    job.params.get("max_depth", 0),
+                    job.params.get("max_pages", 100)
+                )
+                span["pages"] = len(crawler_response.data or [])
+
+            if not crawler_response.success or not crawler_response.data:
+                raise ValueError(f"Crawler failed: {crawler_response.error}")
+
+            results = crawler_response.data
+        else:
+            with timed("crawl", keyword=job.query) as span:
+                results = await self.crawl_keyword(job.query, job.params.get("max_pages", 100), progress)
+                span["pages"] = len(results)
+
+        await progress(stage="storing", pages_total=len(results))
+        page_ids, duplicates = await self.store(results)
+
+        analyze_ids = page_ids
+        if job.query_type != "domain":
+            # Every fetched page is stored, but only the most relevant are analysed
+            ranked = rank_pages(job.query, results, job.params.get("top_k", 10))
+            analyze_ids = [page_ids[index] for index, _ in ranked]
+            duplicates = {page_id: duplicates[page_id] for page_id in analyze_ids if page_id in duplicates}
+        # A single page is somebody waiting on one URL; it goes ahead of bigger crawls
+        single_page = job.query_type == "domain" and not job.params.get("max_depth")
+        await self.analyze_pages(analyze_ids, progress, duplicates, INTERACTIVE if single_page else CRAWL)
+        return page_ids
+
+    async def crawl_keyword(
+        self, keyword: str, max_pages: int, progress: Callable[..., Awaitable[None]]
+    ) -> List[Dict]:
+        """Fetch the seed URLs found for a keyword"""
+        await progress(stage="seeding")
+        urls = await self.seed_urls(keyword, max_pages)
+        await progress(stage="crawling", pages_total=len(urls))
+        return [page async for page in self.iter_keyword_pages(urls)]
+
+    async def seed_urls(self, keyword: str, max_pages: int) -> List[str]:
+        if self.seeds is None:
+            raise ValueError("Keyword crawling needs a seed provider (set SEED_FILE or SEED_SEARCH_URL)")
+        urls = await self.seeds.seeds(keyword, max_pages)
+        if not urls:
+            raise ValueError(f"No seed URLs found for: {keyword}")
+        return urls
+
+    async def iter_keyword_pages(self, urls: List[str]) -> AsyncIterator[Dict]:
+        """Fetch urls keyword_concurrency at a time, yielding pages as they arrive"""
+        limit = asyncio.Semaphore(max(1, self.keyword_concurrency))
+
+        async def fetch(url: str) -> Optional[Dict]:
+            async with limit:
+                return await self.fetch_page(url)
+
+        tasks = [asyncio.create_task(fetch(url)) for url in urls]
+        try:
+            for next_page in asyncio.as_completed(tasks):
+                page = await next_page
+                if page:
+                    yield page
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def store(self, pages: List[Dict]) -> Tuple[List[int], Dict[int, int]]:
+        """Store pages; returns their ids and {near-duplicate id: canonical id}"""
+        if self.dedup is None:
+            return await self.database.store_crawled_data(pages), {}
+        await self.dedup.prepare(pages)
+        page_ids = await self.database.store_crawled_data(pages)
+        return page_ids, await self.dedup.assign(page_ids, pages)
+
+    async def analyze_pages(
+        self,
+        page_ids: List[int],
+        progress: Callable[..., Awaitable[None]],
+        duplicates: Optional[Dict[int, int]] = None,
+        priority: int = CRAWL,
+    ):
+        """Run the LLM analysis for stored pages, queued at priority on the scheduler.
+
+        Near-duplicates are not sent to the LLM; they get a copy of their
+        canonical page's analysis once that is done, unless the canonical
+        page has none (e.g. it was outside a keyword crawl's top_k, or its
+        analysis failed), in which case they are analysed themselves.
+        """
+        duplicates = duplicates or {}
+        await progress(stage="analyzing", pages_total=len(page_ids), page_count=len(page_ids))
+        done = len(duplicates)
+
+        async def analyze(page_id: int):
+            nonlocal done
+            if self.scheduler is not None:
+                await self.scheduler.analyze(page_id, priority)
+            else:
+                page = await self.database.get_page(page_id)
+                if page and page.content:
+                    # Concurrency is bounded by the analyzer's OLLAMA_NUM_PARALLEL semaphore
+                    with timed("analyze_page", page_id=page_id):
+                        analysis = await self.analyzer.analyze_text_async(page.content, page.title, page.url)
+                    await self.database.update_with_analysis(page_id, analysis)
+            done += 1
+            await progress(pages_done=done)
+
+        originals = [page_id for page_id in dict.fromkeys(page_ids) if page_id not in duplicates]
+        await asyncio.gather(*(analyze(page_id) for page_id in originals))
+        unanalysed = await self.database.copy_canonical_analysis(list(duplicates))
+        # Already counted as done up front
+        done -= len(unanalysed)
+        await asyncio.gather(*(analyze(page_id) for page_id in unanalysed))
+
+        await progress(stage="embedding")
+        await self.embed_pages(page_ids)
+
+    async def embed_pages(self, page_ids: List[int]):
+        """Embed analysed pages in batches; failures do not fail the crawl"""
+        if self.semantic is None or not page_ids:
+            return
+        try:
+            await self.semantic.embed_pages(page_ids)
+        except Exception as e:
+            print(f"Embedding {len(page_ids)} pages failed: {e}")
+
+    async def refresh(self, domain: str, progress: Callable[..., Awaitable[None]]) -> Optional[List[int]]:
+        """Incrementally re-crawl the stored pages of a domain.
+
+        Each page is first checked with a conditional GET; only pages the
+        server reports as modified (or that send no validators) are
+        rendered again, and of those only pages whose content fingerprint
+        changed are updated in place. Returns the ids of changed pages, or
+        None when nothing is stored for the domain yet.
+        """
+        await progress(stage="revalidating")
+        tracked = await self.database.get_tracked_pages(domain)
+        if not tracked:
+            return None
+        await progress(pages_total=len(tracked))
+
+        outcomes = await self.revalidator.check_many(tracked)
+        unchanged = [page_id for page_id, outcome in outcomes.items() if outcome == UNCHANGED]
+        candidates = [page for page in tracked if outcomes[page["id"]] in (CHANGED, UNKNOWN)]
+
+        await progress(stage="rendering", pages_total=len(candidates))
+        fetched = await asyncio.gather(*(self.fetch_page(page["url"]) for page in candidates))
+
+        changed_pages, changed_ids = [], []
+        for stored, page in zip(candidates, fetched):
+            if page is None:
+                continue
+            if content_hash(page["content"]) == stored["content_hash"]:
+                unchanged.append(stored["id"])
+            else:
+                changed_pages.append(page)
+                changed_ids.append(stored["id"])
+
+        await progress(stage="storing", pages_total=len(changed_pages))
+        await self.database.mark_validated(unchanged)
+        if self.dedup is None:
+            return await self.database.update_crawled_data(changed_pages)
+
+        # Changed content needs a new fingerprint and a new duplicate check
+        await self.dedup.prepare(changed_pages)
+        page_ids = await self.database.update_crawled_data(changed_pages)
+        updated = set(page_ids)
+        pairs = [(page_id, page) for page_id, page in zip(changed_ids, changed_pages) if page_id in updated]
+        await self.dedup.reassign([page_id for page_id, _ in pairs], [page for _, page in pairs])
+        return page_ids
+
+    async def crawl_batch(
+        self,
+        domains: List[str],
+        max_depth: int = 0,
+        max_pages: int = 100,
+        timeout: Optional[float] = None,
+        analyze: bool = True,
+    ) -> AsyncIterator[Dict]:
+        """Crawl many domains concurrently, yielding one result per domain as it finishes.
+
+        All batches share batch_concurrency crawl slots (and the browser
+        pool). Each domain's crawl and storage is cut off after ``timeout``
+        seconds; pages stored by then are kept and reported with status
+        "timeout". Stored pages are analysed after the slot is released.
+        """
+        if self._batch_slots is None:
+            self._batch_slots = asyncio.Semaphore(max(1, self.batch_concurrency))
+        timeout = timeout or self.batch_timeout
+        tasks = [
+            asyncio.create_task(self._crawl_batch_domain(domain, max_depth, max_pages, timeout, analyze))
+            for domain in domains
+        ]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield await next_result
+        finally:
+            # Also reached when the client disconnects mid-stream
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _crawl_batch_domain(
+        self, domain: str, max_depth: int, max_pages: int, timeout: float, analyze: bool
+    ) -> Dict:
+        page_ids: List[int] = []
+        duplicates: Dict[int, int] = {}
+        result = {"domain": domain, "status": "ok", "page_ids": page_ids, "error": None}
+
+        async def crawl():
+            async for page in self.iter_pages(domain, max_depth, max_pages, timeout=timeout):
+                stored, stored_duplicates = await self.store([page])
+                page_ids.extend(stored)
+                duplicates.update(stored_duplicates)
+
+        async with self._batch_slots:
+            started = time.perf_counter()
+            try:
+                with timed("crawl", domain=domain) as span:
+                    await asyncio.wait_for(crawl(), timeout)
+                    span["pages"] = len(page_ids)
+            except asyncio.TimeoutError:
+                result.update(status="timeout", error=f"Crawl timed out after {timeout:g} seconds")
+            except Exception as e:
+                result.update(status="failed", error=str(e))
+            result["crawl_seconds"] = round(time.perf_counter() - started, 3)
+
+        if not page_ids and result["status"] == "ok":
+            result.update(status="failed", error="No pages returned from crawler")
+        if analyze and page_ids:
+            try:
+                await self.analyze_pages(page_ids, _ignore_progress, duplicates)
+            except Exception as e:
+                result.update(status="failed", error=f"Analysis failed: {e}")
+        result["page_count"] = len(page_ids)
+        return result
+
+    async def stream(
+        self, query: str, query_type: str, max_depth: int = 0, max_pages: int = 100, top_k: int = 10
+    ) -> AsyncIterator[Tuple[str, Dict]]:
+        """Run the pipeline and yield (event, data) pairs as work completes.
+
+        Pages are stored as soon as they are fetched and analysed
+        concurrently while the crawl carries on, so events from different
+        pages interleave; every page event carries its page_id. Keyword
+        crawls can only rank pages once all are fetched, so they send a
+        "ranked" event and then analyse the top_k pages. Analyses go through
+        the scheduler like those of queued jobs, at the same priority.
+        """
+
+        events: asyncio.Queue = asyncio.Queue()
+        finished = object()
+        single_page = query_type == "domain" and not max_depth
+        priority = INTERACTIVE if single_page else CRAWL
+
+        async def analyze(page_id: int, page: Dict):
+            async def send_token(token: str):
+                await events.put(("analysis_token", {"page_id": page_id, "token": token}))
+
+            try:
+                if self.scheduler is not None:
+                    analysis = await self.scheduler.analyze(page_id, priority, send_token)
+                else:
+                    analysis = None
+                    async for kind, value in self.analyzer.analyze_text_stream(
+                        page["content"], page["title"], page["url"]
+                    ):
+                        if kind == "token":
+                            await send_token(value)
+                        else:
+                            analysis = value
+                    await self.database.update_with_analysis(page_id, analysis)
+                await events.put(("analysis_done", {"page_id": page_id, "analysis": analysis}))
+            except Exception as e:
+                await events.put(("error", {"page_id": page_id, "error": str(e)}))
+
+        async def reuse(page_id: int, page: Dict, canonical_id: int, canonical_task: Optional[asyncio.Task]):
+            try:
+                if canonical_task is not None:
+                    await canonical_task
+                if await self.database.copy_canonical_analysis([page_id]):
+                    # The canonical page has no analysis to copy
+                    if page.get("content"):
+                        await analyze(page_id, page)
+                    return
+                page = await self.database.get_page(page_id, with_body=False)
+                analysis = {
+                    "summary": page.summary,
+                    "category": page.category,
+                    "sentiment": page.sentiment,
+                    "insights": page.insights
+                } if page else {}
+                await events.put(("analysis_done", {
+                    "page_id": page_id, "analysis": analysis, "duplicate_of": canonical_id
+                }))
+            except Exception as e:
+                await events.put(("error", {"page_id": page_id, "error": str(e)}))
+
+        async def produce():
+            tasks = []
+            tasks_by_page = {}
+
+            def start(page_id: int, page: Dict, duplicates: Dict[int, int]):
+                if page_id in duplicates:
+                    canonical_id = duplicates[page_id]
+                    task = asyncio.create_task(reuse(page_id, page, canonical_id, tasks_by_page.get(canonical_id)))
+                elif page.get("content"):
+                    task = asyncio.create_task(analyze(page_id, page))
+                else:
+                    return
+                tasks.append(task)
+                tasks_by_page[page_id] = task
+
+            try:
+                if query_type == "domain":
+                    pages = self.iter_pages(query, max_depth, max_pages)
+                else:
+                    pages = self.iter_keyword_pages(await self.seed_urls(query, max_pages))
+                stored, stored_ids = [], []
+                async for page in pages:
+                    await events.put(("page_fetched", {"url": page["url"], "title": page["title"]}))
+                    page_ids, duplicates = await self.store([page])
+                    if not page_ids:
+                        continue
+                    page_id = page_ids[0]
+                    stored_ids.append(page_id)
+                    await events.put(("page_stored", {"page_id": page_id, "url": page["url"]}))
+                    if query_type == "domain":
+                        start(page_id, page, duplicates)
+                    else:
+                        stored.append((page_id, page, duplicates))
+
+                if stored:
+                    ranked = rank_pages(query, [page for _, page, _ in stored], top_k)
+                    await events.put(("ranked", {
+                        "pages": [{"page_id": stored[index][0], "score": score} for index, score in ranked]
+                    }))
+                    for index, _ in ranked:
+                        start(*stored[index])
+                await asyncio.gather(*tasks)
+                # One batched embedding call for the whole crawl
+                await self.embed_pages(list(tasks_by_page))
+                await events.put(("done", {"page_count": len(stored_ids)}))
+            except Exception as e:
+                await events.put(("error", {"error": str(e)}))
+            finally:
+                for task in tasks:
+                    task.cancel()
+                await events.put(finished)
+
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                event = await events.get()
+                if event is finished:
+                    break
+                yield event
+        finally:
+            # Also reached when the client disconnects mid-stream
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
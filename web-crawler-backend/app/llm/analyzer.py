@@ -1,21 +1,114 @@
+import asyncio
 import json
+import os
+import random
+import time
+from contextlib import aclosing
+import httpx
 import requests
-from typing import Dict, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple, Union
+
+from app.llm.cache import AnalysisCache
+from app.llm.chunking import count_tokens, load_encoding, split_markdown
+from app.llm.models import LARGE, SMALL, ModelRegistry, ModelSpec
+from app.llm.parsing import (
+    ANALYSIS_FIELDS, ANALYSIS_SCHEMA, CLASSIFICATION_FIELDS, CLASSIFICATION_SCHEMA, SUMMARY_FIELDS, SUMMARY_SCHEMA,
+    JsonObjectParser, parse_analysis
+)
+from app.monitoring.metrics import (
+    LLM_ESCALATIONS, LLM_GENERATED_TOKENS, LLM_PARSE_FAILURES, LLM_PROMPT_TOKENS, LLM_REQUESTS,
+    LLM_TOKENS_PER_SECOND, record_stage, timed
+)
+
+# Bump whenever the analysis prompt changes so cached results are not reused
+PROMPT_VERSION = 3
+
+# Output schema sent as Ollama's format for each kind of prompt; chunk summaries are plain text
+SCHEMAS = {"analysis": ANALYSIS_SCHEMA, "classify": CLASSIFICATION_SCHEMA, "summary": SUMMARY_SCHEMA}
 
 class OllamaAnalyzer:
     """Text analyzer using Ollama LLM"""
     
-    def __init__(self, model: str = "llama2"):
-        self.model = model
-        self.base_url = "http://localhost:11434/api"
+    def __init__(
+        self,
+        model: str = "llama2",
+        base_url: Optional[str] = None,
+        num_parallel: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        timeout: float = 60.0,
+        cache: Optional[AnalysisCache] = None,
+        chunk_tokens: Optional[int] = None,
+        max_chunks: Optional[int] = None,
+        chunk_parallel: Optional[int] = None,
+        output_format: Optional[str] = None,
+        models: Optional[ModelRegistry] = None,
+        summary_model: Optional[str] = None,
+    ):
+        self.base_url = base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/api")
+        # Should match OLLAMA_NUM_PARALLEL on the server: more in-flight
+        # requests than that only queue up inside Ollama.
+        self.num_parallel = num_parallel if num_parallel is not None else int(os.getenv("OLLAMA_NUM_PARALLEL", "1"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("OLLAMA_MAX_RETRIES", "3"))
+        self.timeout = timeout
+        self.cache = cache
+        # Long pages are split into chunk_tokens pieces that are summarised
+        # (up to chunk_parallel at once) and then merged into one analysis.
+        self.chunk_tokens = chunk_tokens if chunk_tokens is not None else int(os.getenv("ANALYSIS_CHUNK_TOKENS", "1500"))
+        self.max_chunks = max_chunks if max_chunks is not None else int(os.getenv("ANALYSIS_MAX_CHUNKS", "8"))
+        self.chunk_parallel = (
+            chunk_parallel if chunk_parallel is not None
+            else int(os.getenv("ANALYSIS_CHUNK_PARALLEL", str(self.num_parallel)))
+        )
+        # How analysis output is constrained: "schema" sends ANALYSIS_SCHEMA as
+        # Ollama's format (0.5+), "json" only forces valid JSON, "none" leaves
+        # it to the prompt. A server that rejects the schema drops to "json".
+        self.output_format = output_format or os.getenv("OLLAMA_FORMAT", "schema")
+        # With a small model registered, it classifies category and sentiment
+        # and the large model (``model`` unless configured) only writes the
+        # summary and insights, or the whole analysis when the small one failed
+        self.models = models or ModelRegistry.from_env(model, self.num_parallel)
+        self.model = self.models.get(LARGE).name
+        # "small" lets the small model write the whole analysis as well
+        self.summary_role = summary_model or os.getenv("ANALYSIS_SUMMARY_MODEL", LARGE)
+        if self.summary_role not in (SMALL, LARGE):
+            raise ValueError(f"ANALYSIS_SUMMARY_MODEL must be small or large, not {self.summary_role}")
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        """Open the pooled HTTP client used by the async path"""
+        if self._client is not None:
+            return
+        # Prompt sizes are counted on the event loop; the tokenizer may
+        # have to be downloaded first, which must not block it
+        await asyncio.to_thread(load_encoding)
+        self._client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(self.timeout, connect=10.0),
+            limits=httpx.Limits(
+                max_connections=self.models.parallel,
+                max_keepalive_connections=self.models.parallel
+            )
+        )
+
+    async def close(self):
+        """Close the pooled HTTP client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
         
     def analyze_text(self, text: str, title: str = "", url: str = "") -> Dict:
         """Analyze text content and return structured insights"""
-        # Truncate text if it's too long
-        max_length = 2000
-        if len(text) > max_length:
-            text = text[:max_length] + "..."
-            
+        # Long pages are summarised chunk by chunk first
+        chunks = self._chunk(text)
+        if len(chunks) > 1:
+            summaries = [
+                self._generate_response(self._create_chunk_prompt(chunk, title, url, i, len(chunks)), "chunk")
+                for i, chunk in enumerate(chunks)
+            ]
+            text = self._combine_summaries(summaries)
+        elif chunks:
+            text = chunks[0]
+
         # Create the prompt for the LLM
         prompt = self._create_analysis_prompt(text, title, url)
         
@@ -24,6 +117,202 @@ class OllamaAnalyzer:
         
         # Parse the response
         return self._parse_analysis(response)
+
+    async def analyze_text_async(self, text: str, title: str = "", url: str = "") -> Dict:
+        """Non-blocking version of analyze_text for use inside the event loop.
+
+        Results are looked up in the analysis cache first, so unchanged
+        content skips the Ollama round trip entirely.
+        """
+        cache_key = self._cache_key(text)
+        if cache_key is not None:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        text = await self._condense_async(text, title, url)
+        kind, fields, role, prompt = self._route(text, title, url)
+        # The small model classifies while the large one summarises
+        classify = asyncio.create_task(self._classify_async(text, title, url)) if kind == "summary" else None
+        try:
+            response = await self._generate_response_async(prompt, kind, role)
+            analysis, failure = await self._finish(response, None, fields, role, classify, text, title, url)
+        finally:
+            if classify is not None:
+                classify.cancel()
+
+        # Don't pin a fallback analysis (failed call or unparseable answer)
+        if cache_key is not None and failure is None:
+            await self.cache.set(cache_key, self._models_key(), analysis)
+        return analysis
+
+    async def analyze_text_stream(
+        self, text: str, title: str = "", url: str = ""
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Stream an analysis as it is generated.
+
+        Yields ("token", str) for every chunk Ollama produces and finally
+        ("done", analysis). A cache hit yields only the final event. For long
+        pages only the final (reduce) generation is streamed, and with a small
+        model only the call writing the summary. Generation is stopped as soon
+        as the analysis object is complete.
+        """
+        cache_key = self._cache_key(text)
+        if cache_key is not None:
+            cached = await self.cache.get(cache_key)
+            if cached is not None:
+                yield "done", cached
+                return
+
+        text = await self._condense_async(text, title, url)
+        kind, fields, role, prompt = self._route(text, title, url)
+        classify = asyncio.create_task(self._classify_async(text, title, url)) if kind == "summary" else None
+        try:
+            chunks = []
+            parser = JsonObjectParser()
+            async with aclosing(self._stream_response_async(prompt, kind, role)) as tokens:
+                async for token in tokens:
+                    chunks.append(token)
+                    yield "token", token
+                    if parser.feed(token):
+                        # Anything after the object is chatter; closing the stream stops the model
+                        break
+
+            response = "".join(chunks)
+            analysis, failure = await self._finish(response, parser, fields, role, classify, text, title, url)
+        finally:
+            if classify is not None:
+                classify.cancel()
+        if cache_key is not None and failure is None:
+            await self.cache.set(cache_key, self._models_key(), analysis)
+        yield "done", analysis
+
+    def _cache_key(self, text: str) -> Optional[str]:
+        if self.cache is None:
+            return None
+        # Chunking settings change what the model sees, so they are part of the key
+        version = f"{PROMPT_VERSION}:{self.chunk_tokens}:{self.max_chunks}"
+        return AnalysisCache.make_key(self._models_key(), version, text)
+
+    def _models_key(self) -> str:
+        if self.models.cascade:
+            return f"{self.models.get(SMALL).name}+{self.model}:{self.summary_role}"
+        return self.model
+
+    def _route(self, text: str, title: str, url: str) -> Tuple[str, Tuple[str, ...], str, str]:
+        """(kind, fields, role, prompt) of the call that writes the summary.
+
+        Without a small model that is the whole analysis from the large one.
+        With one, the large model writes only summary and insights (while
+        _classify_async runs), unless summary_role hands the whole analysis
+        to the small model, leaving the large one for answers that fail
+        validation.
+        """
+        if not self.models.cascade:
+            return "analysis", ANALYSIS_FIELDS, LARGE, self._create_analysis_prompt(text, title, url)
+        if self.summary_role == SMALL:
+            return "analysis", ANALYSIS_FIELDS, SMALL, self._create_analysis_prompt(text, title, url)
+        return "summary", SUMMARY_FIELDS, LARGE, self._create_summary_prompt(text, title, url)
+
+    async def _finish(
+        self,
+        response: str,
+        parser: Optional[JsonObjectParser],
+        fields: Tuple[str, ...],
+        role: str,
+        classify: Optional[asyncio.Task],
+        text: str,
+        title: str,
+        url: str,
+    ) -> Tuple[Dict, Optional[str]]:
+        """Parse the response of the _route call into the final (analysis, failure).
+
+        Adds the small model's classification, or has the large model redo
+        an analysis the small one got wrong.
+        """
+        analysis, failure = self._parse(response, parser, fields, strict=role == SMALL)
+        if role == SMALL and failure is not None:
+            LLM_ESCALATIONS.inc(reason=failure)
+            response = await self._generate_response_async(self._create_analysis_prompt(text, title, url))
+            return self._parse(response)
+        if classify is not None:
+            classification, classify_failure = await classify
+            return {**analysis, **classification}, failure or classify_failure
+        return analysis, failure
+
+    async def _classify_async(self, text: str, title: str, url: str) -> Tuple[Dict, Optional[str]]:
+        """Category and sentiment from the small model.
+
+        When its answer does not validate against the schema, or names a
+        category or sentiment that does not exist, the large model is asked
+        instead. Returns (classification, failure) like _parse.
+        """
+        prompt = self._create_classification_prompt(text, title, url)
+        response = await self._generate_response_async(prompt, "classify", SMALL)
+        classification, failure = self._parse(response, fields=CLASSIFICATION_FIELDS, strict=True)
+        if failure is None:
+            return classification, None
+        LLM_ESCALATIONS.inc(reason=failure)
+        response = await self._generate_response_async(prompt, "classify", LARGE)
+        return self._parse(response, fields=CLASSIFICATION_FIELDS)
+
+    def _chunk(self, text: str) -> List[str]:
+        """Split text into token-budgeted chunks, at most max_chunks of them.
+
+        Pages with more chunks than that are sampled at evenly spaced chunks
+        so the whole document is represented while latency stays bounded.
+        """
+        chunks = split_markdown(text, self.chunk_tokens)
+        if self.max_chunks > 0 and len(chunks) > self.max_chunks:
+            step = len(chunks) / self.max_chunks
+            chunks = [chunks[int(i * step)] for i in range(self.max_chunks)]
+        return chunks
+
+    async def _condense_async(self, text: str, title: str, url: str) -> str:
+        """Map step: summarise each chunk concurrently; short pages pass through"""
+        # Tokenising a large page is CPU work; keep it off the event loop
+        chunks = await asyncio.to_thread(self._chunk, text)
+        if len(chunks) <= 1:
+            return chunks[0] if chunks else ""
+
+        limit = asyncio.Semaphore(max(1, self.chunk_parallel))
+
+        async def summarise(index: int, chunk: str) -> str:
+            async with limit:
+                prompt = self._create_chunk_prompt(chunk, title, url, index, len(chunks))
+                return await self._generate_response_async(prompt, "chunk")
+
+        summaries = await asyncio.gather(*(summarise(i, chunk) for i, chunk in enumerate(chunks)))
+        return await asyncio.to_thread(self._combine_summaries, summaries)
+
+    def _combine_summaries(self, summaries: List[str]) -> str:
+        """Join chunk summaries into the text used by the reduce prompt"""
+        parts = [
+            f"Section {i} summary: {summary.strip()}"
+            for i, summary in enumerate(summaries, start=1)
+            if summary and summary.strip()
+        ]
+        combined = "\n\n".join(parts)
+        # The reduce prompt must fit the same budget as a single chunk
+        if count_tokens(combined) > self.chunk_tokens:
+            combined = split_markdown(combined, self.chunk_tokens)[0]
+        return combined
+
+    def _create_chunk_prompt(self, text: str, title: str, url: str, index: int, total: int) -> str:
+        """Create a prompt asking for a plain-text summary of one chunk"""
+        return f"""
+        You are summarising part {index + 1} of {total} of a web page.
+
+        URL: {url}
+        TITLE: {title}
+
+        CONTENT:
+        {text}
+
+        Summarise this part in at most 100 words. Mention its main topic, the
+        tone of the writing and any notable facts, claims or recommendations.
+        Return only the summary text.
+        """
     
     def _create_analysis_prompt(self, text: str, title: str, url: str) -> str:
         """Create a prompt for the LLM to analyze the text"""
@@ -45,7 +334,7 @@ class OllamaAnalyzer:
         Return ONLY valid JSON with these fields: summary (string), category (string), sentiment(string), insights (array of strings)
 
         Example output:
-       {
+       {{
         "summary": "Crawl4AI Documentation provides information on setting up and using the Crawl4AI platform for web crawling, including installation, quick start, blog, and advanced features.",
         "category": "technology",
         "sentiment": "neutral",
@@ -54,22 +343,90 @@ class OllamaAnalyzer:
             "The blog section offers valuable insights and updates on the latest developments in web crawling technology.",
             "The quick start guide is a useful resource for those looking to get started with Crawl4AI quickly."
         ]
-       }
+       }}
+        """
+
+    def _create_classification_prompt(self, text: str, title: str, url: str) -> str:
+        """Create a prompt for the small model: category and sentiment only"""
+        return f"""
+        Classify the following web page.
+
+        URL: {url}
+        TITLE: {title}
+
+        CONTENT:
+        {text}
+
+        Return ONLY valid JSON with these fields:
+        category (one of: technology, business, health, politics, science, entertainment, sports, education, finance, cybersecurity, other)
+        sentiment (one of: positive, neutral, negative)
+        """
+
+    def _create_summary_prompt(self, text: str, title: str, url: str) -> str:
+        """Create a prompt for the large model when the small one has classified the page"""
+        return f"""
+        You are an expert content analyzer. Analyze the following web page content:
+
+        URL: {url}
+        TITLE: {title}
+
+        CONTENT:
+        {text}
+
+        Return ONLY valid JSON with these fields:
+        summary (string): a concise summary, max 150 words
+        insights (array of strings): three key insights or recommendations based on this content
         """
     
-    def _generate_response(self, prompt: str) -> str:
+    def _payload(self, prompt: str, stream: bool, kind: str, model: Optional[str] = None) -> Dict:
+        """Body of a /generate request; structured prompts get the output format"""
+        payload = {"model": model or self.model, "prompt": prompt, "stream": stream}
+        output_format = self._format_for(kind)
+        if output_format is not None:
+            payload["format"] = output_format
+        return payload
+
+    def _format_for(self, kind: str) -> Union[Dict, str, None]:
+        # Chunk summaries are plain text
+        if kind not in SCHEMAS or self.output_format == "none":
+            return None
+        return SCHEMAS[kind] if self.output_format == "schema" else "json"
+
+    def _format_rejected(self, status_code: int) -> bool:
+        """Ollama before 0.5 answers 400 to a schema format; fall back to plain JSON mode"""
+        if status_code != 400 or self.output_format != "schema":
+            return False
+        print("Ollama rejected the JSON schema format, falling back to format=json")
+        self.output_format = "json"
+        return True
+
+    def _record_prompt(self, prompt: str, kind: str):
+        LLM_PROMPT_TOKENS.observe(count_tokens(prompt), kind=kind)
+
+    def _record_generation(self, body: Dict, spec: Optional[ModelSpec] = None, seconds: float = 0.0):
+        """Token counters from the final Ollama response object"""
+        if spec is not None:
+            spec.record(seconds, body)
+        eval_count = body.get("eval_count") or 0
+        eval_duration = body.get("eval_duration") or 0
+        LLM_GENERATED_TOKENS.inc(eval_count)
+        if eval_count and eval_duration:
+            # eval_duration is in nanoseconds
+            LLM_TOKENS_PER_SECOND.observe(eval_count / (eval_duration / 1e9))
+
+    def _generate_response(self, prompt: str, kind: str = "analysis") -> str:
         """Make an API call to Ollama"""
+        self._record_prompt(prompt, kind)
         try:
-            response = requests.post(
-                f"{self.base_url}/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False
-                },
-                timeout=60
-            )
-            response.raise_for_status()
+            with timed("llm_generate", kind=kind):
+                response = requests.post(f"{self.base_url}/generate", json=self._payload(prompt, False, kind), timeout=60)
+                if self._format_rejected(response.status_code):
+                    response = requests.post(
+                        f"{self.base_url}/generate", json=self._payload(prompt, False, kind), timeout=60
+                    )
+                response.raise_for_status()
+            LLM_REQUESTS.inc(outcome="ok")
+            self._record_generation(response.json())
 
             print("\n--- RAW LLM RESPONSE ---")
             print(response.json().get("response", ""))
@@ -78,81 +435,134 @@ class OllamaAnalyzer:
             return response.json().get("response", "")
         except (requests.RequestException, json.JSONDecodeError) as e:
             print(f"Error calling Ollama API: {e}")
+            LLM_REQUESTS.inc(outcome="error")
             return ""
+
+    async def _generate_response_async(self, prompt: str, kind: str = "analysis", role: str = LARGE) -> str:
+        """Make an API call to the model in role over the pooled client, retrying with backoff"""
+        if self._client is None:
+            await self.start()
+        self._record_prompt(prompt, kind)
+
+        spec = self.models.get(role)
+        for attempt in range(self.max_retries + 1):
+            # The slot is only held while talking to Ollama, not during the backoff
+            async with spec.slot():
+                started = time.perf_counter()
+                try:
+                    with timed("llm_generate", kind=kind, model=spec.name):
+                        payload = self._payload(prompt, False, kind, spec.name)
+                        response = await self._client.post("/generate", json=payload)
+                        if self._format_rejected(response.status_code):
+                            payload = self._payload(prompt, False, kind, spec.name)
+                            response = await self._client.post("/generate", json=payload)
+                        response.raise_for_status()
+                        body = response.json()
+                    LLM_REQUESTS.inc(outcome="ok")
+                    self._record_generation(body, spec, time.perf_counter() - started)
+                    return body.get("response", "")
+                except (httpx.HTTPError, json.JSONDecodeError) as e:
+                    spec.record(time.perf_counter() - started, None)
+                    if not self._should_retry(e) or attempt == self.max_retries:
+                        print(f"Error calling Ollama API: {e}")
+                        LLM_REQUESTS.inc(outcome="error")
+                        return ""
+                    # Exponential backoff with jitter: ~0.5s, 1s, 2s, ...
+                    delay = 0.5 * (2 ** attempt) * (0.5 + random.random())
+                    print(f"Ollama request failed ({e}), retrying in {delay:.1f}s")
+                    LLM_REQUESTS.inc(outcome="retry")
+            await asyncio.sleep(delay)
+        return ""
+
+    async def _stream_response_async(
+        self, prompt: str, kind: str = "analysis", role: str = LARGE
+    ) -> AsyncIterator[str]:
+        """Call Ollama with "stream": true and yield response tokens as they arrive.
+
+        Failures are retried only until the first token has been yielded;
+        after that the partial response is all the caller gets.
+        """
+        if self._client is None:
+            await self.start()
+        self._record_prompt(prompt, kind)
+
+        spec = self.models.get(role)
+        attempt = 0
+        while True:
+            streamed = 0
+            # The slot is only held while talking to Ollama, not during the backoff
+            async with spec.slot():
+                started = time.perf_counter()
+                try:
+                    async with self._client.stream(
+                        "POST", "/generate", json=self._payload(prompt, True, kind, spec.name)
+                    ) as response:
+                        if self._format_rejected(response.status_code):
+                            # Not a failed attempt: ask again in plain JSON mode
+                            continue
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line:
+                                continue
+                            chunk = json.loads(line)
+                            token = chunk.get("response", "")
+                            if token:
+                                if not streamed:
+                                    record_stage("llm_first_token", started, time.perf_counter() - started)
+                                streamed += 1
+                                yield token
+                            if chunk.get("done"):
+                                # The final chunk carries the token counts
+                                self._record_generation(chunk, spec, time.perf_counter() - started)
+                                break
+                    record_stage("llm_generate", started, time.perf_counter() - started, kind=kind, model=spec.name)
+                    LLM_REQUESTS.inc(outcome="ok")
+                    return
+                except GeneratorExit:
+                    # The caller stopped reading once it had what it needed;
+                    # Ollama sends no counts then, chunks are about one token each
+                    elapsed = time.perf_counter() - started
+                    spec.record(elapsed, {"eval_count": streamed})
+                    record_stage("llm_generate", started, elapsed, kind=kind, model=spec.name)
+                    LLM_REQUESTS.inc(outcome="ok")
+                    raise
+                except (httpx.HTTPError, json.JSONDecodeError) as e:
+                    spec.record(time.perf_counter() - started, None)
+                    if streamed or not self._should_retry(e) or attempt == self.max_retries:
+                        print(f"Error streaming from Ollama API: {e}")
+                        LLM_REQUESTS.inc(outcome="error")
+                        return
+                    delay = 0.5 * (2 ** attempt) * (0.5 + random.random())
+                    print(f"Ollama stream failed ({e}), retrying in {delay:.1f}s")
+                    LLM_REQUESTS.inc(outcome="retry")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _should_retry(self, error: Exception) -> bool:
+        """Retry connection problems, timeouts, 429s and 5xx responses"""
+        if isinstance(error, httpx.HTTPStatusError):
+            status = error.response.status_code
+            return status == 429 or status >= 500
+        return isinstance(error, httpx.TransportError)
     
+    def _parse(
+        self,
+        response: str,
+        parser: Optional[JsonObjectParser] = None,
+        fields: Tuple[str, ...] = ANALYSIS_FIELDS,
+        strict: bool = False,
+    ) -> Tuple[Dict, Optional[str]]:
+        """Parse the LLM response; returns (analysis, failure reason or None)"""
+        analysis, failure = parse_analysis(response, parser, fields, strict)
+        if failure is not None:
+            LLM_PARSE_FAILURES.inc(reason=failure)
+            if failure != "empty":
+                print(f"Could not parse LLM response ({failure}), using best-effort fallback")
+        return analysis, failure
+
     def _parse_analysis(self, response: str) -> Dict:
         """Parse the LLM response into structured data"""
-        try:
-            # Try to extract JSON from the response
-            json_start = response.find("{")
-            json_end = response.rfind("}") + 1
-            
-            if json_start >= 0 and json_end > json_start:
-                json_str = response[json_start:json_end]
-                return json.loads(json_str)
-            
-            # If no valid JSON is found, create a simplified structure
-            return {
-                "summary": self._extract_section(response, "summary"),
-                "category": self._extract_section(response, "category"),
-                "sentiment": self._extract_section(response, "sentiment"),
-                "insights": self._extract_insights(response)
-            }
-        except Exception as e:
-            print(f"Error parsing LLM response: {e}")
-            return {
-                "summary": "Error analyzing content",
-                "category": "other",
-                "sentiment": "neutral",
-                "insights": ["Analysis failed"]
-            }
-    
-    def _extract_section(self, text: str, section_name: str) -> str:
-        """Extract a specific section from text"""
-        lines = text.splitlines()
-        capture = False
-        result = []
-
-        for line in lines:
-            stripped = line.strip()
-            lower = stripped.lower()
-
-            if lower.startswith(section_name.lower()):
-                parts = stripped.split(":", 1)
-                if len(parts) > 1 and parts[1].strip():
-                    return parts[1].strip()  # Inline value found
-                capture = True
-                continue
-
-            if capture:
-                # If we hit a new section, stop capturing
-                if any(lower.startswith(header) for header in ["category", "sentiment", "insight"]):
-                    break
-                if stripped:
-                    result.append(stripped)
-
-        return " ".join(result).strip()
-
-    
-    def _extract_insights(self, text: str) -> list:
-        """Extract insights from text response"""
-        insights = []
-        if "insight" in text.lower() or "recommendation" in text.lower():
-            lines = text.split("\n")
-            for line in lines:
-                line = line.strip()
-                if line and (line.startswith("- ") or line.startswith("* ") or 
-                            any(line.lower().startswith(f"{i}.") for i in range(1, 10))):
-                    insights.append(line.lstrip("- *123456789. "))
-        
-        # If no insights found, try to split by numbers
-        if not insights and "insight" in text.lower():
-            sections = text.lower().split("insight")
-            if len(sections) > 1:
-                for section in sections[1:]:
-                    insights.append(section.strip()[:100])
-        
-        return insights[:3]  # Limit to 3 insights
+        return self._parse(response)[0]
     
 
 # if __name__ == "__main__":
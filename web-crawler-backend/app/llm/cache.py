@@ -0,0 +1,96 @@
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from app.database.db import Database
+
+
+class AnalysisCache:
+    """Two-tier cache of LLM analysis results keyed by content hash.
+
+    The first tier is an in-process LRU; the second is the ``analysis_cache``
+    table so results survive restarts and are shared between processes.
+    Both tiers expire entries after ``ttl`` seconds and are capped in size.
+    """
+
+    def __init__(
+        self,
+        database: Optional[Database] = None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        max_rows: Optional[int] = None,
+    ):
+        self.database = database
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv("ANALYSIS_CACHE_SIZE", "1024"))
+        self.ttl = ttl if ttl is not None else float(os.getenv("ANALYSIS_CACHE_TTL", str(7 * 24 * 3600)))
+        self.max_rows = max_rows if max_rows is not None else int(os.getenv("ANALYSIS_CACHE_MAX_ROWS", "100000"))
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._writes = 0
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, prompt_version: str, content: str) -> str:
+        """Hash of everything that determines the analysis of a piece of content"""
+        digest = hashlib.sha256()
+        digest.update(f"{model}\0{prompt_version}\0".encode("utf-8"))
+        digest.update(content.encode("utf-8"))
+        return digest.hexdigest()
+
+    async def get(self, key: str) -> Optional[Dict]:
+        """Return the cached analysis for ``key``, or None on a miss"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, analysis = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return analysis
+            del self._entries[key]
+
+        if self.database is not None:
+            try:
+                analysis = await self.database.get_cached_analysis(key, self.ttl)
+            except Exception as e:
+                print(f"Analysis cache lookup failed: {e}")
+                analysis = None
+            if analysis is not None:
+                self._remember(key, analysis)
+                self.db_hits += 1
+                return analysis
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, model: str, analysis: Dict):
+        """Store an analysis in both tiers"""
+        self._remember(key, analysis)
+        if self.database is None:
+            return
+        try:
+            await self.database.store_cached_analysis(key, model, analysis)
+            self._writes += 1
+            # Pruning scans the table, so only do it every so often
+            if self._writes % 100 == 0:
+                await self.database.prune_analysis_cache(self.max_rows, self.ttl)
+        except Exception as e:
+            print(f"Analysis cache write failed: {e}")
+
+    def _remember(self, key: str, analysis: Dict):
+        self._entries[key] = (time.monotonic() + self.ttl, analysis)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict:
+        lookups = self.memory_hits + self.db_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "hit_rate": (self.memory_hits + self.db_hits) / lookups if lookups else 0.0,
+            "memory_entries": len(self._entries),
+        }
@@ -0,0 +1,119 @@
+import re
+import threading
+from typing import List
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+# Markdown headings start a new section
+_HEADING = re.compile(r"^#{1,6}\s", re.MULTILINE)
+
+
+def load_encoding(timeout: float = 10.0):
+    """Load the tiktoken encoding once; None if tiktoken or its data is unavailable.
+
+    The first load may download the BPE file, which tiktoken does without a
+    timeout, so it runs on a helper thread and is given up after ``timeout``
+    seconds; token counts are then estimated for the rest of the process.
+    This blocks, so async code calls it through asyncio.to_thread.
+    """
+    global _encoding, _encoding_loaded
+    with _encoding_lock:
+        if _encoding_loaded:
+            return _encoding
+        result = {}
+
+        def load():
+            try:
+                import tiktoken
+                result["encoding"] = tiktoken.get_encoding("cl100k_base")
+            except Exception as e:
+                result["error"] = e
+
+        loader = threading.Thread(target=load, name="tiktoken-load", daemon=True)
+        loader.start()
+        loader.join(timeout)
+        _encoding = result.get("encoding")
+        _encoding_loaded = True
+        if _encoding is None:
+            reason = result.get("error") or f"loading took longer than {timeout:g} seconds"
+            print(f"tiktoken unavailable, estimating token counts: {reason}")
+        return _encoding
+
+
+def _get_encoding():
+    return _encoding if _encoding_loaded else load_encoding()
+
+
+def count_tokens(text: str) -> int:
+    """Approximate number of LLM tokens in text.
+
+    cl100k_base is not LLaMA's tokenizer, but it is close enough to budget
+    prompts; without it we fall back to ~4 characters per token.
+    """
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def _split_hard(text: str, max_tokens: int) -> List[str]:
+    """Split text that has no usable structure into max_tokens pieces"""
+    encoding = _get_encoding()
+    if encoding is None:
+        step = max_tokens * 4
+        return [text[i:i + step] for i in range(0, len(text), step)]
+    tokens = encoding.encode(text, disallowed_special=())
+    return [encoding.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+
+def _blocks(text: str, max_tokens: int) -> List[str]:
+    """Break markdown into the largest structural blocks that fit max_tokens:
+    sections, then paragraphs, then lines, then raw token windows."""
+    blocks = []
+    starts = [m.start() for m in _HEADING.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    sections = [text[a:b] for a, b in zip(starts, starts[1:] + [len(text)])]
+
+    for section in sections:
+        if count_tokens(section) <= max_tokens:
+            blocks.append(section)
+            continue
+        for paragraph in re.split(r"\n\s*\n", section):
+            if count_tokens(paragraph) <= max_tokens:
+                blocks.append(paragraph + "\n\n")
+                continue
+            for line in paragraph.splitlines():
+                if count_tokens(line) <= max_tokens:
+                    blocks.append(line + "\n")
+                else:
+                    blocks.extend(_split_hard(line, max_tokens))
+    return blocks
+
+
+def split_markdown(text: str, max_tokens: int) -> List[str]:
+    """Split markdown into chunks of at most max_tokens, along its structure.
+
+    Consecutive blocks are packed greedily so chunks stay close to the
+    budget without cutting through a heading, paragraph or line if possible.
+    """
+    text = text.strip()
+    if not text:
+        return []
+    if count_tokens(text) <= max_tokens:
+        return [text]
+
+    chunks = []
+    current, current_tokens = [], 0
+    for block in _blocks(text, max_tokens):
+        block_tokens = count_tokens(block)
+        if current and current_tokens + block_tokens > max_tokens:
+            chunks.append("".join(current).strip())
+            current, current_tokens = [], 0
+        current.append(block)
+        current_tokens += block_tokens
+    if current:
+        chunks.append("".join(current).strip())
+    return [chunk for chunk in chunks if chunk]
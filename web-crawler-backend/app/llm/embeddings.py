@@ -0,0 +1,255 @@
+import asyncio
+import json
+import os
+import random
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+
+from app.database.db import Database, SearchResult
+from app.monitoring.metrics import timed
+
+
+def embedding_text(page: Dict) -> str:
+    """The text a page is embedded from: title, LLM summary, start of the content"""
+    parts = [page.get("title") or "", page.get("summary") or "", page.get("content") or ""]
+    return "\n\n".join(part for part in parts if part)
+
+
+def to_literal(vector: np.ndarray) -> str:
+    """pgvector text representation of a vector"""
+    return "[" + ",".join(map(repr, vector.tolist())) + "]"
+
+
+class OllamaEmbedder:
+    """Batched text embeddings from Ollama's /api/embed endpoint.
+
+    Vectors come back as unit-length float32 rows, so cosine similarity
+    is a plain dot product.
+    """
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        base_url: Optional[str] = None,
+        batch_size: Optional[int] = None,
+        max_chars: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        timeout: float = 60.0,
+    ):
+        self.model = model or os.getenv("EMBEDDING_MODEL", "nomic-embed-text")
+        self.base_url = base_url or os.getenv("OLLAMA_BASE_URL", "http://localhost:11434/api")
+        self.batch_size = batch_size if batch_size is not None else int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+        # Embedding models have short context windows; longer text is cut off
+        self.max_chars = max_chars if max_chars is not None else int(os.getenv("EMBEDDING_MAX_CHARS", "8000"))
+        self.max_retries = max_retries if max_retries is not None else int(os.getenv("OLLAMA_MAX_RETRIES", "3"))
+        self.timeout = timeout
+        self._client: Optional[httpx.AsyncClient] = None
+
+    async def start(self):
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=httpx.Timeout(self.timeout, connect=10.0)
+            )
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """Embed texts, batch_size per request. Returns an (n, dim) float32 array.
+
+        Raises httpx.HTTPError once retries are exhausted.
+        """
+        await self.start()
+        batches = []
+        for start in range(0, len(texts), max(1, self.batch_size)):
+            batch = [text[:self.max_chars] for text in texts[start:start + self.batch_size]]
+            batches.append(await self._embed_batch(batch))
+        if not batches:
+            return np.empty((0, 0), dtype=np.float32)
+
+        vectors = np.vstack(batches).astype(np.float32, copy=False)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    async def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = await self._client.post(
+                    "/embed",
+                    json={"model": self.model, "input": texts, "truncate": True}
+                )
+                response.raise_for_status()
+                embeddings = response.json()["embeddings"]
+                if len(embeddings) != len(texts):
+                    raise ValueError(f"expected {len(texts)} embeddings, got {len(embeddings)}")
+                return np.asarray(embeddings, dtype=np.float32)
+            except (httpx.HTTPError, json.JSONDecodeError, KeyError) as e:
+                retryable = isinstance(e, httpx.TransportError) or (
+                    isinstance(e, httpx.HTTPStatusError)
+                    and (e.response.status_code == 429 or e.response.status_code >= 500)
+                )
+                if not retryable or attempt == self.max_retries:
+                    raise
+                delay = 0.5 * (2 ** attempt) * (0.5 + random.random())
+                print(f"Ollama embed request failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+
+class VectorIndex:
+    """Exact nearest-neighbour search over unit vectors in one NumPy matrix.
+
+    A query is a single matrix-vector product, which stays fast up to a
+    few hundred thousand vectors (1M 768-d vectors take ~3 GB of memory);
+    beyond that use pgvector.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._matrix = np.empty((1024, dim), dtype=np.float32)
+        self._ids = np.empty(1024, dtype=np.int64)
+        self._rows: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def add(self, page_ids: List[int], vectors: np.ndarray):
+        """Insert or replace the vectors of pages"""
+        for page_id, vector in zip(page_ids, vectors):
+            row = self._rows.get(page_id)
+            if row is None:
+                row = len(self._rows)
+                if row == len(self._ids):
+                    self._matrix = np.resize(self._matrix, (2 * row, self.dim))
+                    self._ids = np.resize(self._ids, 2 * row)
+                self._rows[page_id] = row
+                self._ids[row] = page_id
+            self._matrix[row] = vector
+
+    def search(self, vector: np.ndarray, limit: int, exclude_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """(page id, cosine similarity) of the closest vectors, best first"""
+        size = len(self._rows)
+        if size == 0 or limit <= 0:
+            return []
+        scores = self._matrix[:size] @ vector.astype(np.float32, copy=False)
+        if exclude_id in self._rows:
+            scores[self._rows[exclude_id]] = -np.inf
+            size -= 1
+        limit = min(limit, size)
+        if limit <= 0:
+            return []
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        top = top[np.argsort(-scores[top])]
+        return [(int(self._ids[row]), float(scores[row])) for row in top]
+
+
+class SemanticIndex:
+    """Page embeddings plus the index used for similarity queries.
+
+    Vectors are always stored in page_embeddings as float32 bytes. If the
+    pgvector extension is available they are also written to its column
+    and queried through an HNSW index; otherwise they are loaded into an
+    in-process VectorIndex. Set VECTOR_INDEX=numpy to skip pgvector.
+    """
+
+    def __init__(self, database: Database, embedder: OllamaEmbedder, backend: Optional[str] = None):
+        self.database = database
+        self.embedder = embedder
+        self.backend = backend or os.getenv("VECTOR_INDEX", "auto")
+        self.dim: Optional[int] = None
+        self.use_pgvector = False
+        self.index: Optional[VectorIndex] = None
+        self._setup_lock = asyncio.Lock()
+
+    async def load(self):
+        """Set up the index for the vectors already stored for the model"""
+        dim = await self.database.get_embedding_dim(self.embedder.model)
+        if dim:
+            await self._setup(dim)
+
+    async def _setup(self, dim: int):
+        # The vector size is only known once the model has produced a vector
+        async with self._setup_lock:
+            if self.dim == dim:
+                return
+            model = self.embedder.model
+            if self.backend == "auto" and await self.database.enable_pgvector(dim):
+                ids, literals = [], []
+                async for page_id, blob in self.database.iter_embeddings(model, missing_vector=True):
+                    ids.append(page_id)
+                    literals.append(to_literal(np.frombuffer(blob, dtype="<f4")))
+                for start in range(0, len(ids), 1000):
+                    await self.database.set_embedding_vectors(ids[start:start + 1000], literals[start:start + 1000])
+                self.use_pgvector, self.index = True, None
+            else:
+                index = VectorIndex(dim)
+                async for page_id, blob in self.database.iter_embeddings(model):
+                    index.add([page_id], np.frombuffer(blob, dtype="<f4")[None, :])
+                self.use_pgvector, self.index = False, index
+            self.dim = dim
+
+    async def embed_pages(self, page_ids: List[int]) -> int:
+        """Embed and store stored pages in batches. Returns how many were embedded."""
+        pages = await self.database.get_embedding_inputs(list(dict.fromkeys(page_ids)), self.embedder.max_chars)
+        pages = [page for page in pages if page.get("title") or page.get("content")]
+        if not pages:
+            return 0
+
+        with timed("embedding", pages=len(pages)):
+            vectors = await self.embedder.embed([embedding_text(page) for page in pages])
+        dim = vectors.shape[1]
+        if self.dim != dim:
+            await self._setup(dim)
+
+        ids = [page["id"] for page in pages]
+        literals = [to_literal(vector) for vector in vectors] if self.use_pgvector else None
+        await self.database.store_embeddings(
+            self.embedder.model, dim, ids, [vector.astype("<f4").tobytes() for vector in vectors], literals
+        )
+        if self.index is not None:
+            self.index.add(ids, vectors)
+        return len(ids)
+
+    async def similar(self, page_id: int, limit: int = 10) -> Optional[List[SearchResult]]:
+        """Pages most similar to a stored page, or None if the page does not exist.
+
+        Empty for a page with nothing to embed.
+        """
+        blob = await self.database.get_embedding(page_id, self.embedder.model)
+        if blob is None:
+            # Not embedded yet (e.g. crawled before embeddings were enabled)
+            if not await self.embed_pages([page_id]):
+                if await self.database.get_page(page_id, with_body=False) is None:
+                    return None
+                return []
+            blob = await self.database.get_embedding(page_id, self.embedder.model)
+        return await self._nearest(np.frombuffer(blob, dtype="<f4"), limit, page_id)
+
+    async def search(self, query: str, limit: int = 10) -> List[SearchResult]:
+        """Pages whose embedding is closest to that of a free-text query"""
+        vectors = await self.embedder.embed([query])
+        if self.dim != vectors.shape[1]:
+            # Nothing is indexed with this model yet
+            return []
+        return await self._nearest(vectors[0], limit)
+
+    async def _nearest(self, vector: np.ndarray, limit: int, exclude_id: Optional[int] = None) -> List[SearchResult]:
+        if self.use_pgvector:
+            hits = await self.database.nearest_embeddings(self.embedder.model, to_literal(vector), limit, exclude_id)
+        elif self.index is not None:
+            hits = self.index.search(vector, limit, exclude_id)
+        else:
+            hits = []
+
+        pages = await self.database.get_search_results([page_id for page_id, _ in hits])
+        results = []
+        for page_id, score in hits:
+            page = pages.get(page_id)
+            if page is not None:
+                page.rank = float(score)
+                results.append(page)
+        return results
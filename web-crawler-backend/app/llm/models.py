@@ -0,0 +1,182 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from app.monitoring.metrics import LLM_MODEL_COST, LLM_MODEL_SECONDS, LLM_MODEL_TOKENS, record_stage
+
+# Roles a model can have in the analysis
+SMALL = "small"   # classifies category and sentiment
+LARGE = "large"   # writes summary and insights; does everything when there is no small model
+
+# Analysis priorities; lower values get LLM slots first
+INTERACTIVE = 0
+CRAWL = 1
+BULK = 2
+
+# Priority of the analysis running in the current task, set by the
+# AnalysisScheduler; requests made outside it count as CRAWL
+llm_priority: ContextVar[int] = ContextVar("llm_priority", default=CRAWL)
+
+# LLM work done for the analysis running in the current task: requests,
+# generated tokens and seconds spent waiting for a slot or generating.
+# The AnalysisScheduler sets a fresh dict per page; elsewhere it is None.
+llm_usage: ContextVar[Optional[Dict[str, float]]] = ContextVar("llm_usage", default=None)
+
+
+def new_usage() -> Dict[str, float]:
+    return {"requests": 0, "generated_tokens": 0, "seconds": 0.0}
+
+
+class PrioritySemaphore:
+    """Semaphore that hands a freed slot to the waiter with the lowest
+    priority value, first come first served within a priority"""
+
+    def __init__(self, value: int):
+        self._free = value
+        # Heap of (priority, sequence, future)
+        self._waiters: List[tuple] = []
+        self._sequence = itertools.count()
+
+    async def acquire(self, priority: int):
+        # Freed slots go straight to live waiters, so free ones mean nobody waits
+        if self._free > 0:
+            self._free -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the waiter was cancelled
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self._free += 1
+
+
+class ModelSpec:
+    """An Ollama model with its own concurrency limit and usage counters"""
+
+    def __init__(self, name: str, parallel: int = 1, cost: float = 0.0):
+        self.name = name
+        self.parallel = max(1, parallel)
+        # Price of 1000 prompt + generated tokens, in whatever unit is useful
+        # (money, or CPU seconds on a shared host)
+        self.cost = cost
+        self.counts = {
+            "requests": 0, "errors": 0, "seconds": 0.0, "prompt_tokens": 0, "generated_tokens": 0, "cost": 0.0
+        }
+        self._slots = PrioritySemaphore(self.parallel)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the model's ``parallel`` request slots.
+
+        Waiting requests get slots in llm_priority order, so an interactive
+        analysis overtakes the chunk calls of bulk pages already dispatched.
+        """
+        queued = time.perf_counter()
+        await self._slots.acquire(llm_priority.get())
+        try:
+            waited = time.perf_counter() - queued
+            record_stage("llm_queue", queued, waited, model=self.name)
+            usage = llm_usage.get()
+            if usage is not None:
+                usage["seconds"] += waited
+            yield
+        finally:
+            self._slots.release()
+
+    def record(self, seconds: float, body: Optional[Dict]):
+        """Count one request; body is Ollama's final response object, None if it failed"""
+        self.counts["requests"] += 1
+        self.counts["seconds"] += seconds
+        LLM_MODEL_SECONDS.observe(seconds, model=self.name)
+        usage = llm_usage.get()
+        if usage is not None:
+            usage["requests"] += 1
+            usage["seconds"] += seconds
+        if body is None:
+            self.counts["errors"] += 1
+            return
+        prompt_tokens = body.get("prompt_eval_count") or 0
+        generated_tokens = body.get("eval_count") or 0
+        if usage is not None:
+            usage["generated_tokens"] += generated_tokens
+        cost = (prompt_tokens + generated_tokens) / 1000 * self.cost
+        self.counts["prompt_tokens"] += prompt_tokens
+        self.counts["generated_tokens"] += generated_tokens
+        self.counts["cost"] += cost
+        LLM_MODEL_TOKENS.inc(prompt_tokens, model=self.name, kind="prompt")
+        LLM_MODEL_TOKENS.inc(generated_tokens, model=self.name, kind="generated")
+        LLM_MODEL_COST.inc(cost, model=self.name)
+
+    def stats(self) -> Dict:
+        requests = self.counts["requests"]
+        return {
+            "model": self.name,
+            "parallel": self.parallel,
+            "cost_per_1k_tokens": self.cost,
+            **self.counts,
+            "mean_seconds": self.counts["seconds"] / requests if requests else None
+        }
+
+
+class ModelRegistry:
+    """The models the analyzer routes to, by role (SMALL, LARGE).
+
+    Configured with OLLAMA_MODELS, a JSON object mapping roles to a model
+    name or to {"model", "parallel", "cost"}, e.g.
+    ``{"small": {"model": "qwen2.5:0.5b", "parallel": 2}, "large": "llama2"}``.
+    The large model defaults to the analyzer's own model and parallelism.
+    """
+
+    def __init__(self, models: Dict[str, ModelSpec]):
+        if LARGE not in models:
+            raise ValueError("The model registry needs a large model")
+        self.models = models
+
+    @classmethod
+    def from_env(cls, default_model: str, default_parallel: int) -> "ModelRegistry":
+        raw = os.getenv("OLLAMA_MODELS")
+        config = json.loads(raw) if raw else {}
+        models = {}
+        for role, spec in config.items():
+            if role not in (SMALL, LARGE):
+                raise ValueError(f"Unknown model role in OLLAMA_MODELS: {role}")
+            if isinstance(spec, str):
+                spec = {"model": spec}
+            models[role] = ModelSpec(
+                spec["model"], int(spec.get("parallel", default_parallel)), float(spec.get("cost", 0.0))
+            )
+        models.setdefault(LARGE, ModelSpec(default_model, default_parallel))
+        return cls(models)
+
+    @property
+    def cascade(self) -> bool:
+        """Whether a small model classifies pages before the large one"""
+        return SMALL in self.models
+
+    @property
+    def parallel(self) -> int:
+        """Requests that can be in flight across all models"""
+        return sum(spec.parallel for spec in self.models.values())
+
+    def get(self, role: str) -> ModelSpec:
+        return self.models[role]
+
+    def stats(self) -> Dict[str, Dict]:
+        return {role: spec.stats() for role, spec in self.models.items()}
@@ -0,0 +1,293 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+CATEGORIES = (
+    "technology", "business", "health", "politics", "science", "entertainment",
+    "sports", "education", "finance", "cybersecurity", "other"
+)
+SENTIMENTS = ("positive", "neutral", "negative")
+
+# JSON schema of an analysis; also sent to Ollama as the "format" so the
+# model's output is constrained to it
+ANALYSIS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "category": {"type": "string", "enum": list(CATEGORIES)},
+        "sentiment": {"type": "string", "enum": list(SENTIMENTS)},
+        "insights": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["summary", "category", "sentiment", "insights"],
+}
+ANALYSIS_FIELDS = tuple(ANALYSIS_SCHEMA["required"])
+# What each model writes when the analysis is split between a small and a large one
+CLASSIFICATION_FIELDS = ("category", "sentiment")
+SUMMARY_FIELDS = ("summary", "insights")
+
+
+def schema_for(fields: Tuple[str, ...]) -> Dict:
+    """ANALYSIS_SCHEMA restricted to some of its fields"""
+    return {
+        "type": "object",
+        "properties": {name: ANALYSIS_SCHEMA["properties"][name] for name in fields},
+        "required": list(fields),
+    }
+
+
+CLASSIFICATION_SCHEMA = schema_for(CLASSIFICATION_FIELDS)
+SUMMARY_SCHEMA = schema_for(SUMMARY_FIELDS)
+
+# The only characters that change the scanner's state
+_STRUCTURAL = re.compile(r'[{}"\\]')
+# "Summary:", "**Key insights**", "## Category: technology", ...
+_HEADER = re.compile(
+    r"^[#*\s]*(?:key\s+)?(summary|category|sentiment|insights?|recommendations?)\b[*\s]*:?[*\s]*(.*)$",
+    re.IGNORECASE
+)
+# "- item", "* item", "• item", "1. item", "2) item"
+_BULLET = re.compile(r"^(?:[-*•]|\d+[.)])\s+(.+)$")
+
+
+class JsonObjectParser:
+    """Finds the first balanced JSON object in text that arrives in pieces.
+
+    feed() each chunk as it is streamed; it returns True once the object is
+    complete, after which the rest of the response can be ignored. Only
+    braces, quotes and backslashes are looked at, and only the text from
+    the current candidate ``{`` on is kept. A candidate that closes but is
+    not valid JSON (``{like this}`` in the prose before the answer) is
+    counted in ``rejected`` and scanning resumes after its opening brace,
+    so a stray ``{`` cannot swallow the real object; one that never closes
+    is retried the same way by result().
+    """
+
+    def __init__(self):
+        self.text: Optional[str] = None
+        self.value: Any = None
+        self.rejected = 0
+        self._parts: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        # A candidate was still open when the response ended
+        self._unclosed = False
+
+    @property
+    def done(self) -> bool:
+        return self.text is not None
+
+    @property
+    def started(self) -> bool:
+        return self._depth > 0 or self.text is not None or self._unclosed
+
+    def feed(self, chunk: str) -> bool:
+        if self.text is not None:
+            return True
+        while chunk is not None:
+            chunk = self._scan(chunk)
+        return self.text is not None
+
+    def _reset(self) -> str:
+        """Drop the current candidate; returns its text after the opening brace"""
+        text = "".join(self._parts)[1:]
+        self._parts, self._depth, self._in_string, self._escape = [], 0, False, False
+        return text
+
+    def _scan(self, chunk: str) -> Optional[str]:
+        """Scan one piece of text; returns text still to be scanned after a rejected candidate"""
+        start, skip_to = 0, 0
+        if self._escape:
+            # The previous chunk ended with a backslash inside a string
+            self._escape, skip_to = False, 1
+
+        for match in _STRUCTURAL.finditer(chunk, skip_to):
+            i = match.start()
+            if i < skip_to:
+                continue
+            char = chunk[i]
+            if self._in_string:
+                if char == "\\":
+                    if i + 1 < len(chunk):
+                        skip_to = i + 2
+                    else:
+                        self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if self._depth == 0:
+                # Prose before the object
+                if char != "{":
+                    continue
+                start = i
+            if char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    self._parts.append(chunk[start:i + 1])
+                    text = "".join(self._parts)
+                    try:
+                        self.value = json.loads(text)
+                    except json.JSONDecodeError:
+                        self.rejected += 1
+                        return self._reset() + chunk[i + 1:]
+                    self._parts = []
+                    self.text = text
+                    return None
+
+        if self._depth > 0:
+            self._parts.append(chunk[start:])
+        return None
+
+    def result(self) -> Optional[Any]:
+        """The decoded object, or None if no valid one was completed.
+
+        A candidate still open at the end of the response may have started
+        at a stray brace; the text after it is searched again.
+        """
+        while self.text is None and self._depth > 0:
+            self._unclosed = True
+            self.feed(self._reset())
+        return self.value
+
+
+def _choice(value: Any, allowed: Tuple[str, ...], default: str) -> str:
+    value = str(value or "").strip().lower()
+    return value if value in allowed else default
+
+
+def _insights(value: Any) -> Optional[List[str]]:
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list):
+        return None
+    return [str(item).strip() for item in value if str(item).strip()]
+
+
+def validate_analysis(data: Any, fields: Tuple[str, ...] = ANALYSIS_FIELDS, strict: bool = False) -> Dict:
+    """Check a decoded analysis (or the given fields of one) against
+    ANALYSIS_SCHEMA and normalise it.
+
+    Category and sentiment are matched case-insensitively and replaced by
+    "other"/"neutral" when the model made one up, unless strict is set.
+    Raises ValueError when a field is missing or has the wrong type, or
+    with strict, when category or sentiment is not one of the allowed values
+    or the summary is empty.
+    """
+    if not isinstance(data, dict):
+        raise ValueError("analysis is not a JSON object")
+    problems = [name for name in fields if name not in data]
+    if "summary" in fields and not isinstance(data.get("summary", ""), str):
+        problems.append("summary is not a string")
+    insights = _insights(data.get("insights", [])) if "insights" in fields else []
+    if insights is None:
+        problems.append("insights is not a list")
+    if strict:
+        if "summary" in fields and isinstance(data.get("summary"), str) and not data["summary"].strip():
+            problems.append("summary is empty")
+        for name, allowed in (("category", CATEGORIES), ("sentiment", SENTIMENTS)):
+            if name in fields and name in data and str(data[name] or "").strip().lower() not in allowed:
+                problems.append(f"{name} {data[name]!r} is not allowed")
+    if problems:
+        raise ValueError(f"invalid analysis: {', '.join(problems)}")
+    analysis = {
+        "summary": data["summary"].strip() if "summary" in fields else "",
+        "category": _choice(data["category"], CATEGORIES, "other") if "category" in fields else "other",
+        "sentiment": _choice(data["sentiment"], SENTIMENTS, "neutral") if "sentiment" in fields else "neutral",
+        "insights": insights,
+    }
+    return {name: analysis[name] for name in fields}
+
+
+def parse_sections(text: str) -> Dict:
+    """Best-effort analysis from a free-text answer, in a single pass over its lines.
+
+    Understands "Summary: ..." style headers (value inline or on the lines
+    below) and takes insights from bullet or numbered lines.
+    """
+    sections: Dict[str, List[str]] = {"summary": [], "category": [], "sentiment": [], "insights": []}
+    bullets: List[str] = []
+    current = None
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        bullet = _BULLET.match(line)
+        if bullet:
+            item = bullet.group(1).strip(" *")
+            bullets.append(item)
+            if current == "insights":
+                sections["insights"].append(item)
+            continue
+        header = _HEADER.match(line)
+        if header:
+            name = header.group(1).lower()
+            if name.startswith(("insight", "recommendation")):
+                name = "insights"
+            value = header.group(2).strip(" *")
+            if value:
+                sections[name].append(value)
+            # An inline value completes the section, except for insights
+            current = name if name == "insights" or not value else None
+            continue
+        if current:
+            sections[current].append(line)
+
+    insights = sections["insights"]
+    if not insights and re.search(r"insight|recommendation", text, re.IGNORECASE):
+        insights = bullets
+    return {
+        "summary": " ".join(sections["summary"]),
+        "category": _choice(" ".join(sections["category"]).split(" ")[0].strip(".,"), CATEGORIES, "other"),
+        "sentiment": _choice(" ".join(sections["sentiment"]).split(" ")[0].strip(".,"), SENTIMENTS, "neutral"),
+        "insights": insights[:3],
+    }
+
+
+def parse_analysis(
+    response: str,
+    parser: Optional[JsonObjectParser] = None,
+    fields: Tuple[str, ...] = ANALYSIS_FIELDS,
+    strict: bool = False,
+) -> Tuple[Dict, Optional[str]]:
+    """Structured analysis (only the given fields) from an LLM response.
+
+    Pass the parser that already consumed a streamed response to avoid
+    scanning it again. Returns (analysis, failure): failure is None when
+    the response held a valid analysis object, otherwise why it did not
+    ("empty", "no_json", "incomplete", "invalid_json" or "schema") and the
+    analysis is a best-effort fallback. strict is passed to validate_analysis.
+    """
+    if parser is None:
+        parser = JsonObjectParser()
+        parser.feed(response)
+
+    data = parser.result()
+    if data is not None:
+        try:
+            return validate_analysis(data, fields, strict), None
+        except ValueError:
+            fallback = parse_sections(response)
+            if isinstance(data, dict):
+                # Keep whatever the object did get right
+                fallback = {
+                    "summary": data["summary"].strip() if isinstance(data.get("summary"), str) else fallback["summary"],
+                    "category": _choice(data.get("category"), CATEGORIES, fallback["category"]),
+                    "sentiment": _choice(data.get("sentiment"), SENTIMENTS, fallback["sentiment"]),
+                    "insights": _insights(data.get("insights")) or fallback["insights"],
+                }
+            return {name: fallback[name] for name in fields}, "schema"
+
+    if not response.strip():
+        failure = "empty"
+    elif parser.started:
+        failure = "incomplete"
+    elif parser.rejected:
+        failure = "invalid_json"
+    else:
+        failure = "no_json"
+    fallback = parse_sections(response)
+    return {name: fallback[name] for name in fields}, failure
@@ -0,0 +1,255 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from app.database.db import Database
+from app.llm.analyzer import OllamaAnalyzer
+from app.llm.models import BULK, CRAWL, INTERACTIVE, llm_priority, llm_usage, new_usage
+from app.monitoring.metrics import timed
+
+PRIORITIES = {"interactive": INTERACTIVE, "crawl": CRAWL, "bulk": BULK}
+
+
+class BatchSizer:
+    """Chooses how many pages are analysed at once from what Ollama delivers.
+
+    After every window of ``size`` finished pages it compares generation
+    throughput (tokens/s, or LLM calls/s when Ollama reports no counts)
+    with the previous window and hill-climbs one step at a time: it keeps
+    growing only while that raises throughput by 5%, and keeps shrinking
+    while throughput holds, so it settles at the smallest size that keeps
+    Ollama busy. Once the latency of an LLM call, including the wait for
+    an Ollama slot, exceeds ``max_slowdown`` times the best seen, the size
+    shrinks regardless, since more pages would only queue. Only the LLM
+    usage of the scheduler's own pages (llm_usage) counts, so Ollama
+    requests made outside it do not move the size.
+    """
+
+    def __init__(self, size: int, maximum: int, max_slowdown: float = 1.5):
+        self.maximum = max(1, maximum)
+        self.size = min(max(1, size), self.maximum)
+        self.max_slowdown = max_slowdown
+        self.direction = 1
+        self.throughput: Optional[float] = None
+        self.latency: Optional[float] = None
+        self.best_latency: Optional[float] = None
+        self._completed = 0
+        self._usage = new_usage()
+        self._started = time.perf_counter()
+
+    def record(self, usage: Optional[Dict[str, float]] = None):
+        """Count one finished page and the LLM usage of its analysis;
+        adjusts the size at the end of a window"""
+        self._completed += 1
+        if usage is not None:
+            for key in self._usage:
+                self._usage[key] += usage[key]
+        if self._completed >= max(2, self.size):
+            self._adjust()
+
+    def _adjust(self):
+        elapsed = time.perf_counter() - self._started
+        calls, tokens, waited = self._usage["requests"], self._usage["generated_tokens"], self._usage["seconds"]
+        self._completed = 0
+        self._usage = new_usage()
+        self._started = time.perf_counter()
+        if calls <= 0 or elapsed <= 0:
+            # Only cache hits: nothing was learned about Ollama
+            return
+
+        throughput = (tokens or calls) / elapsed
+        latency = waited / calls
+        # The baseline creeps up so one unusually fast window is not the bar forever
+        self.best_latency = latency if self.best_latency is None else min(latency, self.best_latency * 1.02)
+        if latency > self.best_latency * self.max_slowdown:
+            self.direction = -1
+        elif self.throughput is not None:
+            # Growing has to pay for itself; shrinking is kept while throughput holds
+            if self.direction > 0 and throughput < self.throughput * 1.05:
+                self.direction = -1
+            elif self.direction < 0 and throughput < self.throughput * 0.95:
+                self.direction = 1
+        self.size = min(max(1, self.size + self.direction), self.maximum)
+        self.throughput, self.latency = throughput, latency
+
+
+class AnalysisScheduler:
+    """Priority queue in front of the LLM analyzer.
+
+    Pages are queued by id with a priority (INTERACTIVE, CRAWL or BULK) and
+    dispatched in concurrent batches whose size follows BatchSizer. The
+    priority also orders the page's LLM requests on the model slots, so a
+    single-URL request waits for at most one running LLM call instead of
+    behind a whole crawl or bulk re-analysis. A page queued twice is
+    analysed once; queuing it again with a higher priority moves it up.
+    Streaming callers pass on_token to receive the LLM output as it is
+    generated.
+    """
+
+    def __init__(self, database: Database, analyzer: OllamaAnalyzer, max_batch: Optional[int] = None):
+        self.database = database
+        self.analyzer = analyzer
+        self.max_batch = (
+            max_batch if max_batch is not None
+            else int(os.getenv("ANALYSIS_MAX_BATCH", str(4 * analyzer.num_parallel)))
+        )
+        self.sizer = BatchSizer(analyzer.num_parallel, self.max_batch)
+        # Heap of [priority, sequence, page_id or None when superseded, future, context, on_token]
+        self._heap: List[list] = []
+        self._pending: Dict[int, list] = {}
+        self._running: Dict[int, asyncio.Future] = {}
+        self._running_priority: Dict[int, int] = {}
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._workers: Set[asyncio.Task] = set()
+        self.counts = {"done": 0, "failed": 0}
+
+    async def start(self):
+        self._ensure_started()
+
+    def _ensure_started(self):
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._dispatch())
+
+    async def stop(self):
+        """Stop dispatching; queued and running analyses are cancelled"""
+        if self._task is None:
+            return
+        workers = [self._task, *self._workers]
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        self._task = None
+        for entry in self._heap:
+            entry[3].cancel()
+        for future in self._running.values():
+            future.cancel()
+        self._heap, self._pending, self._running, self._running_priority = [], {}, {}, {}
+
+    def submit(
+        self, page_id: int, priority: int = CRAWL, on_token: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> asyncio.Future:
+        """Queue a stored page for analysis.
+
+        The future resolves to the analysis, or None when the page has no
+        content. The work happens whether or not anyone awaits it. on_token
+        is awaited with every generated token, unless the page's analysis is
+        already running.
+        """
+        self._ensure_started()
+        running = self._running.get(page_id)
+        if running is not None:
+            return running
+        entry = self._pending.get(page_id)
+        if entry is not None:
+            on_token = on_token or entry[5]
+            if priority >= entry[0]:
+                entry[5] = on_token
+                return entry[3]
+            # Leave the old entry in the heap as a tombstone
+            entry[2] = None
+            future = entry[3]
+        else:
+            future = asyncio.get_running_loop().create_future()
+        # Spans recorded while analysing belong to the submitter's job trace
+        entry = [priority, next(self._sequence), page_id, future, contextvars.copy_context(), on_token]
+        heapq.heappush(self._heap, entry)
+        self._pending[page_id] = entry
+        self._wakeup.set()
+        return future
+
+    async def analyze(
+        self, page_id: int, priority: int = CRAWL, on_token: Optional[Callable[[str], Awaitable[None]]] = None
+    ) -> Optional[Dict]:
+        """Queue a page and wait for its analysis"""
+        # Shielded: the future may be shared with other callers
+        return await asyncio.shield(self.submit(page_id, priority, on_token))
+
+    def stats(self) -> Dict:
+        pending = {name: 0 for name in PRIORITIES}
+        names = {value: name for name, value in PRIORITIES.items()}
+        for priority, _, page_id, *_ in self._heap:
+            if page_id is not None:
+                pending[names.get(priority, "bulk")] += 1
+        return {
+            "pending": pending,
+            "running": len(self._running),
+            "batch_size": self.sizer.size,
+            "max_batch": self.sizer.maximum,
+            "throughput": self.sizer.throughput,
+            "llm_latency": self.sizer.latency,
+            **self.counts
+        }
+
+    def _can_dispatch(self) -> bool:
+        while self._heap and self._heap[0][2] is None:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return False
+        if len(self._running) < self.sizer.size:
+            return True
+        # A page that outranks everything running does not wait for the
+        # batch to drain; its LLM requests are served first anyway
+        return self._heap[0][0] < min(self._running_priority.values())
+
+    async def _dispatch(self):
+        while True:
+            while not self._can_dispatch():
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            # Fill the free slots of the batch, highest priority first
+            while self._can_dispatch():
+                priority, _, page_id, future, context, on_token = heapq.heappop(self._heap)
+                del self._pending[page_id]
+                self._running[page_id] = future
+                self._running_priority[page_id] = priority
+                task = context.run(asyncio.create_task, self._run(page_id, priority, future, on_token))
+                self._workers.add(task)
+                task.add_done_callback(self._workers.discard)
+
+    async def _run(
+        self,
+        page_id: int,
+        priority: int,
+        future: asyncio.Future,
+        on_token: Optional[Callable[[str], Awaitable[None]]] = None,
+    ):
+        # Inherited by the chunk and classification requests of the analysis
+        llm_priority.set(priority)
+        usage = new_usage()
+        llm_usage.set(usage)
+        try:
+            with timed("analyze_page", page_id=page_id, priority=priority):
+                analysis = None
+                page = await self.database.get_page(page_id)
+                if page and page.content and on_token is not None:
+                    async for kind, value in self.analyzer.analyze_text_stream(page.content, page.title, page.url):
+                        if kind == "token":
+                            await on_token(value)
+                        else:
+                            analysis = value
+                    await self.database.update_with_analysis(page_id, analysis)
+                elif page and page.content:
+                    analysis = await self.analyzer.analyze_text_async(page.content, page.title, page.url)
+                    await self.database.update_with_analysis(page_id, analysis)
+            self.counts["done"] += 1
+            if not future.done():
+                future.set_result(analysis)
+        except Exception as e:
+            print(f"Analysis of page {page_id} failed: {e}")
+            self.counts["failed"] += 1
+            if not future.done():
+                future.set_exception(e)
+                # Bulk submissions are never awaited; the error is logged above
+                future.exception()
+        finally:
+            self._running.pop(page_id, None)
+            self._running_priority.pop(page_id, None)
+            self.sizer.record(usage)
+            self._wakeup.set()
@@ -7,9 +7,17 @@ if sys.platform.startswith("win"):
 
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 
-from app.api.routes import router as api_router
+from app.api.routes import (
+    router as api_router, analysis_cache, analysis_scheduler, analyzer, browser_pool, crawler, deduplicator,
+    embedder, job_manager, revalidator, scheduler, semantic_index
+)
 from app.database.db import Database
+from app.monitoring.metrics import (
+    ANALYSIS_BATCH_SIZE, ANALYSIS_CACHE_LOOKUPS, ANALYSIS_PENDING, BROWSERS, CONTENT_TYPE, HOSTS, JOBS_PENDING,
+    REGISTRY
+)
 
 app = FastAPI(
     title="Web Crawler & LLM Analyzer",
@@ -33,6 +41,71 @@ db = Database()
 async def startup_db_client():
     await db.connect()
 
+@app.on_event("startup")
+async def startup_browser_pool():
+    # Warm the shared browsers once instead of launching one per crawl
+    if browser_pool.size > 0:
+        await browser_pool.start()
+
+@app.on_event("startup")
+async def startup_analyzer():
+    # One pooled HTTP client to Ollama for the life of the app
+    await analyzer.start()
+
+@app.on_event("startup")
+async def startup_analysis_scheduler():
+    await analysis_scheduler.start()
+
+@app.on_event("startup")
+async def startup_deduplicator():
+    # Rebuild the near-duplicate index from the stored fingerprints
+    await deduplicator.load()
+
+@app.on_event("startup")
+async def startup_semantic_index():
+    # Attaches pgvector, or loads the stored vectors into memory
+    await embedder.start()
+    await semantic_index.load()
+
+@app.on_event("startup")
+async def startup_job_workers():
+    # Resumes any jobs left queued or running by the previous process
+    await job_manager.start()
+
+@app.on_event("shutdown")
+async def shutdown_job_workers():
+    await job_manager.stop()
+
+@app.on_event("shutdown")
+async def shutdown_analysis_scheduler():
+    # After the job workers, whose analyses it runs
+    await analysis_scheduler.stop()
+
+@app.on_event("shutdown")
+async def shutdown_browser_pool():
+    await browser_pool.close()
+
+@app.on_event("shutdown")
+async def shutdown_analyzer():
+    await analyzer.close()
+
+@app.on_event("shutdown")
+async def shutdown_embedder():
+    await embedder.close()
+
+@app.on_event("shutdown")
+async def shutdown_revalidator():
+    await revalidator.close()
+
+@app.on_event("shutdown")
+async def shutdown_crawler():
+    # HTTP fast-path client
+    await crawler.close()
+
+@app.on_event("shutdown")
+async def shutdown_scheduler():
+    await scheduler.close()
+
 # Include API routes
 app.include_router(api_router, prefix="/api")
 
@@ -41,6 +114,26 @@ app.include_router(api_router, prefix="/api")
 async def health_check():
     return {"status": "healthy"}
 
+# Prometheus scrape endpoint
+@app.get("/metrics")
+async def metrics():
+    pool = browser_pool.stats()
+    BROWSERS.set(pool["size"] if browser_pool.started else 0, state="total")
+    BROWSERS.set(pool["idle"], state="idle")
+    cache = analysis_cache.stats()
+    ANALYSIS_CACHE_LOOKUPS.set(cache["memory_hits"], result="memory_hit")
+    ANALYSIS_CACHE_LOOKUPS.set(cache["db_hits"], result="db_hit")
+    ANALYSIS_CACHE_LOOKUPS.set(cache["misses"], result="miss")
+    hosts = scheduler.stats()
+    HOSTS.set(len(hosts), state="tracked")
+    HOSTS.set(sum(1 for host in hosts.values() if host["backoff"] > 1.0), state="backed_off")
+    JOBS_PENDING.set(job_manager.pending)
+    analysis = analysis_scheduler.stats()
+    for priority, pages in analysis["pending"].items():
+        ANALYSIS_PENDING.set(pages, priority=priority)
+    ANALYSIS_BATCH_SIZE.set(analysis["batch_size"])
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run("app.main:app", host="0.0.0.0", port=8000, reload=True)
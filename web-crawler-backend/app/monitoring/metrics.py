@@ -0,0 +1,326 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds; covers sub-millisecond parsing up to multi-minute LLM calls
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric:
+    """A named metric with a fixed set of label names.
+
+    Values are kept per label combination; updates take a lock because
+    some are recorded from worker threads (e.g. HTML extraction).
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = (), registry: Optional["Registry"] = None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels: Dict[str, object]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labels) or any(name not in labels for name in self.labels):
+            raise ValueError(f"{self.name} expects labels {self.labels}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def _label_text(self, key: Tuple[str, ...], extra: Sequence[Tuple[str, str]] = ()) -> str:
+        pairs = list(zip(self.labels, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{self._label_text(key)} {_format(value)}"
+
+
+class Gauge(Metric):
+    """Value that can go up and down, usually set when metrics are scraped"""
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{self._label_text(key)} {_format(value)}"
+
+
+class Histogram(Metric):
+    """Distribution of observed values in cumulative buckets, plus sum and count"""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        registry: Optional["Registry"] = None,
+    ):
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        super().__init__(name, documentation, labels, registry)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts, sum, count]
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def snapshot(self, **labels) -> Tuple[float, int]:
+        """(sum, count) observed for a label combination"""
+        state = self._values.get(self._key(labels))
+        return (state[1], state[2]) if state else (0.0, 0)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            items = sorted((key, ([*state[0]], state[1], state[2])) for key, state in self._values.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{self._label_text(key, [('le', _format(bound))])} {cumulative}"
+            yield f"{self.name}_sum{self._label_text(key)} {_format(total)}"
+            yield f"{self.name}_count{self._label_text(key)} {count}"
+
+
+class Registry:
+    """Metrics rendered together in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+# Content type of the text format served at /metrics
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = Histogram(
+    "crawler_stage_duration_seconds",
+    "Time spent in each pipeline stage",
+    ["stage"]
+)
+PAGES_FETCHED = Counter(
+    "crawler_pages_fetched_total",
+    "Page fetches by tier (http, browser) and outcome (ok, failed, fallback, skipped)",
+    ["tier", "outcome"]
+)
+DB_ROWS = Counter(
+    "crawler_db_rows_written_total",
+    "Page rows written by operation (insert, update, analysis)",
+    ["operation"]
+)
+LLM_REQUESTS = Counter(
+    "llm_requests_total",
+    "Ollama generate requests by outcome (ok, retry, error)",
+    ["outcome"]
+)
+LLM_PROMPT_TOKENS = Histogram(
+    "llm_prompt_tokens",
+    "Size of prompts sent to the LLM in tokens, by kind (analysis, chunk)",
+    ["kind"],
+    buckets=(64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+)
+LLM_GENERATED_TOKENS = Counter(
+    "llm_generated_tokens_total",
+    "Tokens generated by the LLM as reported by Ollama"
+)
+LLM_TOKENS_PER_SECOND = Histogram(
+    "llm_generation_tokens_per_second",
+    "Generation speed per request (eval_count / eval_duration)",
+    buckets=(1, 2, 5, 10, 20, 35, 50, 75, 100, 150, 250, 500)
+)
+LLM_PARSE_FAILURES = Counter(
+    "llm_parse_failures_total",
+    "LLM responses without a valid analysis object, by reason (empty, no_json, incomplete, invalid_json, schema)",
+    ["reason"]
+)
+LLM_MODEL_SECONDS = Histogram(
+    "llm_model_request_seconds",
+    "Duration of Ollama generate requests per model, excluding the wait for a slot",
+    ["model"]
+)
+LLM_MODEL_TOKENS = Counter(
+    "llm_model_tokens_total",
+    "Tokens processed per model by kind (prompt, generated) as reported by Ollama",
+    ["model", "kind"]
+)
+LLM_MODEL_COST = Counter(
+    "llm_model_cost_total",
+    "Cost of the tokens processed per model, at the rate configured in OLLAMA_MODELS",
+    ["model"]
+)
+LLM_ESCALATIONS = Counter(
+    "llm_escalations_total",
+    "Small-model answers redone by the large model, by parse failure reason",
+    ["reason"]
+)
+JOBS = Counter(
+    "crawl_jobs_total",
+    "Finished crawl jobs by status",
+    ["status"]
+)
+
+# Set from the components' own state whenever /metrics is scraped
+JOBS_PENDING = Gauge("crawl_jobs_pending", "Jobs waiting for a worker")
+BROWSERS = Gauge("browser_pool_browsers", "Pooled browsers by state (total, idle)", ["state"])
+ANALYSIS_CACHE_LOOKUPS = Gauge(
+    "analysis_cache_lookups",
+    "Analysis cache lookups since startup by result (memory_hit, db_hit, miss)",
+    ["result"]
+)
+ANALYSIS_PENDING = Gauge("analysis_pending_pages", "Pages waiting for LLM analysis by priority", ["priority"])
+ANALYSIS_BATCH_SIZE = Gauge("analysis_batch_size", "Analyses the scheduler currently runs at once")
+HOSTS = Gauge("crawler_hosts", "Hosts tracked by the politeness scheduler, by state (tracked, backed_off)", ["state"])
+
+
+class JobTrace:
+    """Spans recorded while one job runs, for profiling a single crawl.
+
+    Span offsets are seconds since the trace started. At most ``max_spans``
+    spans are kept; the per-stage totals always cover every span.
+    """
+
+    def __init__(self, max_spans: int = 5000):
+        self.max_spans = max_spans
+        self.started = time.perf_counter()
+        self.spans: List[Dict] = []
+        self.dropped = 0
+        self._stages: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, started: float, duration: float, **attrs):
+        with self._lock:
+            totals = self._stages.setdefault(stage, [0, 0.0, 0.0])
+            totals[0] += 1
+            totals[1] += duration
+            totals[2] = max(totals[2], duration)
+            if len(self.spans) >= self.max_spans:
+                self.dropped += 1
+                return
+            span = {"stage": stage, "start": round(started - self.started, 6), "duration": round(duration, 6)}
+            span.update(attrs)
+            self.spans.append(span)
+
+    def to_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "duration": round(time.perf_counter() - self.started, 6),
+                "stages": {
+                    stage: {"count": count, "total": round(total, 6), "max": round(longest, 6)}
+                    for stage, (count, total, longest) in self._stages.items()
+                },
+                "spans": list(self.spans),
+                "dropped_spans": self.dropped
+            }
+
+
+# Trace of the job running in the current task; copied into the tasks
+# and threads it starts, so concurrent work is attributed to it too
+_current_trace: ContextVar[Optional[JobTrace]] = ContextVar("job_trace", default=None)
+
+
+@contextmanager
+def tracing(trace: JobTrace):
+    """Record the spans of the enclosed work into trace"""
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _current_trace.reset(token)
+
+
+def record_stage(stage: str, started: float, duration: float, **attrs):
+    """Add a measured stage to the stage histogram and the current job's trace"""
+    STAGE_SECONDS.observe(duration, stage=stage)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add(stage, started, duration, **attrs)
+
+
+@contextmanager
+def timed(stage: str, **attrs):
+    """Time the enclosed block as a pipeline stage.
+
+    Yields a dict; keys added to it are kept as attributes of the trace span.
+    """
+    started = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        record_stage(stage, started, time.perf_counter() - started, **attrs)
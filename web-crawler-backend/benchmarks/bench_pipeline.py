@@ -0,0 +1,394 @@
+"""
+End-to-end throughput of the crawl -> store -> analyze pipeline against
+local stand-ins, at several concurrency levels.
+
+    BENCH_DATABASE_URL=postgresql://localhost/crawler_bench python -m benchmarks.bench_pipeline \\
+        --sites 8 --pages 50 --concurrency 1,2,4,8 --llm-latency 0.2 --llm-parallel 4
+
+Each site is a local HTTP server with ``--pages`` server-rendered pages
+linked as a binary tree, and the LLM is the stub from ollama_stub.py
+serving ``--llm-parallel`` generations at once. For every concurrency
+level a fresh process imports the app with JOB_WORKERS and
+OLLAMA_NUM_PARALLEL set to that level, posts one crawl per site to
+/api/crawl (or /api/crawl/stream with ``--mode stream``) through the real
+FastAPI app and waits for all of them. The browser pool stays cold: every
+page takes the HTTP fast path.
+
+Reported per level: pages/s, job latency and per-stage p50/p95/p99 (from
+the job traces) and peak RSS of the app process. Results are written as
+JSON to ``--output``; pass an earlier file as ``--baseline`` to print the
+change in throughput.
+
+Runs against a throwaway ``bench_pipeline`` schema, recreated for each
+level and dropped afterwards. Falls back to DATABASE_URL when
+BENCH_DATABASE_URL is not set. Run it from the backend root so ``app`` is
+importable.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import asyncpg
+
+from benchmarks.ollama_stub import start_stub
+
+SCHEMA = "bench_pipeline"
+# Prefix of the line a level's process reports its result on
+RESULT_MARKER = "BENCH_RESULT "
+
+WORDS = (
+    "crawler index python market energy climate network design robot garden ocean music travel "
+    "history privacy battery galaxy startup election vaccine recipe football quantum search "
+    "database security cloud language medicine finance camera banking"
+).split()
+
+
+def make_site(site: int, pages: int, words: int) -> Dict[str, bytes]:
+    """HTML of a synthetic site: page i links to pages 2i+1 and 2i+2"""
+    html = {}
+    for i in range(pages):
+        rng = random.Random(f"{site}:{i}")
+        paragraphs = "".join(
+            "<p>" + " ".join(rng.choice(WORDS) for _ in range(50)) + ".</p>"
+            for _ in range(max(1, words // 50))
+        )
+        links = "".join(
+            f'<li><a href="/page/{child}">Page {child}</a></li>'
+            for child in (2 * i + 1, 2 * i + 2) if child < pages
+        )
+        html["/" if i == 0 else f"/page/{i}"] = (
+            f"<html><head><title>Site {site} page {i}</title>"
+            f'<meta name="description" content="Synthetic page {i} of site {site}"></head>'
+            f"<body><h1>Site {site} page {i}</h1>{paragraphs}<ul>{links}</ul></body></html>"
+        ).encode("utf-8")
+    return html
+
+
+def start_site(pages: Dict[str, bytes], latency: float = 0.0):
+    """Serve a synthetic site on a background thread. Returns (server, base_url)."""
+
+    class SiteHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            if latency:
+                time.sleep(latency)
+            body = pages.get(self.path.split("?", 1)[0])
+            data = body if body is not None else b"not found"
+            self.send_response(200 if body is not None else 404)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SiteHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {"count": 0, "p50": None, "p95": None, "p99": None, "max": None}
+    values = sorted(values)
+
+    def rank(q: float) -> float:
+        # Nearest-rank percentile
+        return values[min(len(values) - 1, max(0, int(round(q * len(values))) - 1))]
+
+    return {
+        "count": len(values),
+        "p50": round(rank(0.50), 6),
+        "p95": round(rank(0.95), 6),
+        "p99": round(rank(0.99), 6),
+        "max": round(values[-1], 6),
+    }
+
+
+def with_search_path(dsn: str, schema: str) -> str:
+    # asyncpg passes unknown DSN query parameters on as server settings
+    return f"{dsn}{'&' if '?' in dsn else '?'}search_path={schema}"
+
+
+async def reset_schema(dsn: str, drop_only: bool = False):
+    conn = await asyncpg.connect(dsn)
+    try:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        if not drop_only:
+            await conn.execute(f"CREATE SCHEMA {SCHEMA}")
+    finally:
+        await conn.close()
+
+
+class RssSampler:
+    """Peak resident set size of this process, sampled in the background"""
+
+    def __init__(self, interval: float = 0.05):
+        import psutil
+        self._process = psutil.Process()
+        self.interval = interval
+        self.peak = self._process.memory_info().rss
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> int:
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self.peak = max(self.peak, self._process.memory_info().rss)
+        return self.peak
+
+    async def _run(self):
+        while True:
+            self.peak = max(self.peak, self._process.memory_info().rss)
+            await asyncio.sleep(self.interval)
+
+
+async def run_level(args) -> Dict:
+    """One concurrency level, in a process configured through the environment"""
+    import httpx
+
+    from app.api import routes
+    from app.main import app
+    from app.monitoring.metrics import JobTrace, tracing
+
+    sites = args.site_urls.split(",")
+    sampler = RssSampler()
+    sampler.start()
+    await routes.db.connect()
+    await routes.analyzer.start()
+    await routes.embedder.start()
+    await routes.job_manager.start()
+
+    stages: Dict[str, List[float]] = {}
+    job_latencies: List[float] = []
+    pages = failed = 0
+
+    def collect(trace: Dict):
+        for span in trace.get("spans", []):
+            stages.setdefault(span["stage"], []).append(span["duration"])
+
+    # A binary tree of depth 10 (the API maximum) holds 2047 pages
+    body = {"query_type": "domain", "max_depth": 10, "max_pages": args.pages, "trace": True}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+        async def run_job(site: str):
+            nonlocal pages, failed
+            submitted = time.perf_counter()
+            response = await client.post("/api/crawl", json={**body, "query": site})
+            response.raise_for_status()
+            job_id = response.json()["job_id"]
+            while True:
+                job = (await client.get(f"/api/jobs/{job_id}")).json()
+                if job["status"] in ("completed", "failed"):
+                    break
+                await asyncio.sleep(args.poll_interval)
+            job_latencies.append(time.perf_counter() - submitted)
+            if job["status"] == "failed":
+                failed += 1
+                print(f"job for {site} failed: {job['error']}", file=sys.stderr)
+                return
+            pages += job["page_count"]
+            collect((await client.get(f"/api/jobs/{job_id}/trace")).json())
+
+        streams = asyncio.Semaphore(args.level)
+
+        async def run_stream(site: str):
+            nonlocal pages, failed
+            # The stream runs in this task's context, so its spans land in the trace
+            async with streams:
+                with tracing(JobTrace()) as trace:
+                    started = time.perf_counter()
+                    async with client.stream("POST", "/api/crawl/stream", json={**body, "query": site}) as response:
+                        event = None
+                        async for line in response.aiter_lines():
+                            if line.startswith("event: "):
+                                event = line[7:]
+                            elif line.startswith("data: ") and event in ("done", "error"):
+                                data = json.loads(line[6:])
+                                if event == "done":
+                                    pages += data["page_count"]
+                                elif "page_id" not in data:
+                                    failed += 1
+                                    print(f"stream for {site} failed: {data['error']}", file=sys.stderr)
+                    job_latencies.append(time.perf_counter() - started)
+                collect(trace.to_dict())
+
+        started = time.perf_counter()
+        run = run_stream if args.mode == "stream" else run_job
+        await asyncio.gather(*(run(site) for site in sites))
+        wall = time.perf_counter() - started
+
+    await routes.job_manager.stop()
+    await routes.analyzer.close()
+    await routes.embedder.close()
+    await routes.crawler.close()
+    await routes.scheduler.close()
+    await routes.db.conn_pool.close()
+    peak = await sampler.stop()
+
+    return {
+        "concurrency": args.level,
+        "jobs": len(sites),
+        "failed_jobs": failed,
+        "pages": pages,
+        "wall_seconds": round(wall, 3),
+        "pages_per_second": round(pages / wall, 2) if wall else None,
+        "job_latency": percentiles(job_latencies),
+        "stages": {stage: percentiles(values) for stage, values in sorted(stages.items())},
+        "peak_rss_mb": round(peak / 2 ** 20, 1),
+    }
+
+
+def run_level_process(args, level: int, dsn: str, site_urls: List[str], ollama_url: str) -> Dict:
+    env = dict(
+        os.environ,
+        DATABASE_URL=with_search_path(dsn, SCHEMA),
+        OLLAMA_BASE_URL=ollama_url,
+        JOB_WORKERS=str(level),
+        OLLAMA_NUM_PARALLEL=str(level),
+        HOST_MIN_DELAY=str(args.host_delay),
+        # The pool is never started; it only has to be enabled so crawls
+        # run in-process instead of in the crawler subprocess
+        BROWSER_POOL_SIZE="1",
+        VECTOR_INDEX="numpy",
+        PYTHONIOENCODING="utf-8",
+    )
+    command = [
+        sys.executable, "-m", "benchmarks.bench_pipeline",
+        "--level", str(level),
+        "--site-urls", ",".join(site_urls),
+        "--pages", str(args.pages),
+        "--mode", args.mode,
+        "--poll-interval", str(args.poll_interval),
+    ]
+    result = subprocess.run(command, env=env, capture_output=True, text=True, encoding="utf-8")
+    for line in result.stdout.splitlines():
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    raise RuntimeError(f"level {level} exited with {result.returncode}:\n{result.stderr[-2000:]}")
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_results(levels: List[Dict], baseline: Optional[Dict]):
+    previous = {level["concurrency"]: level for level in (baseline or {}).get("levels", [])}
+    print(f"{'conc':>4} {'pages':>6} {'pages/s':>8} {'job p50':>8} {'job p95':>8} {'job p99':>8} "
+          f"{'llm p50':>8} {'fetch p95':>9} {'rss MB':>7}{'  vs baseline' if previous else ''}")
+    for level in levels:
+        jobs = level["job_latency"]
+        llm = level["stages"].get("llm_generate", {})
+        fetch = level["stages"].get("fetch_http", {})
+
+        def cell(value, width):
+            return f"{value:{width}.3f}" if value is not None else f"{'-':>{width}}"
+
+        line = (
+            f"{level['concurrency']:>4} {level['pages']:>6} {level['pages_per_second']:>8.1f} "
+            f"{cell(jobs['p50'], 8)} {cell(jobs['p95'], 8)} {cell(jobs['p99'], 8)} "
+            f"{cell(llm.get('p50'), 8)} {cell(fetch.get('p95'), 9)} {level['peak_rss_mb']:>7.1f}"
+        )
+        before = previous.get(level["concurrency"])
+        if before and before.get("pages_per_second"):
+            line += f"  {level['pages_per_second'] / before['pages_per_second'] - 1:+.1%}"
+        print(line)
+
+
+def main(args):
+    dsn = os.getenv("BENCH_DATABASE_URL") or os.getenv("DATABASE_URL")
+    if not dsn:
+        raise SystemExit("Set BENCH_DATABASE_URL (or DATABASE_URL)")
+
+    sites = [start_site(make_site(i, args.pages, args.page_words), args.site_latency) for i in range(args.sites)]
+    stub, ollama_url = start_stub(latency=args.llm_latency, parallel=args.llm_parallel)
+    levels = []
+    try:
+        for level in (int(value) for value in args.concurrency.split(",")):
+            asyncio.run(reset_schema(dsn))
+            result = run_level_process(args, level, dsn, [url for _, url in sites], ollama_url)
+            print(f"concurrency {level}: {result['pages']} pages in {result['wall_seconds']} s", flush=True)
+            levels.append(result)
+    finally:
+        asyncio.run(reset_schema(dsn, drop_only=True))
+        stub.shutdown()
+        for server, _ in sites:
+            server.shutdown()
+
+    report = {
+        "benchmark": "pipeline",
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "config": {
+            "mode": args.mode,
+            "sites": args.sites,
+            "pages": args.pages,
+            "page_words": args.page_words,
+            "site_latency": args.site_latency,
+            "llm_latency": args.llm_latency,
+            "llm_parallel": args.llm_parallel,
+            "host_delay": args.host_delay,
+        },
+        "levels": levels,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print(f"note: {args.baseline} was run with a different configuration: {baseline.get('config')}")
+    print_results(levels, baseline)
+    print(f"results written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the crawl -> store -> analyze pipeline")
+    parser.add_argument("--sites", type=int, default=8, help="synthetic sites, one crawl job each")
+    parser.add_argument("--pages", type=int, default=50, help="pages per site (at most 2047)")
+    parser.add_argument("--page-words", type=int, default=600, help="words of text per page")
+    parser.add_argument("--site-latency", type=float, default=0.0, help="seconds per page response")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="seconds per stub generation")
+    parser.add_argument("--llm-parallel", type=int, default=4, help="generations the stub serves at once (0: unlimited)")
+    parser.add_argument("--host-delay", type=float, default=0.0, help="HOST_MIN_DELAY for the run")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="comma-separated JOB_WORKERS/OLLAMA_NUM_PARALLEL levels")
+    parser.add_argument("--mode", choices=("job", "stream"), default="job",
+                        help="queue jobs on /api/crawl or stream /api/crawl/stream")
+    parser.add_argument("--output", default="bench_pipeline.json", help="where to write the JSON results")
+    parser.add_argument("--baseline", help="earlier results file to compare pages/s against")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help=argparse.SUPPRESS)
+    # Internal: run one level in this process
+    parser.add_argument("--level", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--site-urls", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.level is not None:
+        print(RESULT_MARKER + json.dumps(asyncio.run(run_level(args))), flush=True)
+    else:
+        main(args)
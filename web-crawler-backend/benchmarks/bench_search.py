@@ -0,0 +1,152 @@
+"""
+Time Database.search_pages on a large synthetic table, next to the
+ILIKE scan a search endpoint would otherwise fall back to.
+
+    BENCH_DATABASE_URL=postgresql://localhost/crawler_bench python -m benchmarks.bench_search --rows 1000000
+
+Rows are generated server-side with generate_series (the search_vector
+trigger runs for each one, so seeding 1M rows takes a few minutes). Runs
+against a throwaway ``bench_search`` schema, which is dropped afterwards
+unless --keep is given. Falls back to DATABASE_URL when
+BENCH_DATABASE_URL is not set. Run it from the backend root so ``app`` is
+importable.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import asyncpg
+
+from app.database.db import Database
+
+SCHEMA = "bench_search"
+
+WORDS = [
+    "crawler", "python", "database", "index", "search", "quantum", "climate", "market",
+    "football", "recipe", "vaccine", "election", "startup", "galaxy", "battery", "privacy",
+    "music", "travel", "banking", "robot", "ocean", "energy", "history", "design",
+    "network", "security", "cloud", "language", "garden", "medicine", "finance", "camera",
+]
+CATEGORIES = ["Technology", "Science", "Business", "Sports", "Health", "Politics", "Entertainment", "Other"]
+SENTIMENTS = ["positive", "neutral", "negative"]
+
+QUERIES = [
+    ("very common term", {"query": "term1"}),
+    ("common term", {"query": "python"}),
+    ("rare term", {"query": "term31337"}),
+    ("rare phrase", {"query": '"quantum galaxy"'}),
+    ("two terms", {"query": "climate energy"}),
+    ("term + category", {"query": "security", "category": "Technology"}),
+    ("term + both facets", {"query": "market", "category": "Business", "sentiment": "positive"}),
+    ("facets only", {"category": "Health", "sentiment": "negative"}),
+    ("deep page", {"query": "robot", "offset": 5000}),
+]
+
+
+async def seed(conn, rows: int, batch: int = 100000):
+    """Insert rows synthetic pages of 60 random words each"""
+    for start in range(0, rows, batch):
+        count = min(batch, rows - start)
+        await conn.execute('''
+            WITH generated AS (
+                SELECT g, w, c, s, (SELECT string_agg(word, ' ') FROM (
+                           -- Mostly a long-tail vocabulary (log-uniform over 50k terms),
+                           -- with the named words sprinkled in at ~10% document frequency
+                           SELECT CASE WHEN random() < 0.05 THEN w[1 + floor(random() * array_length(w, 1))::int]
+                                       ELSE 'term' || floor(exp(random() * ln(50000)))::int END AS word
+                           FROM generate_series(1, 60) WHERE g IS NOT NULL  -- correlated: re-run per row
+                       ) AS words) AS content
+                FROM generate_series($1::int, $2::int) AS g,
+                     (SELECT $3::text[] AS w, $4::text[] AS c, $5::text[] AS s) AS vocab
+            ), bodies AS (
+                SELECT *, encode(sha256(convert_to(content, 'UTF8')), 'hex') AS content_hash FROM generated
+            ), pages AS (
+                INSERT INTO crawled_pages (
+                    url, title, summary, category, sentiment, crawled_at, content_hash, search_vector
+                )
+                SELECT 'https://bench.local/' || g,
+                       w[1 + (g % array_length(w, 1))] || ' ' || w[1 + ((g / 7) % array_length(w, 1))],
+                       'Summary of page ' || g,
+                       c[1 + (g % array_length(c, 1))],
+                       s[1 + ((g / 3) % array_length(s, 1))],
+                       now() - (g || ' seconds')::interval,
+                       content_hash,
+                       setweight(to_tsvector('english', content), 'C')
+                FROM bodies
+            )
+            -- Bodies this short are stored uncompressed by the app as well
+            INSERT INTO page_contents (content_hash, codec, body, size, excerpt, stored_at)
+            SELECT content_hash, 'none', convert_to(content, 'UTF8'), length(content), content, LOCALTIMESTAMP
+            FROM bodies
+            ON CONFLICT (content_hash) DO NOTHING
+        ''', start, start + count - 1, WORDS, CATEGORIES, SENTIMENTS)
+        print(f"seeded {start + count} rows", flush=True)
+    await conn.execute("ANALYZE crawled_pages, page_contents")
+
+
+async def timed(label, coro_factory, repeat: int):
+    # First call warms the cache; report the best of the rest
+    result = await coro_factory()
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = await coro_factory()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+async def main(rows: int, repeat: int, keep: bool):
+    dsn = os.getenv("BENCH_DATABASE_URL") or os.getenv("DATABASE_URL")
+    if not dsn:
+        raise SystemExit("Set BENCH_DATABASE_URL (or DATABASE_URL)")
+
+    admin = await asyncpg.connect(dsn)
+    exists = await admin.fetchval(
+        "SELECT EXISTS (SELECT 1 FROM information_schema.tables WHERE table_schema = $1 AND table_name = 'crawled_pages')",
+        SCHEMA
+    )
+    if not (keep and exists):
+        await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}")
+
+    db = Database()
+    db.conn_pool = await asyncpg.create_pool(dsn=dsn, server_settings={"search_path": SCHEMA})
+    try:
+        await db._create_tables()
+        async with db.conn_pool.acquire() as conn:
+            if await conn.fetchval("SELECT count(*) FROM crawled_pages") < rows:
+                start = time.perf_counter()
+                await conn.execute("TRUNCATE crawled_pages, page_contents CASCADE")
+                await seed(conn, rows)
+                print(f"seeding took {time.perf_counter() - start:.1f} s")
+
+        print(f"{'query':<22} {'search_pages':>14} {'ILIKE scan':>12} {'matches':>10}")
+        for label, params in QUERIES:
+            elapsed, (_, total, _) = await timed(label, lambda: db.search_pages(**params), repeat)
+
+            baseline = "-"
+            term = params.get("query", "").strip('"').split(" ")[0]
+            if term:
+                async with db.conn_pool.acquire() as conn:
+                    scan, _ = await timed(label, lambda: conn.fetch('''
+                        SELECT p.id, p.url, p.title
+                        FROM crawled_pages p JOIN page_contents c ON c.content_hash = p.content_hash
+                        WHERE p.title ILIKE $1 OR c.excerpt ILIKE $1
+                        ORDER BY p.crawled_at DESC LIMIT 20 OFFSET $2
+                    ''', f"%{term}%", params.get("offset", 0)), repeat)
+                baseline = f"{scan * 1000:9.1f} ms"
+            print(f"{label:<22} {elapsed * 1000:11.1f} ms {baseline:>12} {total:>10}")
+    finally:
+        await db.conn_pool.close()
+        if not keep:
+            await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await admin.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark full-text search")
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--keep", action="store_true", help="keep (and reuse) the seeded schema")
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat, args.keep))
@@ -0,0 +1,91 @@
+"""
+Compare the bulk Database.store_crawled_data with the old per-page loop
+(SELECT then INSERT for every page).
+
+    BENCH_DATABASE_URL=postgresql://localhost/crawler_bench python -m benchmarks.bench_store --pages 500
+
+Runs against a throwaway ``bench_store`` schema, which is dropped afterwards.
+Falls back to DATABASE_URL when BENCH_DATABASE_URL is not set. Run it from
+the backend root so ``app`` is importable.
+"""
+import argparse
+import asyncio
+import os
+import time
+from datetime import datetime
+
+import asyncpg
+
+from app.database.db import Database
+
+SCHEMA = "bench_store"
+
+
+def make_pages(count: int, prefix: str):
+    body = "Lorem ipsum dolor sit amet. " * 200
+    return [{
+        "url": f"https://bench.local/{prefix}/{i}",
+        "title": f"Page {i}",
+        "metadata": {"description": f"Synthetic page {i}"},
+        "content": body,
+        "links": {"internal": [{"href": f"/{prefix}/{i + 1}"}], "external": []},
+        "crawled_at": datetime.now().isoformat()
+    } for i in range(count)]
+
+
+async def legacy_store(db, pages):
+    """The original two-round-trips-per-page loop: a SELECT, then an insert of
+    the one page (now through the same statement as the bulk path, since
+    bodies and links are no longer stored in the crawled_pages row)"""
+    page_ids = []
+    for page in pages:
+        async with db.conn_pool.acquire() as conn:
+            existing = await conn.fetchval('SELECT id FROM crawled_pages WHERE url = $1', page['url'])
+        if existing:
+            page_ids.append(existing)
+            continue
+        page_ids.extend(await db.store_crawled_data([page]))
+    return page_ids
+
+
+async def timed(label, coro_factory, pages):
+    start = time.perf_counter()
+    ids = await coro_factory(pages)
+    elapsed = time.perf_counter() - start
+    assert len(ids) == len(pages), f"{label}: expected {len(pages)} ids, got {len(ids)}"
+    print(f"{label:<28} {len(pages):>6} pages  {elapsed * 1000:9.1f} ms  {len(pages) / elapsed:9.1f} pages/s")
+    return ids
+
+
+async def main(page_count: int):
+    dsn = os.getenv("BENCH_DATABASE_URL") or os.getenv("DATABASE_URL")
+    if not dsn:
+        raise SystemExit("Set BENCH_DATABASE_URL (or DATABASE_URL)")
+
+    admin = await asyncpg.connect(dsn)
+    await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE; CREATE SCHEMA {SCHEMA}")
+
+    db = Database()
+    db.conn_pool = await asyncpg.create_pool(dsn=dsn, server_settings={"search_path": SCHEMA})
+    try:
+        await db._create_tables()
+
+        legacy_pages = make_pages(page_count, "legacy")
+        bulk_pages = make_pages(page_count, "bulk")
+
+        await timed("legacy loop (new urls)", lambda p: legacy_store(db, p), legacy_pages)
+        await timed("bulk insert (new urls)", db.store_crawled_data, bulk_pages)
+        first = await timed("legacy loop (re-crawl)", lambda p: legacy_store(db, p), legacy_pages)
+        second = await timed("bulk insert (re-crawl)", db.store_crawled_data, legacy_pages)
+        assert first == second, "bulk path returned different ids for existing urls"
+    finally:
+        await db.conn_pool.close()
+        await admin.execute(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE")
+        await admin.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark crawled page storage")
+    parser.add_argument("--pages", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.pages))
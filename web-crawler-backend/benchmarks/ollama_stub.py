@@ -0,0 +1,198 @@
+"""
+Stand-in for Ollama's /api/generate and /api/embed endpoints, for running
+the analyzer and embedder without a model.
+
+    python benchmarks/ollama_stub.py --port 11500 --latency 0.2
+    OLLAMA_BASE_URL=http://127.0.0.1:11500/api uvicorn app.main:app ...
+
+Every request gets the same canned analysis back after ``--latency``
+seconds. ``"stream": true`` requests receive it as NDJSON chunks, the way
+Ollama streams tokens. ``--fail-rate`` makes a fraction of requests return
+503 so the analyzer's retries can be exercised. ``--parallel`` limits how
+many requests are served at once, like OLLAMA_NUM_PARALLEL; the rest wait.
+``--model-latency small-model=0.05`` gives one model its own latency, to
+try out a small/large model cascade.
+
+/api/embed returns hashed bag-of-words vectors of ``--embed-dim``
+dimensions, so texts sharing words get similar embeddings.
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+CANNED_ANALYSIS = {
+    "summary": "A synthetic page served by the benchmark stub.",
+    "category": "technology",
+    "sentiment": "neutral",
+    "insights": [
+        "The page was generated for benchmarking.",
+        "Its content is not meaningful.",
+        "The analysis is canned."
+    ]
+}
+
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Small responses would otherwise sit in Nagle's buffer for a delayed ACK
+    disable_nagle_algorithm = True
+    latency = 0.0
+    # Model name -> seconds per generation, overriding latency
+    model_latency: dict = {}
+    fail_rate = 0.0
+    embed_dim = 256
+    # Shared by all handler threads when the stub's parallelism is limited
+    slots = None
+    response_text = json.dumps(CANNED_ANALYSIS)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+
+        path = self.path.rstrip("/")
+        if path not in ("/api/generate", "/api/embed"):
+            self._send_json(404, {"error": "not found"})
+            return
+
+        if random.random() < self.fail_rate:
+            self._send_json(503, {"error": "server busy"})
+            return
+
+        if path == "/api/embed":
+            inputs = body.get("input", [])
+            if isinstance(inputs, str):
+                inputs = [inputs]
+            with self.slots or nullcontext():
+                time.sleep(self.latency)
+            self._send_json(200, {
+                "model": body.get("model", "stub"),
+                "embeddings": [self._embed(text) for text in inputs]
+            })
+            return
+
+        model = body.get("model", "stub")
+        latency = self.model_latency.get(model, self.latency)
+        prompt_tokens = len(str(body.get("prompt", "")).split())
+        if body.get("stream", True):
+            with self.slots or nullcontext():
+                self._stream(model, latency, prompt_tokens)
+        else:
+            with self.slots or nullcontext():
+                time.sleep(latency)
+            self._send_json(200, {
+                "model": model,
+                "response": self.response_text,
+                "done": True,
+                "prompt_eval_count": prompt_tokens,
+                "eval_count": len(self.response_text.split()),
+                "eval_duration": int(latency * 1e9)
+            })
+
+    def _embed(self, text: str) -> list:
+        vector = [0.0] * self.embed_dim
+        for word in text.lower().split():
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.embed_dim
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+        return [x / norm for x in vector]
+
+    def _stream(self, model: str, latency: float, prompt_tokens: int):
+        # Split the canned answer into word-sized tokens spread over the latency
+        tokens = [token + " " for token in self.response_text.split(" ")]
+        delay = latency / max(1, len(tokens))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for token in tokens:
+            time.sleep(delay)
+            self._write_chunk({"model": model, "response": token, "done": False})
+        self._write_chunk({
+            "model": model,
+            "response": "",
+            "done": True,
+            "prompt_eval_count": prompt_tokens,
+            "eval_count": len(tokens),
+            "eval_duration": int(latency * 1e9)
+        })
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _write_chunk(self, payload: dict):
+        data = (json.dumps(payload) + "\n").encode("utf-8")
+        self.wfile.write(f"{len(data):X}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_stub(
+    host: str = "127.0.0.1",
+    port: int = 0,
+    latency: float = 0.0,
+    fail_rate: float = 0.0,
+    embed_dim: int = 256,
+    parallel: int = 0,
+    model_latency: Optional[Dict[str, float]] = None,
+):
+    """Start the stub on a background thread. Returns (server, base_url).
+
+    parallel > 0 serves at most that many generations at once, across models.
+    """
+    handler = type("ConfiguredStubOllamaHandler", (StubOllamaHandler,), {
+        "latency": latency,
+        "model_latency": dict(model_latency or {}),
+        "fail_rate": fail_rate,
+        "embed_dim": embed_dim,
+        "slots": threading.BoundedSemaphore(parallel) if parallel > 0 else None
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/api"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Ollama /api/generate and /api/embed server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per generation")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 503")
+    parser.add_argument("--embed-dim", type=int, default=256, help="size of /api/embed vectors")
+    parser.add_argument("--parallel", type=int, default=0, help="requests served at once (0: unlimited)")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SECONDS",
+                        help="seconds per generation for one model (repeatable)")
+    args = parser.parse_args()
+
+    model_latency = {}
+    for item in args.model_latency:
+        name, _, seconds = item.rpartition("=")
+        model_latency[name] = float(seconds)
+    server, base_url = start_stub(
+        args.host, args.port, args.latency, args.fail_rate, args.embed_dim, args.parallel, model_latency
+    )
+    print(f"Stub Ollama listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,171 @@
+import asyncio
+import io
+import json
+import threading
+import time
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from app.llm import chunking
+from app.llm.analyzer import OllamaAnalyzer
+from app.monitoring.metrics import LLM_REQUESTS
+from benchmarks.ollama_stub import CANNED_ANALYSIS, StubOllamaHandler, start_stub
+
+
+@pytest.fixture(autouse=True)
+def offline(monkeypatch):
+    # No tokenizer download, and a single large model whatever the environment says
+    monkeypatch.setattr(chunking, "_encoding", None)
+    monkeypatch.setattr(chunking, "_encoding_loaded", True)
+    monkeypatch.delenv("OLLAMA_MODELS", raising=False)
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**options):
+        server, base_url = start_stub(**options)
+        servers.append(server)
+        return server, base_url
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+async def analyze(analyzer, texts):
+    await analyzer.start()
+    try:
+        return await asyncio.gather(*(analyzer.analyze_text_async(text, "Title", "https://example.com/") for text in texts))
+    finally:
+        await analyzer.close()
+
+
+def test_analysis_is_parsed(stub):
+    _, base_url = stub()
+    [analysis] = asyncio.run(analyze(OllamaAnalyzer(base_url=base_url), ["Some page text."]))
+    assert analysis == CANNED_ANALYSIS
+
+
+def test_failed_requests_are_retried(stub):
+    server, base_url = stub(fail_rate=1.0)
+    analyzer = OllamaAnalyzer(base_url=base_url, max_retries=3)
+    retries = LLM_REQUESTS.value(outcome="retry")
+
+    async def main():
+        run = asyncio.create_task(analyze(analyzer, ["Some page text."]))
+        # Ollama recovers while the first attempt's backoff (at least 0.25s) runs
+        await asyncio.sleep(0.1)
+        server.RequestHandlerClass.fail_rate = 0.0
+        return await run
+
+    [analysis] = asyncio.run(main())
+    assert analysis == CANNED_ANALYSIS
+    assert LLM_REQUESTS.value(outcome="retry") > retries
+
+
+def test_gives_up_after_max_retries(stub):
+    _, base_url = stub(fail_rate=1.0)
+    [analysis] = asyncio.run(analyze(OllamaAnalyzer(base_url=base_url, max_retries=0), ["Some page text."]))
+    assert analysis["summary"] != CANNED_ANALYSIS["summary"]
+
+
+def test_num_parallel_limits_requests_in_flight(stub, monkeypatch):
+    monkeypatch.setenv("OLLAMA_NUM_PARALLEL", "2")
+    _, base_url = stub(latency=0.2)
+    analyzer = OllamaAnalyzer(base_url=base_url)
+    assert analyzer.num_parallel == 2
+    started = time.perf_counter()
+    results = asyncio.run(analyze(analyzer, [f"Page number {n}." for n in range(6)]))
+    elapsed = time.perf_counter() - started
+    assert results == [CANNED_ANALYSIS] * 6
+    # Three rounds of two; unlimited, all six would finish in one round
+    assert 0.55 <= elapsed < 1.5
+
+
+class OldOllamaHandler(StubOllamaHandler):
+    """Ollama before 0.5: a JSON schema as format is a bad request"""
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        raw = self.rfile.read(length)
+        if isinstance(json.loads(raw or b"{}").get("format"), dict):
+            self._send_json(400, {"error": "invalid format"})
+            return
+        self.rfile = io.BytesIO(raw)
+        super().do_POST()
+
+
+async def stream(analyzer, text="Some page text."):
+    await analyzer.start()
+    try:
+        events = [event async for event in analyzer.analyze_text_stream(text, "Title", "https://example.com/")]
+    finally:
+        await analyzer.close()
+    return events
+
+
+def test_rejected_schema_falls_back_without_using_a_retry():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OldOllamaHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        base_url = f"http://127.0.0.1:{server.server_address[1]}/api"
+        analyzer = OllamaAnalyzer(base_url=base_url, max_retries=0, output_format="schema")
+        events = asyncio.run(stream(analyzer))
+        assert events[-1] == ("done", CANNED_ANALYSIS)
+        assert analyzer.output_format == "json"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_backoff_does_not_hold_the_model_slot(stub):
+    server, base_url = stub(fail_rate=1.0)
+    analyzer = OllamaAnalyzer(base_url=base_url, num_parallel=1, max_retries=3)
+
+    async def main():
+        finished = []
+
+        async def streamed():
+            await stream(analyzer, "First page.")
+            finished.append("streamed")
+
+        async def generated():
+            await asyncio.sleep(0.1)
+            server.RequestHandlerClass.fail_rate = 0.0
+            await analyzer._generate_response_async("Second page.")
+            finished.append("generated")
+
+        await analyzer.start()
+        await asyncio.gather(streamed(), generated())
+        return finished
+
+    # The only slot is free while the stream waits to retry
+    assert asyncio.run(main()) == ["generated", "streamed"]
+
+
+def test_retry_backoff_does_not_hold_the_model_slot(stub):
+    server, base_url = stub(fail_rate=1.0)
+    analyzer = OllamaAnalyzer(base_url=base_url, num_parallel=1, max_retries=3)
+
+    async def main():
+        finished = []
+
+        async def generate(name, delay):
+            await asyncio.sleep(delay)
+            server.RequestHandlerClass.fail_rate = 0.0 if delay else 1.0
+            await analyzer._generate_response_async(f"{name} page.")
+            finished.append(name)
+
+        await analyzer.start()
+        try:
+            await asyncio.gather(generate("first", 0), generate("second", 0.1))
+        finally:
+            await analyzer.close()
+        return finished
+
+    assert asyncio.run(main()) == ["second", "first"]
@@ -0,0 +1,115 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.llm import cache as cache_module
+from app.llm.cache import AnalysisCache
+
+ANALYSIS = {"summary": "S", "category": "other", "sentiment": "neutral", "insights": []}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+class FakeDatabase:
+    def __init__(self, fail=False):
+        self.rows = {}
+        self.fail = fail
+        self.pruned = 0
+
+    async def get_cached_analysis(self, key, ttl):
+        if self.fail:
+            raise ConnectionError("database down")
+        return self.rows.get(key)
+
+    async def store_cached_analysis(self, key, model, analysis):
+        if self.fail:
+            raise ConnectionError("database down")
+        self.rows[key] = analysis
+
+    async def prune_analysis_cache(self, max_rows, ttl):
+        self.pruned += 1
+
+
+def test_key_covers_model_prompt_version_and_content():
+    key = AnalysisCache.make_key("llama2", "3", "text")
+    assert key == AnalysisCache.make_key("llama2", "3", "text")
+    assert key != AnalysisCache.make_key("llama3", "3", "text")
+    assert key != AnalysisCache.make_key("llama2", "4", "text")
+    assert key != AnalysisCache.make_key("llama2", "3", "text!")
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = AnalysisCache(max_entries=10, ttl=60)
+
+    async def main():
+        await cache.set("k", "m", ANALYSIS)
+        clock[0] += 59
+        assert await cache.get("k") == ANALYSIS
+        clock[0] += 2
+        assert await cache.get("k") is None
+
+    asyncio.run(main())
+    assert cache.stats()["memory_entries"] == 0
+
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = AnalysisCache(max_entries=2, ttl=60)
+
+    async def main():
+        await cache.set("a", "m", {"summary": "a"})
+        await cache.set("b", "m", {"summary": "b"})
+        # Reading a makes b the least recently used
+        await cache.get("a")
+        await cache.set("c", "m", {"summary": "c"})
+        return [await cache.get(key) is not None for key in ("a", "b", "c")]
+
+    assert asyncio.run(main()) == [True, False, True]
+
+
+def test_hit_and_miss_counters(clock):
+    database = FakeDatabase()
+    database.rows["stored"] = ANALYSIS
+    cache = AnalysisCache(database, max_entries=10, ttl=60)
+
+    async def main():
+        assert await cache.get("missing") is None
+        # From the table, then from memory
+        assert await cache.get("stored") == ANALYSIS
+        assert await cache.get("stored") == ANALYSIS
+
+    asyncio.run(main())
+    assert cache.stats() == {
+        "memory_hits": 1, "db_hits": 1, "misses": 1, "hit_rate": pytest.approx(2 / 3), "memory_entries": 1
+    }
+    assert AnalysisCache(max_entries=1, ttl=1).stats()["hit_rate"] == 0.0
+
+
+def test_writes_go_to_the_table_and_prune_it_now_and_then(clock):
+    database = FakeDatabase()
+    cache = AnalysisCache(database, max_entries=10, ttl=60)
+
+    async def main():
+        for n in range(200):
+            await cache.set(f"k{n}", "m", ANALYSIS)
+
+    asyncio.run(main())
+    assert len(database.rows) == 200
+    assert database.pruned == 2
+
+
+def test_database_errors_fall_back_to_memory(clock):
+    cache = AnalysisCache(FakeDatabase(fail=True), max_entries=10, ttl=60)
+
+    async def main():
+        await cache.set("k", "m", ANALYSIS)
+        assert await cache.get("k") == ANALYSIS
+        assert await cache.get("other") is None
+
+    asyncio.run(main())
+    assert (cache.memory_hits, cache.misses) == (1, 1)
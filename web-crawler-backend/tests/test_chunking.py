@@ -0,0 +1,53 @@
+import re
+
+import pytest
+
+from app.llm import chunking
+from app.llm.chunking import count_tokens, split_markdown
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    # Character-based estimates: no tokenizer download, same counts everywhere
+    monkeypatch.setattr(chunking, "_encoding", None)
+    monkeypatch.setattr(chunking, "_encoding_loaded", True)
+
+
+def words(text):
+    return re.findall(r"\w+", text)
+
+
+def test_estimate_is_four_characters_per_token():
+    assert count_tokens("") == 0
+    assert count_tokens("abcd") == 1
+    assert count_tokens("abcde") == 2
+
+
+def test_short_and_empty_text():
+    assert split_markdown("  just this  ", 100) == ["just this"]
+    assert split_markdown(" \n ", 100) == []
+
+
+def test_chunks_fit_the_budget_and_keep_every_word_in_order():
+    sections = [
+        f"# Section {n}\n\n" + "\n\n".join(" ".join(f"s{n}p{p}w{w}" for w in range(30)) for p in range(4))
+        for n in range(6)
+    ]
+    text = "\n\n".join(sections)
+    chunks = split_markdown(text, 200)
+    assert len(chunks) > 1
+    assert all(count_tokens(chunk) <= 200 for chunk in chunks)
+    assert words(" ".join(chunks)) == words(text)
+
+
+def test_sections_that_fit_are_not_cut():
+    text = "\n\n".join(f"# Heading {n}\n\n" + "body " * 50 for n in range(4))
+    chunks = split_markdown(text, 80)
+    assert all(chunk.startswith("# Heading") for chunk in chunks)
+
+
+def test_text_without_structure_is_split_hard():
+    text = "x" * 1000
+    chunks = split_markdown(text, 50)
+    assert all(count_tokens(chunk) <= 50 for chunk in chunks)
+    assert "".join(chunks) == text
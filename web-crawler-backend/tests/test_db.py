@@ -0,0 +1,60 @@
+import base64
+from datetime import datetime
+
+import pytest
+
+from app.database.db import compress_content, decode_cursor, decompress_content, encode_cursor
+
+# Characters of one to four UTF-8 bytes
+MULTIBYTE = "aé€😀"
+
+
+def test_short_body_is_stored_as_is():
+    codec, blob = compress_content("Short page.")
+    assert (codec, blob) == ("none", b"Short page.")
+    assert decompress_content(codec, blob) == "Short page."
+    assert compress_content(None) == ("none", b"")
+
+
+def test_long_body_is_compressed():
+    content = "A paragraph that repeats. " * 200
+    codec, blob = compress_content(content)
+    assert codec == "zlib"
+    assert len(blob) < len(content) // 10
+    assert decompress_content(codec, blob) == content
+
+
+@pytest.mark.parametrize("max_chars", [1, 2, 3, 5, 99, 1000])
+def test_multibyte_body_is_cut_at_max_chars(max_chars):
+    content = MULTIBYTE * 500
+    codec, blob = compress_content(content)
+    assert codec == "zlib"
+    assert decompress_content(codec, blob, max_chars) == content[:max_chars]
+    assert decompress_content("none", content.encode("utf-8"), max_chars) == content[:max_chars]
+
+
+def test_unknown_codec():
+    with pytest.raises(ValueError):
+        decompress_content("brotli", b"")
+
+
+@pytest.mark.parametrize("crawled_at", [datetime(2024, 5, 1, 12, 30, 15, 123456), datetime(2024, 5, 1)])
+def test_cursor_round_trip(crawled_at):
+    cursor = encode_cursor(crawled_at, 42)
+    assert decode_cursor(cursor) == (crawled_at, 42)
+    # Safe in a query string as is
+    assert not set(cursor) & set("+/ &?#")
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor",
+    "%%%",
+    base64.urlsafe_b64encode(b"2024-05-01T12:00:00").decode(),
+    base64.urlsafe_b64encode(b"yesterday|42").decode(),
+    base64.urlsafe_b64encode(b"2024-05-01T12:00:00|forty-two").decode(),
+    encode_cursor(datetime(2024, 5, 1), 42)[:-3],
+])
+def test_malformed_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
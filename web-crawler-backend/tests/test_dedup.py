@@ -0,0 +1,66 @@
+import random
+
+from app.crawler.dedup import SimHashIndex, hamming, simhash
+
+TEXT = " ".join(f"word{i}" for i in range(200))
+
+
+def test_short_text_has_no_fingerprint():
+    assert simhash("too few words here") is None
+    assert simhash("") is None
+
+
+def test_fingerprint_is_stable_and_case_insensitive():
+    assert simhash(TEXT) == simhash(TEXT.upper())
+    assert 0 <= simhash(TEXT) < 2 ** 64
+
+
+def test_near_duplicates_are_close_and_unrelated_pages_are_not():
+    assert hamming(simhash(TEXT), simhash(TEXT + " extra")) <= 3
+    other = " ".join(f"other{i}" for i in range(200))
+    assert hamming(simhash(TEXT), simhash(other)) > 10
+
+
+def test_index_finds_fingerprints_within_max_distance():
+    index = SimHashIndex(max_distance=3)
+    fingerprint = 0x0123456789ABCDEF
+    index.add(fingerprint, 1)
+    assert index.find(fingerprint) == 1
+    assert index.find(fingerprint ^ 0b111) == 1
+    # Four differing bits, in different bands
+    assert index.find(fingerprint ^ (1 | 1 << 20 | 1 << 40 | 1 << 63)) is None
+
+
+def test_index_prefers_the_closest_fingerprint():
+    index = SimHashIndex(max_distance=3)
+    index.add(0b1111, 1)
+    index.add(0b0111, 2)
+    assert index.find(0b0011) == 2
+
+
+def test_remove_forgets_a_page():
+    index = SimHashIndex()
+    index.add(42, 7)
+    assert 7 in index and len(index) == 1
+    index.remove(7)
+    assert 7 not in index and len(index) == 0
+    assert index.find(42) is None
+    index.remove(7)
+
+
+def test_index_stays_correct_across_bucket_merges():
+    rng = random.Random(0)
+    fingerprints = [rng.getrandbits(64) for _ in range(5000)]
+    index = SimHashIndex()
+    for page_id, fingerprint in enumerate(fingerprints):
+        index.add(fingerprint, page_id)
+    assert len(index) == 5000
+    for page_id in (0, 1024, 1025, 4999):
+        assert page_id in index
+        assert index.find(fingerprints[page_id] ^ (1 << 5 | 1 << 50)) == page_id
+    index.remove(1024)
+    assert 1024 not in index and len(index) == 4999
+    assert index.find(fingerprints[1024]) is None
+    # A page re-added after removal is found at its new fingerprint
+    index.add(fingerprints[1024] ^ 1, 1024)
+    assert 1024 in index and index.find(fingerprints[1024]) == 1024
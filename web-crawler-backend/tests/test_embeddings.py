@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from app.llm.embeddings import VectorIndex
+
+
+def unit(*values):
+    vector = np.array(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def index():
+    index = VectorIndex(3)
+    index.add([1, 2, 3, 4], np.stack([unit(1, 0, 0), unit(1, 1, 0), unit(0, 1, 0), unit(-1, 0, 0)]))
+    return index
+
+
+def test_results_are_ordered_by_cosine_similarity(index):
+    results = index.search(unit(1, 0, 0), 4)
+    assert [page_id for page_id, _ in results] == [1, 2, 3, 4]
+    assert [score for _, score in results] == pytest.approx([1.0, 0.7071, 0.0, -1.0], abs=1e-4)
+    assert [page_id for page_id, _ in index.search(unit(0, 1, 0), 2)] == [3, 2]
+
+
+def test_query_page_is_excluded(index):
+    results = index.search(unit(1, 0, 0), 10, exclude_id=1)
+    assert [page_id for page_id, _ in results] == [2, 3, 4]
+    assert index.search(unit(1, 0, 0), 10, exclude_id=99)[0][0] == 1
+
+
+def test_limits(index):
+    assert index.search(unit(1, 0, 0), 0) == []
+    assert VectorIndex(3).search(unit(1, 0, 0), 5) == []
+    single = VectorIndex(3)
+    single.add([7], unit(1, 0, 0)[None, :])
+    assert single.search(unit(1, 0, 0), 5, exclude_id=7) == []
+
+
+def test_adding_a_page_again_replaces_its_vector(index):
+    index.add([4], unit(1, 0, 0)[None, :])
+    assert len(index) == 4
+    assert {page_id for page_id, _ in index.search(unit(1, 0, 0), 2)} == {1, 4}
+
+
+def test_index_grows_past_its_initial_capacity():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(3000, 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    index = VectorIndex(8)
+    for start in range(0, 3000, 500):
+        index.add(list(range(start, start + 500)), vectors[start:start + 500])
+    assert len(index) == 3000
+    for page_id in (0, 1023, 1024, 2999):
+        assert index.search(vectors[page_id], 1)[0] == (page_id, pytest.approx(1.0, abs=1e-5))
+    expected = np.argsort(-(vectors @ vectors[42]))[1:6]
+    assert [page_id for page_id, _ in index.search(vectors[42], 5, exclude_id=42)] == expected.tolist()
@@ -0,0 +1,32 @@
+import pytest
+
+from app.crawler.engine import host_of, normalize_url
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("HTTPS://Example.COM", "https://example.com/"),
+    ("http://example.com:80/a", "http://example.com/a"),
+    ("https://example.com:443/a", "https://example.com/a"),
+    ("https://example.com:8443/a", "https://example.com:8443/a"),
+    ("https://example.com/a#section", "https://example.com/a"),
+    ("https://example.com/a?b=2&a=1", "https://example.com/a?a=1&b=2"),
+    ("https://example.com/a?utm_source=x&id=3&fbclid=y", "https://example.com/a?id=3"),
+    ("  https://example.com/a  ", "https://example.com/a"),
+])
+def test_normalize_url(url, expected):
+    assert normalize_url(url) == expected
+
+
+def test_relative_links_resolve_against_base():
+    assert normalize_url("../c?x=1", "https://example.com/a/b/") == "https://example.com/a/c?x=1"
+    assert normalize_url("/root", "https://example.com/a/b") == "https://example.com/root"
+
+
+@pytest.mark.parametrize("url", ["", "mailto:a@example.com", "javascript:void(0)", "ftp://example.com/", "https://"])
+def test_non_http_urls_are_rejected(url):
+    assert normalize_url(url) is None
+
+
+def test_host_of_drops_www():
+    assert host_of("https://www.Example.com/a") == "example.com"
+    assert host_of("https://sub.example.com") == "sub.example.com"
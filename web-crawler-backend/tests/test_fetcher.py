@@ -0,0 +1,128 @@
+import asyncio
+
+import httpx
+from bs4 import BeautifulSoup
+
+from app.crawler.fetcher import BROWSER, HTTP, TieredFetcher, extract_page, is_js_shell
+
+ARTICLE = " ".join(["Server-rendered pages carry their text in the HTML itself."] * 10)
+
+STATIC_HTML = f"""
+<html><head>
+  <title> A static page </title>
+  <meta name="description" content="About static pages">
+  <meta property="og:title" content="Static">
+</head><body>
+  <div id="root"><h1>Static pages</h1><p>{ARTICLE}</p></div>
+  <a href="/about#team">About</a>
+  <a href="https://www.example.com/contact?utm_source=x">Contact</a>
+  <a href="https://other.org/">Elsewhere</a>
+  <script>console.log("not content")</script>
+</body></html>
+""".encode()
+
+SPA_HTML = b"""
+<html><head><title>App</title></head><body>
+  <noscript>You need to enable JavaScript to run this app.</noscript>
+  <div id="root"></div>
+  <script src="/static/js/main.js"></script>
+</body></html>
+"""
+
+
+def shell(html, min_text=200):
+    soup = BeautifulSoup(html, "lxml")
+    noscript = " ".join(tag.get_text(" ", strip=True) for tag in soup.find_all("noscript"))
+    for tag in soup.find_all(["script", "noscript"]):
+        tag.decompose()
+    return is_js_shell(soup, soup.body.get_text(" ", strip=True), noscript, min_text)
+
+
+def test_static_html_is_extracted():
+    page, needs_browser = extract_page(
+        "https://example.com/blog", STATIC_HTML, 200, httpx.Headers({"ETag": '"v1"'})
+    )
+    assert not needs_browser
+    assert page["title"] == "A static page"
+    assert page["metadata"]["description"] == "About static pages"
+    assert page["metadata"]["og:title"] == "Static"
+    assert "Server-rendered pages" in page["content"]
+    assert "not content" not in page["content"]
+    assert page["etag"] == '"v1"'
+    assert [link["href"] for link in page["links"]["internal"]] == [
+        "https://example.com/about", "https://www.example.com/contact"
+    ]
+    assert [link["href"] for link in page["links"]["external"]] == ["https://other.org/"]
+
+
+def test_spa_shell_needs_the_browser():
+    assert extract_page("https://example.com/", SPA_HTML, 200, httpx.Headers()) == (None, True)
+
+
+def test_js_shell_heuristics():
+    assert not shell(STATIC_HTML)
+    assert shell(SPA_HTML)
+    # Too little text, whatever the markup
+    assert shell(b"<html><body><p>Loading...</p></body></html>")
+    assert not shell(b"<html><body><p>Short but fine.</p></body></html>", min_text=5)
+    # Some text, but the app's mount point is empty
+    text = "Footer text. " * 30
+    assert shell(f"<html><body><div id='app'></div><p>{text}</p></body></html>".encode())
+    # An empty mount point does not matter on a long page
+    assert not shell(f"<html><body><div id='app'></div><p>{text * 5}</p></body></html>".encode())
+
+
+class FakeHttp:
+    def __init__(self, needs_browser=True):
+        self.needs_browser = needs_browser
+        self.fetched = []
+
+    async def fetch(self, url):
+        self.fetched.append(url)
+        if self.needs_browser:
+            return None, True
+        return {"url": url, "tier": HTTP}, False
+
+    async def close(self):
+        pass
+
+
+async def render(url):
+    return {"url": url, "tier": BROWSER}
+
+
+def test_host_switches_to_the_browser_and_reprobes():
+    http = FakeHttp()
+    fetcher = TieredFetcher(render, http, browser_after=3, reprobe_every=5)
+    url = "https://spa.example/page"
+
+    async def fetch(times):
+        return [(await fetcher.fetch_page(url))["tier"] for _ in range(times)]
+
+    async def main():
+        # Three HTTP misses, each rendered in the browser
+        assert await fetch(3) == [BROWSER] * 3
+        assert len(http.fetched) == 3
+        assert fetcher.tier_for(url) == BROWSER
+        # Now straight to the browser, until it is time to probe again
+        await fetch(5)
+        assert len(http.fetched) == 3
+        assert fetcher.tier_for(url) == HTTP
+        # The site went static: the probe succeeds and the host stays on HTTP
+        http.needs_browser = False
+        assert await fetch(2) == [HTTP, HTTP]
+        assert fetcher.tier_for(url) == HTTP
+        assert fetcher.counts == {HTTP: 2, BROWSER: 8, "fallbacks": 3}
+
+    asyncio.run(main())
+
+
+def test_tiers_are_tracked_per_host():
+    fetcher = TieredFetcher(render, FakeHttp(), browser_after=1)
+
+    async def main():
+        await fetcher.fetch_page("https://spa.example/")
+        assert fetcher.tier_for("https://spa.example/other") == BROWSER
+        assert fetcher.tier_for("https://static.example/") == HTTP
+
+    asyncio.run(main())
@@ -0,0 +1,101 @@
+import json
+
+import pytest
+
+from app.llm.parsing import (
+    CLASSIFICATION_FIELDS, JsonObjectParser, parse_analysis, validate_analysis
+)
+
+ANALYSIS = {
+    "summary": "A page about things.",
+    "category": "science",
+    "sentiment": "positive",
+    "insights": ["one", "two"],
+}
+ANSWER = json.dumps(ANALYSIS)
+
+
+def feed_in_pieces(text, size):
+    parser = JsonObjectParser()
+    for i in range(0, len(text), size):
+        if parser.feed(text[i:i + size]):
+            break
+    return parser
+
+
+def test_object_surrounded_by_prose():
+    analysis, failure = parse_analysis(f"Sure! Here it is:\n```json\n{ANSWER}\n```\nHope this helps.")
+    assert failure is None
+    assert analysis == ANALYSIS
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_streamed_in_any_chunk_size(size):
+    parser = feed_in_pieces("Answer: " + ANSWER + " and some chatter {", size)
+    assert parser.done
+    assert parser.result() == ANALYSIS
+
+
+def test_braces_quotes_and_escapes_inside_strings():
+    data = dict(ANALYSIS, summary='Uses {braces}, "quotes" and \\ backslashes }')
+    parser = feed_in_pieces(json.dumps(data), 1)
+    assert parser.result() == data
+
+
+def test_balanced_prose_span_is_skipped():
+    analysis, failure = parse_analysis("Fill in {like this} then: " + ANSWER)
+    assert failure is None
+    assert analysis == ANALYSIS
+
+
+@pytest.mark.parametrize("size", [1, 5, 1000])
+def test_unbalanced_brace_in_prose_does_not_swallow_the_answer(size):
+    parser = feed_in_pieces("Use {name to refer to it. " + ANSWER, size)
+    analysis, failure = parse_analysis("Use {name to refer to it. " + ANSWER, parser)
+    assert failure is None
+    assert analysis == ANALYSIS
+
+
+def test_failure_reasons():
+    assert parse_analysis("")[1] == "empty"
+    assert parse_analysis("   \n")[1] == "empty"
+    assert parse_analysis("No JSON here.")[1] == "no_json"
+    assert parse_analysis('{"summary": "cut off')[1] == "incomplete"
+    assert parse_analysis("{not: json}")[1] == "invalid_json"
+    assert parse_analysis('{"summary": 1}')[1] == "schema"
+
+
+def test_schema_failure_keeps_valid_fields():
+    analysis, failure = parse_analysis('{"summary": "Kept.", "category": "Health", "insights": "single"}')
+    assert failure == "schema"
+    assert analysis["summary"] == "Kept."
+    assert analysis["category"] == "health"
+    assert analysis["insights"] == ["single"]
+
+
+def test_text_fallback_reads_sections():
+    text = "Summary: It is a page.\nCategory: Finance\nSentiment: negative\nKey insights:\n- first\n- second"
+    analysis, failure = parse_analysis(text)
+    assert failure == "no_json"
+    assert analysis == {
+        "summary": "It is a page.",
+        "category": "finance",
+        "sentiment": "negative",
+        "insights": ["first", "second"],
+    }
+
+
+def test_validate_normalises_unknown_values_unless_strict():
+    data = dict(ANALYSIS, category="Gardening", sentiment="POSITIVE")
+    assert validate_analysis(data)["category"] == "other"
+    assert validate_analysis(data)["sentiment"] == "positive"
+    with pytest.raises(ValueError):
+        validate_analysis(data, strict=True)
+    with pytest.raises(ValueError):
+        validate_analysis(dict(ANALYSIS, summary="  "), strict=True)
+
+
+def test_fields_restrict_the_result():
+    analysis, failure = parse_analysis('{"category": "sports", "sentiment": "neutral"}', fields=CLASSIFICATION_FIELDS)
+    assert failure is None
+    assert analysis == {"category": "sports", "sentiment": "neutral"}
@@ -0,0 +1,86 @@
+import asyncio
+from types import SimpleNamespace
+
+from app.jobs.pipeline import CrawlPipeline
+from app.llm.models import CRAWL, INTERACTIVE, llm_priority
+from app.llm.scheduler import AnalysisScheduler
+
+ANALYSIS = {"summary": "S", "category": "other", "sentiment": "neutral", "insights": []}
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.pages = {}
+        self.analyses = {}
+
+    async def store_crawled_data(self, pages):
+        ids = []
+        for page in pages:
+            page_id = len(self.pages) + 1
+            self.pages[page_id] = SimpleNamespace(id=page_id, **page)
+            ids.append(page_id)
+        return ids
+
+    async def get_page(self, page_id, with_body=True):
+        return self.pages.get(page_id)
+
+    async def update_with_analysis(self, page_id, analysis):
+        self.analyses[page_id] = analysis
+
+    async def copy_canonical_analysis(self, page_ids):
+        return []
+
+
+class FakeAnalyzer:
+    num_parallel = 1
+
+    def __init__(self):
+        self.priorities = []
+
+    async def analyze_text_stream(self, text, title="", url=""):
+        self.priorities.append(llm_priority.get())
+        yield "token", "{"
+        yield "token", "}"
+        yield "done", ANALYSIS
+
+
+def page(url, content):
+    return {"url": url, "title": url, "content": content}
+
+
+def run_stream(pages, max_depth):
+    database, analyzer = FakeDatabase(), FakeAnalyzer()
+
+    async def iter_pages(domain, max_depth, max_pages, timeout=None):
+        for item in pages:
+            yield item
+
+    async def main():
+        scheduler = AnalysisScheduler(database, analyzer)
+        pipeline = CrawlPipeline(database, analyzer, crawl=None, iter_pages=iter_pages, scheduler=scheduler)
+        try:
+            return [event async for event in pipeline.stream("example.com", "domain", max_depth)]
+        finally:
+            await scheduler.stop()
+
+    return asyncio.run(main()), database, analyzer
+
+
+def test_done_counts_stored_pages():
+    events, database, _ = run_stream(
+        [page("https://example.com/", "Text"), page("https://example.com/empty", "")], max_depth=1
+    )
+    assert events[-1] == ("done", {"page_count": 2})
+    assert [data["page_id"] for name, data in events if name == "analysis_done"] == [1]
+    assert database.analyses == {1: ANALYSIS}
+
+
+def test_streamed_analyses_go_through_the_scheduler():
+    events, _, analyzer = run_stream([page("https://example.com/", "Text")], max_depth=0)
+    assert [data["token"] for name, data in events if name == "analysis_token"] == ["{", "}"]
+    assert ("analysis_done", {"page_id": 1, "analysis": ANALYSIS}) in events
+    # A single page is somebody waiting on one URL
+    assert analyzer.priorities == [INTERACTIVE]
+
+    _, _, analyzer = run_stream([page("https://example.com/", "Text")], max_depth=2)
+    assert analyzer.priorities == [CRAWL]
@@ -0,0 +1,183 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.crawler.politeness import USER_AGENT, PolitenessScheduler, RobotsCache, RobotsRules, parse_retry_after
+
+
+def rules(text):
+    parser = RobotsRules("https://example.com/robots.txt")
+    parser.parse(text.splitlines())
+    return parser
+
+
+class StaticRobots(RobotsCache):
+    """The same robots.txt for every origin, without fetching anything"""
+
+    def __init__(self, text):
+        super().__init__(ttl=60)
+        self.rules = rules(text)
+
+    async def get(self, url):
+        return self.rules
+
+
+def test_retry_after():
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("120") == 120.0
+    assert parse_retry_after("soon") is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    later = format_datetime(datetime.now(timezone.utc) + timedelta(seconds=60), usegmt=True)
+    assert 50 < parse_retry_after(later) <= 60
+
+
+def test_fractional_crawl_delay_per_group():
+    parser = rules(
+        "User-agent: other\n"
+        "User-agent: web-crawler-with-llm\n"
+        "Crawl-delay: 0.25  # per request\n"
+        "Disallow: /private\n"
+        "\n"
+        "User-agent: *\n"
+        "Crawl-delay: 2\n"
+    )
+    assert parser.crawl_delay(USER_AGENT) == 0.25
+    assert parser.crawl_delay("other") == 0.25
+    assert parser.crawl_delay("somebot") == 2.0
+    assert not parser.can_fetch(USER_AGENT, "https://example.com/private/page")
+    assert parser.can_fetch(USER_AGENT, "https://example.com/public")
+
+
+def test_bad_crawl_delay_is_ignored():
+    assert rules("User-agent: *\nCrawl-delay: slow\n").crawl_delay(USER_AGENT) is None
+
+
+def test_disallowed_url_gets_a_refused_slot():
+    async def main():
+        scheduler = PolitenessScheduler(min_delay=0, respect_robots=True, robots=StaticRobots("User-agent: *\nDisallow: /x"))
+        async with scheduler.slot("https://example.com/x/1") as slot:
+            assert not slot.allowed
+        async with scheduler.slot("https://example.com/y") as slot:
+            assert slot.allowed
+
+    asyncio.run(main())
+
+
+async def fetch_times(scheduler, urls):
+    started = time.monotonic()
+    times = []
+    for url in urls:
+        async with scheduler.slot(url) as slot:
+            slot.record(200)
+        times.append(time.monotonic() - started)
+    return times
+
+
+def test_requests_to_one_host_are_paced():
+    scheduler = PolitenessScheduler(min_delay=0.1, burst=1, respect_robots=False)
+    times = asyncio.run(fetch_times(scheduler, ["https://example.com/"] * 4))
+    assert times[0] < 0.05
+    assert times[-1] >= 0.28
+
+
+def test_crawl_delay_slows_the_host_down():
+    robots = StaticRobots("User-agent: *\nCrawl-delay: 0.15")
+    scheduler = PolitenessScheduler(min_delay=0.01, burst=1, respect_robots=True, robots=robots)
+    times = asyncio.run(fetch_times(scheduler, ["https://example.com/"] * 3))
+    assert times[-1] >= 0.28
+
+
+def test_other_hosts_are_not_held_up():
+    scheduler = PolitenessScheduler(min_delay=1.0, burst=1, respect_robots=False)
+    times = asyncio.run(fetch_times(scheduler, [f"https://host{n}.example/" for n in range(5)]))
+    assert times[-1] < 0.2
+
+
+def test_throttling_backs_off_and_honours_retry_after():
+    async def main():
+        scheduler = PolitenessScheduler(min_delay=0.01, burst=5, respect_robots=False)
+        async with scheduler.slot("https://example.com/") as slot:
+            slot.record(429, "1")
+        stats = scheduler.stats()["example.com"]
+        assert stats["backoff"] == 2.0 and stats["throttled"] == 1
+        started = time.monotonic()
+        async with scheduler.slot("https://example.com/") as slot:
+            slot.record(200)
+        assert time.monotonic() - started >= 0.9
+        assert scheduler.stats()["example.com"]["backoff"] < 2.0
+
+    asyncio.run(main())
+
+
+def test_errors_and_latency_spikes_back_off():
+    async def main():
+        scheduler = PolitenessScheduler(min_delay=0, respect_robots=False)
+        state = scheduler._host("https://example.com/")
+        async with scheduler.slot("https://example.com/") as slot:
+            slot.record(200, elapsed=0.1)
+        assert state.backoff == 1.0 and state.latency == pytest.approx(0.1)
+        async with scheduler.slot("https://example.com/") as slot:
+            slot.record(200, elapsed=1.0)
+        assert state.backoff == 1.5
+        with pytest.raises(RuntimeError):
+            async with scheduler.slot("https://example.com/"):
+                raise RuntimeError("connection reset")
+        assert state.backoff == 2.25
+
+    asyncio.run(main())
+
+
+def test_recorded_elapsed_is_the_host_latency():
+    async def main():
+        scheduler = PolitenessScheduler(min_delay=0, respect_robots=False)
+        async with scheduler.slot("https://example.com/") as slot:
+            await asyncio.sleep(0.2)
+            slot.record(200, elapsed=0.01)
+        assert scheduler.stats()["example.com"]["latency"] == pytest.approx(0.01)
+
+    asyncio.run(main())
+
+
+class SlowPool:
+    """Browser pool whose single browser is free only once ``free`` is set"""
+
+    def __init__(self):
+        self.free = asyncio.Event()
+
+    @asynccontextmanager
+    async def lease(self):
+        await self.free.wait()
+        yield self
+
+    async def arun(self, url, config=None):
+        await asyncio.sleep(0.05)
+        return SimpleNamespace(
+            success=True, status_code=200, response_headers={}, metadata={},
+            markdown="# Page", links={}
+        )
+
+
+def test_waiting_for_a_browser_holds_no_fetch_slot():
+    from app.crawler.crawler import WebCrawler
+
+    async def main():
+        pool = SlowPool()
+        scheduler = PolitenessScheduler(concurrency=1, min_delay=0, respect_robots=False)
+        crawler = WebCrawler(pool, scheduler, fast_path=False)
+        render = asyncio.create_task(crawler.render_page("https://example.com/"))
+        await asyncio.sleep(0.05)
+        # The only global slot is still free for plain HTTP fetches
+        await asyncio.wait_for(fetch_times(scheduler, ["https://other.example/"]), 0.5)
+        await asyncio.sleep(0.2)
+        pool.free.set()
+        page = await render
+        assert page["content"] == "# Page"
+        # The time spent waiting for the browser is not the host's latency
+        assert scheduler.stats()["example.com"]["latency"] < 0.15
+
+    asyncio.run(main())
@@ -0,0 +1,37 @@
+from app.crawler.ranking import rank_pages
+
+
+def page(title, content, description=""):
+    return {"title": title, "content": content, "metadata": {"description": description}}
+
+
+PAGES = [
+    page("Gardening tips", "Water your tomatoes in the morning."),
+    page("Python news", "Python asyncio gets faster task groups. Asyncio everywhere."),
+    page("Cooking", "A recipe that mentions python once."),
+    page("Asyncio in depth", "How the event loop schedules tasks.", "Python asyncio tutorial"),
+]
+
+
+def test_best_matches_first_and_non_matching_pages_dropped():
+    ranked = rank_pages("python asyncio", PAGES)
+    assert [index for index, _ in ranked] == [3, 1, 2]
+    scores = [score for _, score in ranked]
+    assert scores == sorted(scores, reverse=True)
+
+
+def test_title_outweighs_body():
+    pages = [page("Other", "kubernetes operators explained"), page("Kubernetes", "operators explained here")]
+    assert [index for index, _ in rank_pages("kubernetes", pages)] == [1, 0]
+
+
+def test_top_k_cuts_the_ranking():
+    assert [index for index, _ in rank_pages("python asyncio", PAGES, top_k=2)] == [3, 1]
+    assert rank_pages("python asyncio", PAGES, top_k=0) == []
+
+
+def test_nothing_to_rank():
+    assert rank_pages("", PAGES) == []
+    assert rank_pages("?!", PAGES) == []
+    assert rank_pages("python", []) == []
+    assert rank_pages("python", [page("", "")]) == []
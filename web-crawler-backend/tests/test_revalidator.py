@@ -0,0 +1,81 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.crawler.politeness import PolitenessScheduler
+from app.crawler.revalidator import CHANGED, FAILED, GONE, UNCHANGED, UNKNOWN, Revalidator
+
+LAST_MODIFIED = "Wed, 01 May 2024 12:00:00 GMT"
+
+
+def server(request):
+    """A site whose paths say how it answers conditional requests"""
+    path = request.url.path
+    if path == "/conditional":
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, headers={"ETag": '"v2"'}, text="new")
+    if path == "/ignores-conditions":
+        # Always a full 200, but with the current validators
+        return httpx.Response(200, headers={"ETag": '"v1"', "Last-Modified": LAST_MODIFIED}, text="same")
+    if path == "/edited":
+        return httpx.Response(200, headers={"Last-Modified": "Thu, 02 May 2024 08:00:00 GMT"}, text="new")
+    if path == "/no-validators":
+        return httpx.Response(200, text="whatever")
+    if path == "/deleted":
+        return httpx.Response(410)
+    if path == "/broken":
+        return httpx.Response(500)
+    raise httpx.ConnectError("connection refused", request=request)
+
+
+def check(url, etag=None, last_modified=None, scheduler=None):
+    async def main():
+        revalidator = Revalidator(scheduler=scheduler)
+        revalidator._client = httpx.AsyncClient(transport=httpx.MockTransport(server))
+        try:
+            return await revalidator.check(f"https://example.com{url}", etag, last_modified)
+        finally:
+            await revalidator.close()
+
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize("url, etag, last_modified, outcome", [
+    ("/conditional", '"v1"', None, UNCHANGED),
+    ("/conditional", '"v0"', None, CHANGED),
+    ("/ignores-conditions", '"v1"', None, UNCHANGED),
+    ("/ignores-conditions", '"v0"', None, CHANGED),
+    ("/ignores-conditions", None, LAST_MODIFIED, UNCHANGED),
+    ("/edited", None, LAST_MODIFIED, CHANGED),
+    ("/no-validators", '"v1"', LAST_MODIFIED, UNKNOWN),
+    ("/ignores-conditions", None, None, UNKNOWN),
+    ("/deleted", '"v1"', None, GONE),
+    ("/broken", '"v1"', None, FAILED),
+    ("/unreachable", '"v1"', None, FAILED),
+])
+def test_outcomes(url, etag, last_modified, outcome):
+    assert check(url, etag, last_modified) == outcome
+
+
+def test_paced_through_the_scheduler():
+    scheduler = PolitenessScheduler(min_delay=0, respect_robots=False)
+    assert check("/conditional", '"v1"', scheduler=scheduler) == UNCHANGED
+    assert scheduler.stats()["example.com"]["requests"] == 1
+
+
+def test_check_many_keys_outcomes_by_page_id():
+    async def main():
+        revalidator = Revalidator(concurrency=2)
+        revalidator._client = httpx.AsyncClient(transport=httpx.MockTransport(server))
+        try:
+            return await revalidator.check_many([
+                {"id": 1, "url": "https://example.com/conditional", "etag": '"v1"'},
+                {"id": 2, "url": "https://example.com/edited", "last_modified": LAST_MODIFIED},
+                {"id": 3, "url": "https://example.com/deleted"},
+            ])
+        finally:
+            await revalidator.close()
+
+    assert asyncio.run(main()) == {1: UNCHANGED, 2: CHANGED, 3: GONE}
@@ -0,0 +1,136 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.llm import scheduler
+from app.llm.models import BULK, CRAWL, INTERACTIVE, ModelSpec, PrioritySemaphore, llm_usage, new_usage
+from app.llm.scheduler import BatchSizer
+from app.monitoring.metrics import LLM_GENERATED_TOKENS, STAGE_SECONDS
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controls the time BatchSizer sees"""
+    now = [1000.0]
+    monkeypatch.setattr(scheduler, "time", SimpleNamespace(perf_counter=lambda: now[0]))
+    return now
+
+
+def window(sizer, clock, seconds, tokens, calls=4, latency=1.0):
+    """Finish one window of pages that generated ``tokens`` in ``seconds``"""
+    clock[0] += seconds
+    pages = max(2, sizer.size)
+    sizer.record({"requests": calls, "generated_tokens": tokens, "seconds": latency * calls})
+    for _ in range(pages - 1):
+        sizer.record()
+    return sizer.size
+
+
+def test_grows_while_throughput_rises_then_steps_back(clock):
+    sizer = BatchSizer(2, 8)
+    assert window(sizer, clock, 10, 100) == 3
+    assert window(sizer, clock, 10, 150) == 4
+    assert window(sizer, clock, 10, 200) == 5
+    # No gain from the last step: turn around
+    assert window(sizer, clock, 10, 200) == 4
+    # Shrinking is kept while throughput holds
+    assert window(sizer, clock, 10, 200) == 3
+    # ...and reversed once it drops
+    assert window(sizer, clock, 10, 150) == 4
+
+
+def test_latency_spike_shrinks_regardless_of_throughput(clock):
+    sizer = BatchSizer(4, 8)
+    assert window(sizer, clock, 10, 100, latency=1.0) == 5
+    assert window(sizer, clock, 10, 500, latency=2.0) == 4
+    assert sizer.best_latency == pytest.approx(1.02)
+
+
+def test_stays_within_bounds(clock):
+    sizer = BatchSizer(7, 8)
+    assert window(sizer, clock, 10, 100) == 8
+    assert window(sizer, clock, 10, 1000) == 8
+    sizer = BatchSizer(1, 8)
+    sizer.direction = -1
+    sizer.throughput = 10.0
+    assert window(sizer, clock, 10, 100) == 1
+
+
+def test_cache_hits_teach_nothing(clock):
+    sizer = BatchSizer(3, 8)
+    assert window(sizer, clock, 10, 0, calls=0) == 3
+    assert sizer.throughput is None
+
+
+def test_other_ollama_traffic_is_ignored(clock):
+    sizer = BatchSizer(2, 8)
+    window(sizer, clock, 10, 100)
+    # Requests made outside the scheduler only show up in the global metrics
+    LLM_GENERATED_TOKENS.inc(10 ** 6)
+    STAGE_SECONDS.observe(100.0, stage="llm_generate")
+    assert window(sizer, clock, 10, 150) == 4
+    assert sizer.latency == pytest.approx(1.0)
+    # Pages the scheduler served without the LLM teach nothing either
+    clock[0] += 10
+    sizer.record()
+    sizer.record()
+    sizer.record()
+    sizer.record()
+    assert sizer.size == 4
+
+
+def test_model_requests_are_counted_in_the_current_usage():
+    async def main():
+        spec = ModelSpec("m")
+        usage = new_usage()
+        llm_usage.set(usage)
+        async with spec.slot():
+            spec.record(2.0, {"eval_count": 30})
+        spec.record(0.5, None)
+        return usage
+
+    usage = asyncio.run(main())
+    assert usage["requests"] == 2
+    assert usage["generated_tokens"] == 30
+    assert usage["seconds"] == pytest.approx(2.5, abs=0.05)
+    assert llm_usage.get() is None
+
+
+def test_priority_semaphore_serves_most_urgent_first():
+    async def main():
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire(BULK)
+        order = []
+
+        async def waiter(name, priority):
+            await semaphore.acquire(priority)
+            order.append(name)
+            semaphore.release()
+
+        tasks = []
+        for name, priority in [("bulk", BULK), ("crawl 1", CRAWL), ("interactive", INTERACTIVE), ("crawl 2", CRAWL)]:
+            tasks.append(asyncio.create_task(waiter(name, priority)))
+            await asyncio.sleep(0)
+        semaphore.release()
+        await asyncio.gather(*tasks)
+        assert order == ["interactive", "crawl 1", "crawl 2", "bulk"]
+
+    asyncio.run(main())
+
+
+def test_priority_semaphore_cancelled_waiter_frees_its_place():
+    async def main():
+        semaphore = PrioritySemaphore(1)
+        await semaphore.acquire(CRAWL)
+        cancelled = asyncio.create_task(semaphore.acquire(INTERACTIVE))
+        waiting = asyncio.create_task(semaphore.acquire(BULK))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        semaphore.release()
+        await asyncio.wait_for(waiting, 0.5)
+        assert cancelled.cancelled()
+        semaphore.release()
+        await asyncio.wait_for(semaphore.acquire(CRAWL), 0.5)
+
+    asyncio.run(main())
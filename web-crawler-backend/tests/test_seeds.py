@@ -0,0 +1,46 @@
+import asyncio
+
+from app.crawler.seeds import FileSeedProvider, read_domains
+
+SEED_FILE = """\
+# Seeds for keyword crawls
+https://example.com/python   python programming
+
+https://news.example/        # untagged: used for every keyword
+https://garden.example/      gardening tomatoes
+https://example.com/python/  python
+https://EXAMPLE.com/python?utm_source=list python
+https://cdn.example/report.pdf
+not a url
+https://docs.example/asyncio Python,AsyncIO
+"""
+
+
+def seeds(tmp_path, keyword, limit=10):
+    path = tmp_path / "seeds.txt"
+    path.write_text(SEED_FILE, encoding="utf-8")
+    return asyncio.run(FileSeedProvider(str(path)).seeds(keyword, limit))
+
+
+def test_tagged_lines_match_keyword_words(tmp_path):
+    assert seeds(tmp_path, "Python asyncio") == [
+        "https://example.com/python",
+        "https://news.example/",
+        "https://example.com/python/",
+        "https://docs.example/asyncio",
+    ]
+    assert seeds(tmp_path, "tomatoes") == ["https://news.example/", "https://garden.example/"]
+
+
+def test_limit(tmp_path):
+    assert seeds(tmp_path, "python", limit=2) == ["https://example.com/python", "https://news.example/"]
+
+
+def test_missing_file_gives_no_seeds(tmp_path):
+    assert asyncio.run(FileSeedProvider(str(tmp_path / "missing.txt")).seeds("python", 10)) == []
+
+
+def test_read_domains():
+    text = "example.com\n\n# comment\nnews.example  tag\nexample.com # again\n  other.example\n"
+    assert read_domains(text) == ["example.com", "news.example", "other.example"]
+    assert read_domains("") == []
@@ -2,6 +2,22 @@
 import React, { useState } from 'react';
 import { Loader, AlertCircle, CheckCircle } from 'lucide-react';
 
+const JOB_POLL_INTERVAL_MS = 2000;
+
+async function waitForJob(jobId) {
+  while (true) {
+    const response = await fetch(`http://127.0.0.1:8000/api/jobs/${jobId}`);
+    const job = await response.json();
+    if (!response.ok) {
+      throw new Error(job.detail || 'Could not fetch job status');
+    }
+    if (job.status === 'completed' || job.status === 'failed') {
+      return job;
+    }
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+  }
+}
+
 function DomainInputForm() {
   const [domain, setDomain] = useState('');
   const [loading, setLoading] = useState(false);
@@ -42,17 +58,23 @@ function DomainInputForm() {
 
       const data = await response.json();
 
-      if (response.ok) {
-        setAlert({
-          show: true,
-          type: 'success',
-          message: `Crawling completed! ${data.page_count} pages processed. You can now view the results.`
-        });
-        setDomain('');
-        window.location.reload();
-      } else {
-        throw new Error(data.message || 'Something went wrong');
+      if (!response.ok) {
+        throw new Error(data.detail || data.message || 'Something went wrong');
       }
+
+      // The crawl runs in the background; poll the job until it finishes
+      const job = await waitForJob(data.job_id);
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Crawl failed');
+      }
+
+      setAlert({
+        show: true,
+        type: 'success',
+        message: `Crawling completed! ${job.page_count} pages processed. You can now view the results.`
+      });
+      setDomain('');
+      window.location.reload();
     } catch (error) {
       setAlert({
         show: true,